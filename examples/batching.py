@@ -0,0 +1,175 @@
+"""
+跨会话动态批处理（micro-batching）
+
+多个会话同时渲染时，每帧单独以 batch 1 调用 MobileNetV2Unet，CPU 上卷积的单帧吞吐
+远低于批量推理。MicroBatcher 在后台线程中收集各会话提交的帧：
+凑满 max_batch 或最早的请求已等待 max_wait_ms 时，把同一分辨率的请求拼成一个 batch，
+一次前向（InferenceRunner，输入 / 输出缓冲按 max_batch 预分配），再把 uint8 结果分发回各自的 Future。
+
+指标（stats()）:
+- 队列深度：当前、最大，以及每次组 batch 时的平均深度
+- batch 大小直方图
+- 附加延迟：请求提交 → 所在 batch 开始前向的等待时间（p50 / p95 / p99）
+- 每个 batch 的前向耗时和折合单帧耗时
+
+用法:
+    batcher = MicroBatcher(model, max_batch=8, max_wait_ms=5)
+    future = batcher.submit(face_input, audio_input)   # [1, 6, S, S] / [1, 256, 20]
+    generated = future.result()                         # uint8 [S, S, 3]
+    batcher.close()
+"""
+import time
+import threading
+from collections import Counter, deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from runner import InferenceRunner
+
+
+class MicroBatcher:
+    """
+    Args:
+        model: MobileNetV2Unet 或 create_model 返回的其他变体（只在后台线程中调用，
+               也可以是 ArenaUnet）
+        max_batch: 每个 batch 的最大帧数
+        max_wait_ms: 最早的请求最多等待多久就开始前向（毫秒）
+        device: 'cuda' 或 'cpu'
+        dtype: 输入精度，默认与模型参数一致
+    """
+
+    def __init__(self, model, max_batch=8, max_wait_ms=5.0, device='cpu', dtype=None):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.device = device
+        self.dtype = dtype
+        self._runners = {}
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.requests = 0
+        self.batches = 0
+        self.histogram = Counter()
+        self.max_depth = 0
+        self._depth_sum = 0
+        self.forward_s = 0.0
+        self.wait_ms = deque(maxlen=10000)
+
+        self._thread = threading.Thread(target=self._loop, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, face, audio):
+        """
+        提交一帧
+
+        Args:
+            face: torch.Tensor [1, 6, S, S]（preprocess_faces 的输出）
+            audio: torch.Tensor [1, 256, 20]
+
+        Returns:
+            concurrent.futures.Future，结果为 uint8 numpy array [S, S, 3]
+        """
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher 已关闭")
+            self._queue.append((face, audio, future, time.perf_counter()))
+            self.requests += 1
+            self.max_depth = max(self.max_depth, len(self._queue))
+            self._cond.notify()
+        return future
+
+    @property
+    def depth(self):
+        """当前排队的请求数"""
+        return len(self._queue)
+
+    def close(self):
+        """处理完已提交的请求后停止后台线程"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _runner(self, size):
+        if size not in self._runners:
+            self._runners[size] = InferenceRunner(self.model, self.max_batch, size,
+                                                  self.device, self.dtype)
+        return self._runners[size]
+
+    def _collect(self):
+        """等到凑满 max_batch 或最早的请求超时，取出同一分辨率的一批请求"""
+        with self._cond:
+            while not self._queue:
+                if self._closed:
+                    return None
+                self._cond.wait()
+            deadline = self._queue[0][3] + self.max_wait
+            while len(self._queue) < self.max_batch and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            depth = len(self._queue)
+            size = self._queue[0][0].shape[-1]
+            batch, rest = [], deque()
+            while self._queue and len(batch) < self.max_batch:
+                item = self._queue.popleft()
+                (batch if item[0].shape[-1] == size else rest).append(item)
+            # 其他分辨率的请求保持原来的顺序留在队首
+            self._queue.extendleft(reversed(rest))
+        return batch, depth, size
+
+    def _loop(self):
+        while True:
+            collected = self._collect()
+            if collected is None:
+                return
+            batch, depth, size = collected
+            start = time.perf_counter()
+            try:
+                runner = self._runner(size)
+                for i, (face, audio, _, _) in enumerate(batch):
+                    runner.face_input[i].copy_(face[0])
+                    runner.audio_input[i].copy_(audio[0])
+                n = len(batch)
+                output = runner.run(runner.face_input[:n], runner.audio_input[:n])
+            except Exception as e:
+                for _, _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+
+            with self._cond:
+                self.batches += 1
+                self.histogram[len(batch)] += 1
+                self._depth_sum += depth
+                self.forward_s += elapsed
+                self.wait_ms.extend((start - submitted) * 1000 for _, _, _, submitted in batch)
+            # 输出缓冲下一个 batch 会被覆盖，分发前拷贝
+            for i, (_, _, future, _) in enumerate(batch):
+                future.set_result(output[i].copy())
+
+    def stats(self):
+        """批处理指标（可直接序列化为 JSON）"""
+        with self._cond:
+            wait = np.array(self.wait_ms) if self.wait_ms else np.zeros(1)
+            frames = sum(k * v for k, v in self.histogram.items())
+            p50, p95, p99 = np.percentile(wait, [50, 95, 99])
+            return {
+                'requests': self.requests,
+                'batches': self.batches,
+                'queue_depth': len(self._queue),
+                'max_queue_depth': self.max_depth,
+                'mean_queue_depth': self._depth_sum / self.batches if self.batches else 0.0,
+                'batch_histogram': {str(k): v for k, v in sorted(self.histogram.items())},
+                'mean_batch': frames / self.batches if self.batches else 0.0,
+                'wait_ms': {'p50': float(p50), 'p95': float(p95), 'p99': float(p99)},
+                'forward_ms': self.forward_s / self.batches * 1000 if self.batches else 0.0,
+                'forward_ms_per_frame': self.forward_s / frames * 1000 if frames else 0.0,
+            }
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+形象资源包加载（紧凑、惰性）
+
+ModelInfoLoader.load 为每个形象帧创建一个 ModelInfo$Frame 对象（index、rawPath / maskPath /
+sgPath 三个路径、rect 数组、startFlag / endFlag、actionName），再按 Region 分组。
+照搬到 Python 就是几千个 dict / 对象和几千个重复的路径字符串。
+
+AvatarBundle 打开形象目录时只做一次目录扫描和一次 JSON 解析，全部存成 NumPy 数组：
+
+- indices: [N] int32，形象帧号（升序）
+- boxes:   [N, 4] int32，bbox.j 的 [x1, x2, y1, y2]
+- flags:   [N] uint8 位掩码（FLAG_MASK / FLAG_SG / FLAG_START / FLAG_END / FLAG_SILENCE / FLAG_MOTION）
+- action:  [N] int16，动作名称表中的下标（-1 为无）
+- 路径表:  每个文件名只保存一次（sys.intern），完整路径在访问时拼接
+
+和 ModelInfoLoader 一致：没有人脸框的帧（Frame.check() 失败）不收录；
+config.j 的 need_png 为 0 且 raw_sg/、pha/ 都存在时 has_mask 为 True；
+静音 / 动作区间按 silence.load_regions 的规则解析，动作区间的首帧 / 末帧带 START / END 标记。
+
+frame(i) / bundle[i] 返回 __slots__ 的 FrameView，只保存 (bundle, 行号)；
+image / mask / sg 在访问时才读取（有 FrameStore 时直接取 mmap 视图）。
+
+用法:
+    bundle = AvatarBundle('avatar/')
+    view = bundle.frame(12)               # 按帧号
+    view.rect, view.raw_path, view.start_flag
+    image = view.image                    # 此时才解码
+    python bundle.py avatar/              # 打印摘要，对比逐帧 dict 的加载耗时和内存
+"""
+
+import os
+import sys
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from silence import load_regions, silence_region, TYPE_SILENCE
+
+
+FLAG_MASK = 1       # pha/ 中有对应的 alpha mask
+FLAG_SG = 2         # raw_sg/ 中有对应的帧
+FLAG_START = 4      # 动作区间的首帧
+FLAG_END = 8        # 动作区间的末帧
+FLAG_SILENCE = 16   # 属于静音区间
+FLAG_MOTION = 32    # 属于某个动作区间
+
+FRAME_SUFFIXES = ('.sij', '.jpg', '.jpeg', '.png')
+
+
+def scan_frames(frames_dir):
+    """{帧号: 文件名}，文件名经过 sys.intern；目录不存在时为空"""
+    names = {}
+    try:
+        entries = os.scandir(frames_dir)
+    except FileNotFoundError:
+        return names
+    with entries:
+        for entry in entries:
+            stem, dot, suffix = entry.name.rpartition('.')
+            if dot and stem.isdigit() and '.' + suffix.lower() in FRAME_SUFFIXES:
+                names[int(stem)] = sys.intern(entry.name)
+    return names
+
+
+class FrameView:
+    """单个形象帧的轻量视图（对应 ModelInfo$Frame），属性按需从 AvatarBundle 的数组中读取"""
+
+    __slots__ = ('bundle', 'row')
+
+    def __init__(self, bundle, row):
+        self.bundle = bundle
+        self.row = row
+
+    @property
+    def index(self):
+        return int(self.bundle.indices[self.row])
+
+    @property
+    def rect(self):
+        """[x1, x2, y1, y2]（int32 视图）"""
+        return self.bundle.boxes[self.row]
+
+    @property
+    def flags(self):
+        return int(self.bundle.flags[self.row])
+
+    @property
+    def raw_path(self):
+        return self.bundle.avatar_dir / 'raw_jpgs' / self.bundle.names[self.row]
+
+    @property
+    def mask_path(self):
+        if not self.flags & FLAG_MASK:
+            return None
+        return self.bundle.avatar_dir / 'pha' / self.bundle.names[self.row]
+
+    @property
+    def sg_path(self):
+        if not self.flags & FLAG_SG:
+            return None
+        return self.bundle.avatar_dir / 'raw_sg' / self.bundle.names[self.row]
+
+    @property
+    def start_flag(self):
+        return bool(self.flags & FLAG_START)
+
+    @property
+    def end_flag(self):
+        return bool(self.flags & FLAG_END)
+
+    @property
+    def action_name(self):
+        action = self.bundle.action[self.row]
+        return self.bundle.action_names[action] if action >= 0 else ''
+
+    @property
+    def image(self):
+        """RGB 原帧 [H, W, 3] uint8（访问时读取）"""
+        return self.bundle.load('raw_jpgs', self.row)
+
+    @property
+    def sg(self):
+        return self.bundle.load('raw_sg', self.row) if self.flags & FLAG_SG else None
+
+    @property
+    def mask(self):
+        """alpha mask [H, W] uint8，没有时为 None"""
+        path = self.mask_path
+        return cv2.imread(str(path), cv2.IMREAD_GRAYSCALE) if path is not None else None
+
+    def __repr__(self):
+        return (f"Frame{{index={self.index}, rawPath='{self.raw_path}', rect={self.rect.tolist()}, "
+                f"startFlag={self.start_flag}, endFlag={self.end_flag}, "
+                f"actionName='{self.action_name}'}}")
+
+
+class AvatarBundle:
+    """
+    Args:
+        avatar_dir: 形象目录（raw_jpgs/、可选 raw_sg/ 和 pha/、解密后的 bbox.j / config.j）
+        bbox_path: bbox.j 路径（默认 <avatar_dir>/bbox.j）
+        frame_store: 可选，FrameStore；给定时 image / sg 直接返回 mmap 视图
+    """
+
+    def __init__(self, avatar_dir, bbox_path=None, frame_store=None):
+        self.avatar_dir = Path(avatar_dir)
+        self.frame_store = frame_store
+
+        config_path = self.avatar_dir / 'config.j'
+        config = {}
+        if config_path.exists():
+            with open(config_path, 'r') as f:
+                config = json.load(f)
+        self.width = config.get('width', 540)
+        self.height = config.get('height', 960)
+        self.modelkind = config.get('modelkind', 0)
+
+        raw = scan_frames(self.avatar_dir / 'raw_jpgs')
+        sg = scan_frames(self.avatar_dir / 'raw_sg')
+        pha = scan_frames(self.avatar_dir / 'pha')
+        self.has_mask = (config.get('need_png', 0) == 0
+                         and (self.avatar_dir / 'raw_sg').is_dir() and (self.avatar_dir / 'pha').is_dir())
+
+        with open(bbox_path or self.avatar_dir / 'bbox.j', 'r') as f:
+            bboxes = json.load(f)
+        # Frame.check(): 有原帧路径且有人脸框
+        indices = sorted(i for i in raw if str(i) in bboxes)
+        self.indices = np.array(indices, dtype=np.int32)
+        self.boxes = np.array([bboxes[str(i)][:4] for i in indices], dtype=np.int32).reshape(-1, 4)
+        self.names = [raw[i] for i in indices]
+
+        flags = np.zeros(len(indices), dtype=np.uint8)
+        if self.has_mask:
+            flags[[row for row, i in enumerate(indices) if i in pha]] |= FLAG_MASK
+        flags[[row for row, i in enumerate(indices) if i in sg]] |= FLAG_SG
+        self.flags = flags
+
+        # 静音 / 动作区间：每个区间只保存 (名称, 行号数组)，帧上只留位标记和动作名下标
+        self.action = np.full(len(indices), -1, dtype=np.int16)
+        self.action_names = []
+        self.motion_regions = []
+        regions = load_regions(self.avatar_dir, indices)
+        silence = silence_region(regions, indices)
+        self.silence_name = silence.name
+        self.silence_rows = np.searchsorted(self.indices, silence.frames).astype(np.int32)
+        self.flags[self.silence_rows] |= FLAG_SILENCE
+        for region in regions:
+            if region.type == TYPE_SILENCE:
+                continue
+            rows = np.searchsorted(self.indices, region.frames).astype(np.int32)
+            self.flags[rows] |= FLAG_MOTION
+            self.flags[rows[0]] |= FLAG_START
+            self.flags[rows[-1]] |= FLAG_END
+            self.action[rows[[0, -1]]] = len(self.action_names)
+            self.action_names.append(sys.intern(region.name))
+            self.motion_regions.append((region.name, rows))
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, row):
+        if not -len(self) <= row < len(self):
+            raise IndexError(row)
+        return FrameView(self, row % len(self))
+
+    def __iter__(self):
+        return (FrameView(self, row) for row in range(len(self)))
+
+    def row_of(self, frame_index):
+        """帧号 → 行号"""
+        row = int(np.searchsorted(self.indices, frame_index))
+        if row >= len(self.indices) or self.indices[row] != frame_index:
+            raise KeyError(f"形象帧不存在: {frame_index}")
+        return row
+
+    def frame(self, frame_index):
+        """按帧号取 FrameView"""
+        return FrameView(self, self.row_of(frame_index))
+
+    def load(self, name, row):
+        """读取 raw_jpgs / raw_sg 中第 row 帧，RGB [H, W, 3] uint8"""
+        frame_index = int(self.indices[row])
+        if self.frame_store is not None and (name, frame_index) in self.frame_store:
+            return self.frame_store.get(name, frame_index)
+        path = self.avatar_dir / name / self.names[row]
+        image = cv2.imread(str(path))
+        if image is None:
+            raise IOError(f"无法读取帧: {path}")
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    def frames(self):
+        """[(帧号, 原帧路径)]，与 inference.list_frames 的格式一致（供 AvatarRenderer 等使用）"""
+        raw_dir = self.avatar_dir / 'raw_jpgs'
+        return [(int(i), raw_dir / name) for i, name in zip(self.indices, self.names)]
+
+    def bboxes(self):
+        """{帧号: [x1, x2, y1, y2]}，与 inference.load_bbox 的格式一致"""
+        return dict(zip(self.indices.tolist(), self.boxes.tolist()))
+
+    @property
+    def nbytes(self):
+        """数组部分占用的字节数（不含路径表）"""
+        return sum(a.nbytes for a in (self.indices, self.boxes, self.flags, self.action, self.silence_rows))
+
+
+def load_naive(avatar_dir):
+    """逐帧 dict 的直接移植（对照用）：每帧三个完整路径、rect 列表和各个标记"""
+    avatar_dir = Path(avatar_dir)
+    with open(avatar_dir / 'bbox.j', 'r') as f:
+        bboxes = json.load(f)
+    frames = []
+    for path in (avatar_dir / 'raw_jpgs').iterdir():
+        if not path.stem.isdigit() or str(int(path.stem)) not in bboxes:
+            continue
+        sg = avatar_dir / 'raw_sg' / path.name
+        mask = avatar_dir / 'pha' / path.name
+        frames.append({
+            'index': int(path.stem),
+            'rawPath': str(path.absolute()),
+            'maskPath': str(mask.absolute()) if mask.exists() else None,
+            'sgPath': str(sg.absolute()) if sg.exists() else None,
+            'rect': list(bboxes[str(int(path.stem))]),
+            'startFlag': False,
+            'endFlag': False,
+            'actionName': '',
+        })
+    frames.sort(key=lambda f: f['index'])
+    return frames
+
+
+def main():
+    import time
+    import argparse
+    import tracemalloc
+
+    parser = argparse.ArgumentParser(
+        description='形象资源包加载（紧凑、惰性）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python bundle.py avatar/
+  python bundle.py avatar/ --frame 12
+        """
+    )
+    parser.add_argument('avatar_dir', help='形象目录（含 raw_jpgs/、解密后的 bbox.j）')
+    parser.add_argument('--frame', type=int, default=None, help='打印该帧号的 Frame 信息并读取图像')
+
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📦 形象资源包")
+    print("=" * 60)
+
+    def measure(fn, repeat=5):
+        """耗时取多次的最小值（不开 tracemalloc），内存单独测一次"""
+        fn()
+        elapsed = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            elapsed.append(time.perf_counter() - start)
+        tracemalloc.start()
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return result, min(elapsed) * 1000, current, peak
+
+    bundle, bundle_ms, bundle_bytes, bundle_peak = measure(lambda: AvatarBundle(args.avatar_dir))
+    _, naive_ms, naive_bytes, naive_peak = measure(lambda: load_naive(args.avatar_dir))
+
+    print(f"\n   帧数: {len(bundle)}   尺寸: {bundle.width}x{bundle.height}   modelkind: {bundle.modelkind}   "
+          f"has_mask: {bundle.has_mask}")
+    print(f"   静音区间: {bundle.silence_name or '全部形象帧'}（{len(bundle.silence_rows)} 帧）   "
+          f"动作区间: {', '.join(f'{name}({len(rows)})' for name, rows in bundle.motion_regions) or '无'}")
+    print(f"\n   {'加载方式':<10} {'耗时(ms)':>9} {'常驻(KB)':>9} {'峰值(KB)':>9}")
+    print("   " + "-" * 42)
+    print(f"   {'AvatarBundle':<10} {bundle_ms:>9.2f} {bundle_bytes / 1024:>9.1f} {bundle_peak / 1024:>9.1f}")
+    print(f"   {'逐帧 dict':<10} {naive_ms:>9.2f} {naive_bytes / 1024:>9.1f} {naive_peak / 1024:>9.1f}")
+
+    if args.frame is not None:
+        view = bundle.frame(args.frame)
+        print(f"\n   {view!r}")
+        print(f"   图像: {view.image.shape}   mask: {None if view.mask is None else view.mask.shape}")
+
+    print("\n" + "=" * 60)
+    print("✅ 完成")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
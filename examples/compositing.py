@@ -0,0 +1,147 @@
+"""
+人脸混合与贴回（批量、原地）
+
+inference.py 中 blend_face / paste_face 的批量版本：
+- FaceBlender: 按 weight_168u.b 权重做 BlendGramAlpha 混合，
+  out = (generated * w + original * (255 - w)) / 255，结果与 blend_face 逐像素一致；
+  权重预先展开为 [S, S, 3] 的 uint16（避免逐元素广播），中间结果使用预分配的 uint16 缓冲，
+  直接写回 uint8 缓冲
+- paste_faces: 按预先算好的贴回几何（目标区域 + cv2.remap 定点映射表），把工作分辨率的
+  人脸直接重采样进原帧对应区域（dst 是原帧的视图，不经过中间图像）
+
+paste_face 会把整个人脸框 resize 到 168、贴入人脸、再 resize 回去，边距一圈原图也被重采样两次；
+这里的映射与 crop_face 的 resize → 中心裁剪严格互逆，只写回人脸覆盖的像素，边距保持原帧不变。
+同一形象帧的人脸框固定，几何只需计算一次。
+
+用法:
+    blender = FaceBlender(load_blend_weights('weight_168u.b')[160], max_batch=8)
+    blender.blend(generated, original)                 # 结果写回 generated
+    paste_faces(frames, generated, [paste_geometry(box) for box in boxes])
+"""
+import math
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from inference import crop_margin
+
+
+# 贴回区域在原帧中的位置（行 y1:y2、列 x1:x2）及 cv2.remap 的定点映射表
+PasteGeometry = namedtuple('PasteGeometry', ['y1', 'y2', 'x1', 'x2', 'map1', 'map2'])
+
+
+class FaceBlender:
+    """
+    批量 BlendGramAlpha
+
+    Args:
+        weights: numpy array [S, S], uint8，混合权重（load_blend_weights() 的某个分辨率）
+        max_batch: 预分配的 batch 容量，超出时自动扩容一次
+    """
+
+    def __init__(self, weights, max_batch=1):
+        weights = np.asarray(weights, dtype=np.uint8)
+        self.size = weights.shape[0]
+        self.weights = np.repeat(weights[..., None], 3, axis=2).astype(np.uint16)
+        self.inverse = 255 - self.weights
+        self._reserve(max_batch)
+
+    def _reserve(self, batch):
+        shape = (batch, self.size, self.size, 3)
+        self._acc = np.empty(shape, dtype=np.uint16)
+        self._tmp = np.empty(shape, dtype=np.uint16)
+
+    def blend(self, generated, original, out=None):
+        """
+        Args:
+            generated: uint8, [B, S, S, 3] 或 [S, S, 3]，模型输出
+            original: uint8，形状同 generated，原始人脸裁剪
+            out: uint8 输出缓冲，默认写回 generated
+
+        Returns:
+            out
+        """
+        if out is None:
+            out = generated
+        single = generated.ndim == 3
+        batch = 1 if single else len(generated)
+        if batch > len(self._acc):
+            self._reserve(batch)
+        acc = self._acc[0] if single else self._acc[:batch]
+        tmp = self._tmp[0] if single else self._tmp[:batch]
+
+        np.multiply(generated, self.weights, out=acc)
+        np.multiply(original, self.inverse, out=tmp)
+        np.add(acc, tmp, out=acc)
+        np.floor_divide(acc, 255, out=acc)
+        np.copyto(out, acc, casting='unsafe')
+        return out
+
+
+def paste_params(box, size=160):
+    """
+    计算工作分辨率人脸在原帧中的贴回参数（crop_face 的逆映射）
+
+    crop_face 把人脸框 resize 到 size + 2m 再裁掉边距 m；原帧像素 u 对应
+    resize 后的坐标 (u + 0.5) / s - 0.5，减去 m 即为人脸上的坐标，
+    整理为 (u - o) / s，其中偏移 o = x1 - 0.5 + (m + 0.5) * s。
+
+    Args:
+        box: [x1, x2, y1, y2]
+        size: 工作分辨率
+
+    Returns:
+        (y1, y2, x1, x2, sx, sy, ox, oy)：原帧中的贴回区域、缩放和偏移
+    """
+    x1, x2, y1, y2 = [int(v) for v in box]
+    m = crop_margin(size)
+    full = size + 2 * m
+    sx = (x2 - x1) / full
+    sy = (y2 - y1) / full
+    gx1, gx2 = x1 + math.floor(m * sx), x1 + math.ceil((m + size) * sx)
+    gy1, gy2 = y1 + math.floor(m * sy), y1 + math.ceil((m + size) * sy)
+    ox = x1 - 0.5 + (m + 0.5) * sx
+    oy = y1 - 0.5 + (m + 0.5) * sy
+    return gy1, gy2, gx1, gx2, sx, sy, ox, oy
+
+
+def geometry_from_params(params):
+    """由 paste_params() 的结果生成 remap 映射表"""
+    y1, y2, x1, x2, sx, sy, ox, oy = params
+    y1, y2, x1, x2 = int(y1), int(y2), int(x1), int(x2)
+    map_x = (np.arange(x1, x2) - ox) / sx
+    map_y = (np.arange(y1, y2) - oy) / sy
+    map_x, map_y = np.meshgrid(map_x.astype(np.float32), map_y.astype(np.float32))
+    map1, map2 = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+    return PasteGeometry(y1, y2, x1, x2, map1, map2)
+
+
+def paste_geometry(box, size=160):
+    """
+    计算工作分辨率人脸在原帧中的贴回几何
+
+    Args:
+        box: [x1, x2, y1, y2]
+        size: 工作分辨率
+
+    Returns:
+        PasteGeometry
+    """
+    return geometry_from_params(paste_params(box, size))
+
+
+def paste_faces(frames, faces, geometries):
+    """
+    把一批人脸原地贴回各自的原帧
+
+    Args:
+        frames: list of numpy array [H, W, 3], uint8（或 [B, H, W, 3] 数组）
+        faces: uint8, [B, S, S, 3]
+        geometries: list of PasteGeometry（由 paste_geometry() 预先算好）
+    """
+    for frame, face, geometry in zip(frames, faces, geometries):
+        # BORDER_TRANSPARENT: 映射到人脸之外的像素保持原帧不变
+        cv2.remap(face, geometry.map1, geometry.map2, cv2.INTER_LINEAR,
+                  dst=frame[geometry.y1:geometry.y2, geometry.x1:geometry.x2],
+                  borderMode=cv2.BORDER_TRANSPARENT)
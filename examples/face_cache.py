@@ -0,0 +1,106 @@
+"""
+UNet 输出缓存
+
+待机循环、重复的问候语和静音会反复产生几乎相同的 20 帧 BNF 窗口，配上同一个形象帧，
+每次都要重新跑一遍 MobileNetV2Unet。UNet 的输入只由 (形象帧号, 分辨率, BNF 窗口) 决定，
+FaceCache 以此为键缓存生成的 uint8 人脸：
+
+- BNF 窗口按 tolerance 量化（round(x / tolerance)）后取 blake2b 摘要，tolerance=0 时要求完全一致
+- 有界 LRU，按字节数限制内存（160x160x3 uint8 每项 75KB）
+- 线程安全，统计命中率、插入数和淘汰数
+
+量化是分桶而不是距离比较：相差小于 tolerance 的两个值仍可能落在相邻的桶里，
+tolerance 越大命中率越高、嘴型误差越大。
+
+用法:
+    cache = FaceCache(max_bytes=256 << 20, tolerance=0.05)
+    key = cache.key(frame_index, 160, window)       # window: [20, 256]
+    generated = cache.get(key)
+    if generated is None:
+        generated = run_unet(...)
+        cache.put(key, generated)
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class FaceCache:
+    """
+    Args:
+        max_bytes: 缓存的人脸总字节数上限
+        tolerance: BNF 量化步长，0 表示窗口必须完全相同
+    """
+
+    def __init__(self, max_bytes=256 << 20, tolerance=0.0):
+        self.max_bytes = max_bytes
+        self.tolerance = tolerance
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.inserts = 0
+        self.evictions = 0
+
+    def key(self, frame_index, size, window):
+        """缓存键：(形象帧号, 分辨率, 量化后 BNF 窗口的摘要)"""
+        window = np.ascontiguousarray(window, dtype=np.float32)
+        if self.tolerance > 0:
+            window = np.floor(window / self.tolerance + 0.5).astype(np.int32)
+        digest = hashlib.blake2b(window.tobytes(), digest_size=16).digest()
+        return frame_index, size, digest
+
+    def get(self, key):
+        """命中时返回人脸的副本（调用方会在其上原地混合），否则返回 None"""
+        with self._lock:
+            face = self._entries.get(key)
+            if face is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return face.copy()
+
+    def put(self, key, face):
+        """保存人脸的副本，超出 max_bytes 时淘汰最久未使用的项"""
+        face = np.array(face, dtype=np.uint8, copy=True)
+        if face.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old.nbytes
+            self._entries[key] = face
+            self.bytes += face.nbytes
+            self.inserts += 1
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """缓存指标（可直接序列化为 JSON）"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'tolerance': self.tolerance,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'inserts': self.inserts,
+                'evictions': self.evictions,
+            }
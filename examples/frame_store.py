@@ -0,0 +1,261 @@
+"""
+解码后的形象帧存储
+
+.sij 帧实际上是 JPEG，渲染循环每播放一轮待机动作就要把同样的几百张 JPEG 重新解码一遍。
+build_frame_store() 一次性把形象的 raw_jpgs / raw_sg 帧解码成一个 (N, H, W, 3) 的 uint8
+RGB 数组，保存为 .npy（np.lib.format.open_memmap 写入，不需要整块放进内存），
+旁边的 JSON 记录 (目录, 帧号) → 行号。
+
+FrameStore 以只读 mmap 方式打开：
+- get() 返回零拷贝的视图，没有解码，只有第一次访问时的缺页
+- 多个工作进程打开同一个文件时共享同一份 page cache，不会各自解码、各自占内存
+- 视图只读，需要原地修改（贴回人脸）时调用方自己 copy()
+
+人脸输入同理：形象帧不变，每帧按 bbox.j 裁剪 → resize → 中心裁剪 → 遮挡 → 归一化的结果
+也不变。build_face_store() 按工作分辨率预先算好每帧的
+
+- faces_<S>.npy: 归一化后的 6 通道模型输入 [N, 6, S, S] float32
+- crops_<S>.npy: 裁剪后的 uint8 人脸 [N, S, S, 3]（混合时作为原图）
+- faces.json:    帧号 → 行号，以及贴回参数（贴回区域、缩放、偏移，compositing.paste_params）
+
+渲染时 crop 阶段只剩切片。
+
+用法:
+    build_frame_store('avatar/')                   # 写出 avatar/frames.npy + avatar/frames.json
+    store = FrameStore('avatar/')
+    frame = store.get('raw_jpgs', 0)               # [960, 540, 3] uint8 RGB，只读视图
+
+    build_face_store('avatar/')                    # 写出 avatar/faces_160.npy 等
+    faces = FaceStore('avatar/')
+    face_input = faces.face_input(0, 160)          # torch.Tensor [1, 6, 160, 160]
+"""
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+
+from inference import list_frames, load_bbox, select_resolution, crop_face, preprocess_faces
+from compositing import paste_params, geometry_from_params
+
+
+STORE_FILE = 'frames.npy'
+INDEX_FILE = 'frames.json'
+FACE_INDEX_FILE = 'faces.json'
+
+# 默认打包的形象帧目录
+FRAME_DIRS = ('raw_jpgs', 'raw_sg')
+
+
+def build_frame_store(avatar_dir, output_dir=None, dirs=FRAME_DIRS, progress=None):
+    """
+    把形象帧解码为一个 mmap 文件
+
+    Args:
+        avatar_dir: 形象目录
+        output_dir: 输出目录（默认与 avatar_dir 相同）
+        dirs: 要打包的帧目录，不存在的目录跳过
+        progress: 可选回调 progress(已完成, 总数)
+
+    Returns:
+        FrameStore
+    """
+    avatar_dir = Path(avatar_dir)
+    output_dir = Path(output_dir or avatar_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    sources = [(name, index, path) for name in dirs if (avatar_dir / name).is_dir()
+               for index, path in list_frames(avatar_dir / name)]
+    if not sources:
+        raise ValueError(f"未在 {avatar_dir} 中找到帧（{', '.join(dirs)}）")
+
+    first = cv2.imread(str(sources[0][2]))
+    if first is None:
+        raise IOError(f"无法读取帧: {sources[0][2]}")
+    shape = (len(sources),) + first.shape
+
+    # 先写入临时文件，完成后再替换，读者不会看到写了一半的存储
+    store_path = output_dir / STORE_FILE
+    partial = output_dir / (STORE_FILE + '.partial')
+    array = np.lib.format.open_memmap(partial, mode='w+', dtype=np.uint8, shape=shape)
+    index = {name: {} for name in dirs}
+    for row, (name, frame_index, path) in enumerate(sources):
+        image = cv2.imread(str(path))
+        if image is None:
+            raise IOError(f"无法读取帧: {path}")
+        if image.shape != first.shape:
+            raise ValueError(f"帧尺寸不一致: {path} {image.shape}，应为 {first.shape}")
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=array[row])
+        index[name][str(frame_index)] = row
+        if progress is not None:
+            progress(row + 1, len(sources))
+    array.flush()
+    del array
+    partial.replace(store_path)
+
+    with open(output_dir / INDEX_FILE, 'w') as f:
+        json.dump({'shape': list(shape), 'color': 'RGB', 'frames': index}, f)
+    return FrameStore(output_dir)
+
+
+class FrameStore:
+    """
+    只读的解码帧存储
+
+    Args:
+        store_dir: 含 frames.npy 与 frames.json 的目录（通常就是形象目录）
+    """
+
+    def __init__(self, store_dir):
+        store_dir = Path(store_dir)
+        with open(store_dir / INDEX_FILE, 'r') as f:
+            meta = json.load(f)
+        self.array = np.load(store_dir / STORE_FILE, mmap_mode='r')
+        if list(self.array.shape) != meta['shape']:
+            raise ValueError(f"{store_dir / STORE_FILE} 与索引不一致，请重新生成")
+        self.index = {name: {int(k): v for k, v in rows.items()}
+                      for name, rows in meta['frames'].items()}
+
+    @classmethod
+    def exists(cls, store_dir):
+        store_dir = Path(store_dir)
+        return (store_dir / STORE_FILE).exists() and (store_dir / INDEX_FILE).exists()
+
+    def __contains__(self, key):
+        name, frame_index = key
+        return frame_index in self.index.get(name, ())
+
+    def __len__(self):
+        return len(self.array)
+
+    def get(self, name, frame_index):
+        """(目录, 帧号) → [H, W, 3] uint8 RGB 只读视图"""
+        return self.array[self.index[name][frame_index]]
+
+    def warm(self, name, frame_indices):
+        """
+        提前把这些帧的页面读入 page cache（每页读一个字节），之后 get() 不再缺页
+
+        配合 Playlist.upcoming() 使用：播放顺序已知时，可以在帧真正被用到之前预取。
+        """
+        rows = self.index.get(name, {})
+        page = 4096
+        total = 0
+        for frame_index in frame_indices:
+            row = rows.get(int(frame_index))
+            if row is not None:
+                total += int(self.array[row].reshape(-1)[::page].sum())
+        return total
+
+    @property
+    def nbytes(self):
+        return self.array.nbytes
+
+
+def build_face_store(avatar_dir, output_dir=None, size=None, bbox_path=None, progress=None):
+    """
+    预先计算每个形象帧的人脸裁剪、模型输入和贴回参数
+
+    Args:
+        avatar_dir: 形象目录（raw_jpgs/、解密后的 bbox.j）
+        output_dir: 输出目录（默认与 avatar_dir 相同）
+        size: 工作分辨率，None 时与渲染器一样按人脸框大小逐帧选择
+        bbox_path: bbox.j 路径（默认 <avatar_dir>/bbox.j）
+        progress: 可选回调 progress(已完成, 总数)
+
+    Returns:
+        FaceStore
+    """
+    avatar_dir = Path(avatar_dir)
+    output_dir = Path(output_dir or avatar_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    bboxes = load_bbox(bbox_path or avatar_dir / 'bbox.j')
+    frames = [(i, path) for i, path in list_frames(avatar_dir / 'raw_jpgs') if i in bboxes]
+    if not frames:
+        raise ValueError(f"未在 {avatar_dir / 'raw_jpgs'} 找到带 bbox 的帧")
+
+    groups = {}
+    for frame_index, path in frames:
+        groups.setdefault(size or select_resolution(bboxes[frame_index]), []).append((frame_index, path))
+
+    meta = {'sizes': {}}
+    done = 0
+    for face_size, items in sorted(groups.items()):
+        inputs_path = output_dir / f'faces_{face_size}.npy'
+        crops_path = output_dir / f'crops_{face_size}.npy'
+        inputs = np.lib.format.open_memmap(inputs_path.with_suffix('.npy.partial'), mode='w+',
+                                           dtype=np.float32, shape=(len(items), 6, face_size, face_size))
+        crops = np.lib.format.open_memmap(crops_path.with_suffix('.npy.partial'), mode='w+',
+                                          dtype=np.uint8, shape=(len(items), face_size, face_size, 3))
+        rows, params = {}, {}
+        for row, (frame_index, path) in enumerate(items):
+            image = cv2.imread(str(path))
+            if image is None:
+                raise IOError(f"无法读取帧: {path}")
+            box = bboxes[frame_index]
+            crops[row] = crop_face(cv2.cvtColor(image, cv2.COLOR_BGR2RGB), box, face_size)
+            # 与渲染器的 crop 阶段是同一个函数，结果逐位一致
+            preprocess_faces(crops[row:row + 1], size=face_size, out=torch.from_numpy(inputs[row:row + 1]))
+            rows[str(frame_index)] = row
+            params[str(frame_index)] = list(paste_params(box, face_size))
+            done += 1
+            if progress is not None:
+                progress(done, len(frames))
+        for array, path in ((inputs, inputs_path), (crops, crops_path)):
+            array.flush()
+            path.with_suffix('.npy.partial').replace(path)
+        del inputs, crops
+        meta['sizes'][str(face_size)] = {'frames': rows, 'geometry': params}
+
+    with open(output_dir / FACE_INDEX_FILE, 'w') as f:
+        json.dump(meta, f)
+    return FaceStore(output_dir)
+
+
+class FaceStore:
+    """
+    预先计算的人脸输入存储（只读 mmap）
+
+    Args:
+        store_dir: 含 faces.json、faces_<S>.npy、crops_<S>.npy 的目录
+    """
+
+    def __init__(self, store_dir):
+        store_dir = Path(store_dir)
+        with open(store_dir / FACE_INDEX_FILE, 'r') as f:
+            meta = json.load(f)
+        self.inputs, self.crops, self.rows, self.params = {}, {}, {}, {}
+        for key, entry in meta['sizes'].items():
+            size = int(key)
+            # copy-on-write 映射：torch.from_numpy 要求可写数组，未写入的页仍与其他进程共享
+            self.inputs[size] = np.load(store_dir / f'faces_{size}.npy', mmap_mode='c')
+            self.crops[size] = np.load(store_dir / f'crops_{size}.npy', mmap_mode='r')
+            self.rows[size] = {int(k): v for k, v in entry['frames'].items()}
+            self.params[size] = {int(k): v for k, v in entry['geometry'].items()}
+
+    @classmethod
+    def exists(cls, store_dir):
+        return (Path(store_dir) / FACE_INDEX_FILE).exists()
+
+    def __contains__(self, key):
+        frame_index, size = key
+        return frame_index in self.rows.get(size, ())
+
+    def face_input(self, frame_index, size):
+        """归一化的 6 通道模型输入，torch.Tensor [1, 6, S, S] float32（零拷贝）"""
+        row = self.rows[size][frame_index]
+        return torch.from_numpy(self.inputs[size][row:row + 1])
+
+    def crop(self, frame_index, size):
+        """裁剪后的 uint8 人脸 [S, S, 3]（只读视图）"""
+        return self.crops[size][self.rows[size][frame_index]]
+
+    def geometry(self, frame_index, size):
+        """贴回几何 PasteGeometry"""
+        return geometry_from_params(self.params[size][frame_index])
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self.inputs.values()) + sum(a.nbytes for a in self.crops.values())
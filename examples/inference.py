@@ -6,25 +6,91 @@ DUIX 模型推理示例
 
 import sys
 import os
+import copy
+import json
 
 # 添加 models 目录到路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'models'))
 
 import torch
+import torch.fx.experimental.optimization
 import torch.nn.functional as F
 import numpy as np
 
 try:
     from MobileNet_Fixed import MobileNetV2Unet
-except ImportError:
-    print("请确保 models/MobileNet_Fixed.py 存在")
+    from ncnn_weights import load_ncnn_weights, print_report
+    from arena import ArenaUnet
+except ImportError as e:
+    print(f"❌ 导入模型代码失败: {e}")
+    print("请确保 models/ 下的 MobileNet_Fixed.py、ncnn_weights.py、arena.py 存在")
     sys.exit(1)
 
 
-def create_model(use_gpu=True, use_groupnorm=False):
-    """创建模型"""
-    model = MobileNetV2Unet(use_groupnorm=use_groupnorm)
+# preprocess_faces 归一化用的常量（避免每次调用新建标量张量）
+_MINUS_ONE = torch.tensor(-1.0)
+
+# 推理精度
+PRECISIONS = {
+    'fp32': torch.float32,
+    'bf16': torch.bfloat16,
+    'fp16': torch.float16,
+}
+
+
+def model_dtype(model):
+    """模型浮点参数的类型（量化模型等没有浮点参数时返回 float32）"""
+    for param in model.parameters():
+        if param.is_floating_point():
+            return param.dtype
+    return torch.float32
+
+
+def create_model(use_gpu=True, use_groupnorm=False, weights_path=None,
+                 quantized_path=None, ncnn_param=None, ncnn_bin=None,
+                 precision='fp32', fuse=False, config=None, arena=False, precision_samples=None):
+    """
+    创建模型
+    
+    Args:
+        use_gpu: 是否使用 GPU（量化模型只能在 CPU 上运行）
+        use_groupnorm: 是否使用 GroupNorm
+        weights_path: 可选，fp32 权重文件（state_dict）路径
+        quantized_path: 可选，INT8 量化模型路径（由 tools/quantize_model.py 生成的 TorchScript）
+        ncnn_param, ncnn_bin: 可选，解密后的 NCNN 模型文件，权重以 mmap 零拷贝方式加载
+        precision: 'fp32' / 'bf16' / 'fp16'；低精度需通过 check_precision() 的精度检查，
+                   否则保持 fp32
+        fuse: 是否把 BN 折叠进前面的卷积（返回 FX GraphModule，仅用于推理）
+        config: 可选，通道配置 dict 或 JSON 路径（由 tools/prune_model.py 生成的剪枝模型）
+        arena: 是否使用静态缓冲推理模式（models/arena.py，输出张量下一帧会被覆盖）
+        precision_samples: 低精度检查用的真实样本（precision_samples() 的结果），
+                           None 时用随机输入，检查较弱
+    
+    Returns:
+        MobileNetV2Unet 或量化后的 TorchScript 模块
+    """
+    if quantized_path is not None:
+        # 量化模型已固化为 TorchScript，结构与权重均在文件中
+        model = torch.jit.load(quantized_path, map_location='cpu')
+        model.eval()
+        print(f"使用 CPU（INT8 量化模型: {quantized_path}）")
+        return model
+    
+    if isinstance(config, (str, os.PathLike)):
+        with open(config) as f:
+            config = json.load(f)
+    model = MobileNetV2Unet(use_groupnorm=use_groupnorm, config=config)
+    if weights_path is not None:
+        state_dict = torch.load(weights_path, map_location='cpu')
+        model.load_state_dict(state_dict)
+    if ncnn_param is not None and ncnn_bin is not None:
+        report = load_ncnn_weights(model, ncnn_param, ncnn_bin)
+        print(f"加载 NCNN 权重: {ncnn_bin}")
+        print_report(report)
     model.eval()
+    if fuse and not arena:
+        # 推理时 BN 是固定的仿射变换，折叠进卷积权重后省掉一次逐元素遍历
+        model = torch.fx.experimental.optimization.fuse(model)
     
     if use_gpu and torch.cuda.is_available():
         model = model.cuda()
@@ -32,9 +98,109 @@ def create_model(use_gpu=True, use_groupnorm=False):
     else:
         print("使用 CPU")
     
+    if precision != 'fp32':
+        if precision_samples is None:
+            print(f"⚠️  {precision} 精度检查使用随机输入，结果仅供参考")
+        report = check_precision(model, PRECISIONS[precision], precision_samples)
+        print(f"{precision} 精度检查: 平均差 {report['mean_diff']:.3f}, "
+              f"最大差 {report['max_diff']}（uint8）")
+        if report['ok']:
+            model = model.to(PRECISIONS[precision])
+            print(f"使用 {precision} 推理")
+        else:
+            print(f"⚠️  {precision} 输出差异超过阈值，保持 fp32")
+    
+    if arena:
+        # BN 已折叠进 ArenaUnet 的权重，不需要再 fuse
+        model = ArenaUnet(model)
+        print("使用静态缓冲推理模式")
+    
     return model
 
 
+@torch.no_grad()
+def check_precision(model, dtype, samples=None, num_samples=4,
+                    max_mean_diff=1.0, max_abs_diff=16, seed=0):
+    """
+    检查低精度推理相对 fp32 的 uint8 输出差异
+    
+    预处理、模型和后处理全部在 dtype 下运行，与 fp32 全流程的 uint8 结果比较。
+    
+    Args:
+        model: fp32 模型
+        dtype: torch.bfloat16 或 torch.float16
+        samples: 可选，list of (current_frame, reference_frame, audio_features)，
+                 建议用 precision_samples() 从形象和 BNF 构造。默认使用随机输入：
+                 随机噪声的人脸和 BNF 与真实数据的数值分布不同，通过检查不代表
+                 真实输入上的误差也在阈值内
+        num_samples: 随机样本数
+        max_mean_diff: 允许的平均绝对差（uint8 灰度级）
+        max_abs_diff: 允许的最大绝对差（uint8 灰度级）
+    
+    Returns:
+        dict: mean_diff, max_diff, ok
+    """
+    device = next(model.parameters()).device
+    low_model = copy.deepcopy(model).to(dtype)
+    
+    if samples is None:
+        rng = np.random.RandomState(seed)
+        samples = [(rng.randint(0, 256, (160, 160, 3), dtype=np.uint8),
+                    rng.randint(0, 256, (160, 160, 3), dtype=np.uint8),
+                    rng.randn(256, 20).astype(np.float32))
+                   for _ in range(num_samples)]
+    
+    diffs = []
+    for current_frame, reference_frame, audio_features in samples:
+        audio = preprocess_audio(audio_features).to(device)
+        ref = model(preprocess_face(current_frame, reference_frame).to(device), audio)
+        out = low_model(preprocess_face(current_frame, reference_frame, dtype=dtype).to(device),
+                        audio.to(dtype))
+        diff = np.abs(postprocess_output(ref).astype(np.int16) -
+                      postprocess_output(out).astype(np.int16))
+        diffs.append(diff)
+    
+    diffs = np.stack(diffs)
+    mean_diff = float(diffs.mean())
+    max_diff = int(diffs.max())
+    return {
+        'mean_diff': mean_diff,
+        'max_diff': max_diff,
+        'ok': mean_diff <= max_mean_diff and max_diff <= max_abs_diff,
+    }
+
+
+def precision_samples(avatar_dir, bnf_path, num_samples=4, seed=0):
+    """
+    从形象目录和 BNF 特征构造 check_precision() 的样本
+    
+    BNF 索引均匀覆盖整段音频，形象帧按索引循环取用（与 tools/quantize_model.py 的校准样本一致）。
+    
+    Returns:
+        list of (current_frame, reference_frame, audio_features)
+    """
+    import cv2
+    from pathlib import Path
+    
+    avatar_dir = Path(avatar_dir)
+    bboxes = load_bbox(avatar_dir / 'bbox.j')
+    frames = [(idx, path) for idx, path in list_frames(avatar_dir / 'raw_jpgs') if idx in bboxes]
+    if not frames:
+        raise ValueError(f"未在 {avatar_dir / 'raw_jpgs'} 找到带 bbox 的帧")
+    
+    bnf = np.load(bnf_path).astype(np.float32)
+    indices = np.linspace(0, len(bnf) - 1, num_samples).astype(int)
+    np.random.RandomState(seed).shuffle(indices)
+    
+    samples = []
+    for bnf_index in indices:
+        frame_index, frame_path = frames[bnf_index % len(frames)]
+        image = cv2.cvtColor(cv2.imread(str(frame_path)), cv2.COLOR_BGR2RGB)
+        face = crop_face(image, bboxes[frame_index])
+        samples.append((face, mask_face(face), bnf_window(bnf, bnf_index)))
+    return samples
+
+
 def preprocess_audio(audio_features):
     """
     预处理音频特征
@@ -66,22 +232,217 @@ def preprocess_audio(audio_features):
     return audio_features.unsqueeze(0)  # [1, 256, 20]
 
 
-def preprocess_face(current_frame, reference_frame):
+def load_bbox(bbox_path):
+    """
+    读取解密后的 bbox.j
+    
+    Args:
+        bbox_path: 解密后的 bbox.j（JSON: {"帧索引": [x1, x2, y1, y2]}）
+    
+    Returns:
+        dict, {帧索引(int): [x1, x2, y1, y2]}
+    """
+    with open(bbox_path, 'r') as f:
+        data = json.load(f)
+    return {int(k): v for k, v in data.items()}
+
+
+def list_frames(frames_dir):
+    """
+    列出形象目录（raw_jpgs / raw_sg）中的帧文件，按数字文件名排序
+    
+    .sij 文件实际上是 JPEG，也兼容 .jpg/.png。
+    
+    Returns:
+        list of (帧索引, Path)
+    """
+    from pathlib import Path
+    
+    frames = []
+    for path in Path(frames_dir).iterdir():
+        if path.suffix.lower() in ('.sij', '.jpg', '.jpeg', '.png') and path.stem.isdigit():
+            frames.append((int(path.stem), path))
+    frames.sort()
+    return frames
+
+
+def bnf_window(bnf_features, index, step=20):
+    """
+    取第 index 帧对应的 BNF 窗口
+    
+    WeNet 输出的 BNF 每帧 40ms，与 25fps 视频帧一一对应。以 index 为中心
+    取 step 帧，越界部分补零。
+    
+    Args:
+        bnf_features: numpy array, shape [T, 256]
+        index: 视频帧（BNF）索引
+        step: 窗口长度（默认 20，对应 Mobunet 的 m_wenetstep）
+    
+    Returns:
+        numpy array, shape [step, 256]
+    """
+    T = bnf_features.shape[0]
+    start = index - step // 2
+    window = np.zeros((step, bnf_features.shape[1]), dtype=np.float32)
+    lo = max(start, 0)
+    hi = min(start + step, T)
+    if hi > lo:
+        window[lo - start:hi - start] = bnf_features[lo:hi]
+    return window
+
+
+# 支持的工作分辨率（与原生 Mobunet 的 rect 参数一致）
+RESOLUTIONS = (128, 160)
+
+
+def crop_margin(size):
+    """裁剪边距：160 时 resize 到 168 再裁掉四周 4 像素，其他分辨率按比例缩放"""
+    return size // 40
+
+
+def select_resolution(box, small_face=134):
+    """
+    根据屏幕上的人脸尺寸选择工作分辨率
+    
+    人脸框边长不超过 small_face（128 分辨率加边距后的尺寸）时，
+    160 分辨率只是在放大像素，改用 128 可以省下约 36% 的计算量。
+    
+    Args:
+        box: [x1, x2, y1, y2]
+        small_face: 使用 128 分辨率的人脸边长阈值（像素）
+    
+    Returns:
+        128 或 160
+    """
+    x1, x2, y1, y2 = box
+    return 128 if max(x2 - x1, y2 - y1) <= small_face else 160
+
+
+def crop_face(frame, box, size=160):
+    """
+    按 bbox.j 的人脸框裁剪人脸
+    
+    流程与原生 SDK 一致：按 [x1, x2, y1, y2] 裁剪 → resize 到 168x168
+    → 中心裁剪 160x160（坐标 (4,4) 到 (164,164)）。128 分辨率按比例
+    resize 到 134x134 再裁剪 (3,3) 到 (131,131)。
+    
+    Args:
+        frame: numpy array, shape [H, W, 3], uint8
+        box: [x1, x2, y1, y2]
+        size: 工作分辨率（128 或 160）
+    
+    Returns:
+        numpy array, shape [size, size, 3], uint8
+    """
+    import cv2
+    
+    x1, x2, y1, y2 = [int(v) for v in box]
+    m = crop_margin(size)
+    face = cv2.resize(frame[y1:y2, x1:x2], (size + 2 * m, size + 2 * m),
+                      interpolation=cv2.INTER_LINEAR)
+    return face[m:m + size, m:m + size]
+
+
+def mask_face(face):
+    """
+    生成遮挡嘴部区域的 mask 图像
+    
+    在 160x160 人脸上用黑色矩形 (5,5)-(150,145) 遮挡下半脸，
+    与模型训练时的遮挡方式一致；其他分辨率按比例缩放矩形。
+    
+    Args:
+        face: numpy array, shape [S, S, 3], uint8
+    
+    Returns:
+        numpy array, shape [S, S, 3], uint8
+    """
+    top, bottom, left, right = mask_rect(face.shape[0])
+    masked = face.copy()
+    masked[top:bottom, left:right] = 0
+    return masked
+
+
+def mask_rect(size):
+    """工作分辨率下嘴部遮挡矩形的 (top, bottom, left, right)，160 时为 (5, 146, 5, 151)"""
+    scale = size / 160
+    return round(5 * scale), round(146 * scale), round(5 * scale), round(151 * scale)
+
+
+def load_blend_weights(weights_path):
+    """
+    加载 Alpha 混合权重（解密后的 weight_168u.b）
+    
+    与原生 Mobunet::initModel 一致：前 160x160 字节为 mat_weights，
+    再 resize 出 128x128 的 mat_weightmin。
+    
+    Returns:
+        dict, {分辨率: numpy array [S, S], uint8}
+    """
+    import cv2
+    
+    weights = np.fromfile(weights_path, dtype=np.uint8, count=160 * 160).reshape(160, 160)
+    return {160: weights, 128: cv2.resize(weights, (128, 128))}
+
+
+def blend_face(generated, original, weights):
+    """
+    按权重 mask 将生成的人脸融合回原始裁剪（对应原生 BlendGramAlpha）
+    
+    out = (generated * w + original * (255 - w)) / 255
+    
+    Args:
+        generated: numpy array, shape [S, S, 3], uint8，模型输出
+        original: numpy array, shape [S, S, 3], uint8，原始人脸裁剪
+        weights: numpy array, shape [S, S], uint8
+    
+    Returns:
+        numpy array, shape [S, S, 3], uint8
+    """
+    w = weights.astype(np.uint16)[..., None]
+    out = generated.astype(np.uint16) * w + original.astype(np.uint16) * (255 - w)
+    return (out // 255).astype(np.uint8)
+
+
+def paste_face(frame, face, box):
+    """
+    将工作分辨率的人脸贴回原始帧（crop_face 的逆过程，原地修改 frame）
+    
+    Args:
+        frame: numpy array, shape [H, W, 3], uint8
+        face: numpy array, shape [S, S, 3], uint8
+        box: [x1, x2, y1, y2]
+    """
+    import cv2
+    
+    x1, x2, y1, y2 = [int(v) for v in box]
+    size = face.shape[0]
+    m = crop_margin(size)
+    region = cv2.resize(frame[y1:y2, x1:x2], (size + 2 * m, size + 2 * m),
+                        interpolation=cv2.INTER_LINEAR)
+    region[m:m + size, m:m + size] = face
+    frame[y1:y2, x1:x2] = cv2.resize(region, (x2 - x1, y2 - y1), interpolation=cv2.INTER_LINEAR)
+
+
+def preprocess_face(current_frame, reference_frame, dtype=torch.float32, size=160):
     """
     预处理人脸图像
     
     Args:
         current_frame: numpy array, shape [H, W, 3], uint8 [0-255]
         reference_frame: numpy array, shape [H, W, 3], uint8 [0-255]
+        dtype: 计算与输出精度（float32 / bfloat16 / float16）
+        size: 工作分辨率（128 或 160）
     
     Returns:
-        torch.Tensor, shape [1, 6, H, W]
+        torch.Tensor, shape [1, 6, size, size]
     """
     # 转换为 tensor
     if isinstance(current_frame, np.ndarray):
-        current_frame = torch.from_numpy(current_frame).float()
+        current_frame = torch.from_numpy(current_frame)
     if isinstance(reference_frame, np.ndarray):
-        reference_frame = torch.from_numpy(reference_frame).float()
+        reference_frame = torch.from_numpy(reference_frame)
+    current_frame = current_frame.to(dtype)
+    reference_frame = reference_frame.to(dtype)
     
     # 归一化到 [-1, 1]
     current_frame = (current_frame / 255.0) * 2 - 1
@@ -94,10 +455,65 @@ def preprocess_face(current_frame, reference_frame):
     # 合并通道
     face = torch.cat([current_frame, reference_frame], dim=0)  # [6, H, W]
     
-    # 调整大小到 160x160
-    face = F.interpolate(face.unsqueeze(0), size=(160, 160), mode='bilinear', align_corners=False)
+    # 调整大小到工作分辨率
+    face = F.interpolate(face.unsqueeze(0), size=(size, size), mode='bilinear', align_corners=False)
+    
+    return face  # [1, 6, size, size]
+
+
+def preprocess_faces(faces, masks=None, size=160, dtype=torch.float32, out=None):
+    """
+    批量预处理人脸（preprocess_face 的批量版本）
+    
+    先在 uint8 上 resize 到工作分辨率（输入已是工作分辨率时跳过），
+    再一次遍历完成 uint8 → 浮点、归一化到 [-1, 1] 和 HWC → CHW，直接写入 out。
+    
+    Args:
+        faces: uint8，[B, H, W, 3] 数组或 [H, W, 3] 数组的列表（尺寸可以不同）
+        masks: 遮挡图，格式同 faces；None 时按 mask_face 的矩形直接在 out 中生成，
+               省掉一次整图拷贝
+        size: 工作分辨率（128 或 160）
+        dtype: 输出精度（float32 / bfloat16 / float16），out 给定时以 out 为准
+        out: 可选，预分配的 [N, 6, size, size] 张量（N >= B），可重复使用
+    
+    Returns:
+        torch.Tensor, shape [B, 6, size, size]（out 的前 B 个）
+    """
+    import cv2
+    
+    batch = len(faces)
+    if out is None:
+        out = torch.empty(batch, 6, size, size, dtype=dtype)
+    out = out[:batch]
+    
+    def to_batch(images):
+        if isinstance(images, np.ndarray) and images.shape[1:3] == (size, size):
+            return torch.from_numpy(images)
+        return torch.from_numpy(np.stack([
+            image if image.shape[:2] == (size, size)
+            else cv2.resize(image, (size, size), interpolation=cv2.INTER_LINEAR)
+            for image in images
+        ]))
+    
+    # out = -1 + x * 2/255，同时完成类型转换和维度重排。
+    # float32 下先拷贝再原地归一化（混合类型相加会申请一块临时缓冲）；
+    # 低精度下 alpha 会先被舍入到输出精度，仍按 float32 计算后再截断
+    def normalize(images, dst):
+        images = to_batch(images).permute(0, 3, 1, 2)
+        if dst.dtype == torch.float32:
+            dst.copy_(images)
+            images = dst
+        torch.add(_MINUS_ONE, images, alpha=2 / 255.0, out=dst)
+    
+    normalize(faces, out[:, :3])
+    if masks is not None:
+        normalize(masks, out[:, 3:])
+    else:
+        top, bottom, left, right = mask_rect(size)
+        out[:, 3:].copy_(out[:, :3])
+        out[:, 3:, top:bottom, left:right].fill_(-1.0)
     
-    return face  # [1, 6, 160, 160]
+    return out
 
 
 def postprocess_output(output):
@@ -105,7 +521,8 @@ def postprocess_output(output):
     后处理模型输出
     
     Args:
-        output: torch.Tensor, shape [1, 3, H, W], range [-1, 1]
+        output: torch.Tensor, shape [1, 3, H, W], range [-1, 1]，
+                在输出的精度下计算（float32 / bfloat16 / float16）
     
     Returns:
         numpy array, shape [H, W, 3], uint8 [0-255]
@@ -117,14 +534,14 @@ def postprocess_output(output):
     # [1, 3, H, W] -> [H, W, 3]
     output = output[0].permute(1, 2, 0)
     
-    # 转换为 numpy
-    output = output.cpu().numpy().astype(np.uint8)
+    # 转换为 numpy（numpy 不支持 bfloat16，先在 torch 内截断为 uint8）
+    output = output.to(torch.uint8).cpu().numpy()
     
     return output
 
 
 @torch.no_grad()
-def inference(model, audio, face, device='cuda'):
+def inference(model, audio, face, device='cuda', dtype=None):
     """
     模型推理
     
@@ -133,13 +550,17 @@ def inference(model, audio, face, device='cuda'):
         audio: torch.Tensor, shape [B, 256, 20]
         face: torch.Tensor, shape [B, 6, H, W]
         device: 'cuda' 或 'cpu'
+        dtype: 输入精度，默认与模型参数一致
     
     Returns:
         torch.Tensor, shape [B, 3, H, W], range [-1, 1]
     """
+    if dtype is None:
+        dtype = model_dtype(model)
+    
     # 移动到设备
-    audio = audio.to(device)
-    face = face.to(device)
+    audio = audio.to(device, dtype)
+    face = face.to(device, dtype)
     
     # 推理
     output = model(face, audio)
@@ -147,6 +568,38 @@ def inference(model, audio, face, device='cuda'):
     return output
 
 
+@torch.no_grad()
+def render_face(model, frame, box, audio_features, blend_weights=None, size=None, device='cpu'):
+    """
+    单帧端到端推理：裁剪 → 遮挡 → 预处理 → 模型 → 后处理 → 混合 → 贴回
+    
+    Args:
+        model: MobileNetV2Unet（RGB 输入）
+        frame: numpy array, shape [H, W, 3], uint8 RGB，原地修改
+        box: [x1, x2, y1, y2]
+        audio_features: numpy array, BNF 窗口 [20, 256]
+        blend_weights: load_blend_weights() 的结果，None 时不混合
+        size: 工作分辨率，None 时由 select_resolution() 按人脸尺寸自动选择
+        device: 'cuda' 或 'cpu'
+    
+    Returns:
+        frame
+    """
+    if size is None:
+        size = select_resolution(box)
+    
+    face = crop_face(frame, box, size)
+    dtype = model_dtype(model)
+    face_input = preprocess_faces(face[None], size=size, dtype=dtype)
+    output = inference(model, preprocess_audio(audio_features), face_input, device, dtype)
+    generated = postprocess_output(output)
+    
+    if blend_weights is not None:
+        generated = blend_face(generated, face, blend_weights[size])
+    paste_face(frame, generated, box)
+    return frame
+
+
 def demo_random_input():
     """使用随机输入演示"""
     print("=" * 60)
@@ -236,35 +689,18 @@ def demo_image_input():
     print("=" * 60)
 
 
-def benchmark(num_iterations=100):
-    """性能测试"""
+def _time_model(model, face, audio, num_iterations, use_gpu):
+    """对单个模型计时，返回每次推理耗时（毫秒）"""
     import time
     
-    print("=" * 60)
-    print("DUIX 模型性能测试")
-    print("=" * 60)
-    
-    # 创建模型
-    use_gpu = torch.cuda.is_available()
-    model = create_model(use_gpu=use_gpu)
-    device = 'cuda' if use_gpu else 'cpu'
-    
-    # 准备输入
-    audio = torch.randn(1, 256, 20).to(device)
-    face = torch.randn(1, 6, 160, 160).to(device)
-    
     # 预热
-    print("\n预热...")
     for _ in range(10):
         _ = model(face, audio)
     
     if use_gpu:
         torch.cuda.synchronize()
     
-    # 测试
-    print(f"测试 {num_iterations} 次推理...")
     times = []
-    
     for _ in range(num_iterations):
         start = time.perf_counter()
         _ = model(face, audio)
@@ -272,14 +708,56 @@ def benchmark(num_iterations=100):
             torch.cuda.synchronize()
         times.append(time.perf_counter() - start)
     
-    times = np.array(times) * 1000  # 转换为毫秒
+    return np.array(times) * 1000  # 转换为毫秒
+
+
+@torch.no_grad()
+def benchmark(num_iterations=100, precision='fp32', avatar_dir=None, bnf_path=None):
+    """
+    性能测试
+    
+    precision 不为 fp32 时，同时测试 fp32 与低精度，并给出精度检查结果；
+    给出 avatar_dir 和 bnf_path 时精度检查使用真实人脸和 BNF，否则用随机输入。
+    只测单一形状的 UNet；各环节、各后端的扫描见 tools/benchmark_suite.py。
+    """
+    print("=" * 60)
+    print("DUIX 模型性能测试")
+    print("=" * 60)
+    
+    # 创建模型
+    use_gpu = torch.cuda.is_available()
+    model = create_model(use_gpu=use_gpu)
+    device = 'cuda' if use_gpu else 'cpu'
+    
+    models = {'fp32': model}
+    if precision != 'fp32':
+        samples = None
+        if avatar_dir is not None and bnf_path is not None:
+            samples = precision_samples(avatar_dir, bnf_path)
+        report = check_precision(model, PRECISIONS[precision], samples)
+        print(f"\n{precision} 精度检查（{'真实样本' if samples else '随机输入，仅供参考'}）: "
+              f"平均差 {report['mean_diff']:.3f}, "
+              f"最大差 {report['max_diff']}（uint8）, "
+              f"{'通过' if report['ok'] else '未通过'}")
+        models[precision] = copy.deepcopy(model).to(PRECISIONS[precision])
+    
+    # 准备输入
+    audio = torch.randn(1, 256, 20).to(device)
+    face = torch.randn(1, 6, 160, 160).to(device)
     
-    print(f"\n结果:")
-    print(f"  平均耗时: {times.mean():.2f} ms")
-    print(f"  最小耗时: {times.min():.2f} ms")
-    print(f"  最大耗时: {times.max():.2f} ms")
-    print(f"  标准差:   {times.std():.2f} ms")
-    print(f"  FPS:      {1000 / times.mean():.1f}")
+    for name, m in models.items():
+        dtype = PRECISIONS[name]
+        print(f"\n[{name}] 测试 {num_iterations} 次推理...")
+        times = _time_model(m, face.to(dtype), audio.to(dtype), num_iterations, use_gpu)
+        
+        print(f"\n结果 ({name}):")
+        print(f"  平均耗时: {times.mean():.2f} ms")
+        print(f"  最小耗时: {times.min():.2f} ms")
+        print(f"  最大耗时: {times.max():.2f} ms")
+        print(f"  标准差:   {times.std():.2f} ms")
+        p50, p95, p99 = np.percentile(times, [50, 95, 99])
+        print(f"  p50/p95/p99: {p50:.2f} / {p95:.2f} / {p99:.2f} ms")
+        print(f"  FPS:      {1000 / times.mean():.1f}")
     
     print("\n" + "=" * 60)
     print("✅ 性能测试完成")
@@ -295,6 +773,13 @@ if __name__ == "__main__":
                        help='运行模式: random(随机输入), image(图像输入), benchmark(性能测试)')
     parser.add_argument('--iterations', type=int, default=100,
                        help='性能测试迭代次数')
+    parser.add_argument('--precision', type=str, default='fp32',
+                       choices=list(PRECISIONS),
+                       help='性能测试精度: fp32, bf16, fp16（低精度时同时测试 fp32 对比）')
+    parser.add_argument('--avatar', type=str, default=None,
+                       help='形象目录（含 raw_jpgs/ 和解密后的 bbox.j），与 --bnf 一起用于低精度的精度检查')
+    parser.add_argument('--bnf', type=str, default=None,
+                       help='BNF 特征 .npy，与 --avatar 一起用于低精度的精度检查')
     
     args = parser.parse_args()
     
@@ -303,5 +788,5 @@ if __name__ == "__main__":
     elif args.mode == 'image':
         demo_image_input()
     elif args.mode == 'benchmark':
-        benchmark(args.iterations)
+        benchmark(args.iterations, args.precision, args.avatar, args.bnf)
 
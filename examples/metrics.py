@@ -0,0 +1,73 @@
+"""
+图像质量指标
+
+用于比较优化后模型（量化、低精度、剪枝等）与 fp32 基线的输出差异。
+所有函数输入均为 uint8 图像，形状 [H, W, 3] 或 [N, H, W, 3]。
+"""
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+
+def compute_psnr(a, b):
+    """
+    计算 PSNR（峰值信噪比）
+
+    Args:
+        a, b: numpy array, uint8, 形状相同
+
+    Returns:
+        float, 单位 dB；两图完全相同时返回 inf
+    """
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    if mse == 0:
+        return float('inf')
+    return 10 * np.log10(255.0 ** 2 / mse)
+
+
+def _gaussian_window(size=11, sigma=1.5):
+    coords = torch.arange(size, dtype=torch.float64) - size // 2
+    g = torch.exp(-coords ** 2 / (2 * sigma ** 2))
+    g = g / g.sum()
+    return (g[:, None] * g[None, :]).view(1, 1, size, size)
+
+
+def compute_ssim(a, b):
+    """
+    计算 SSIM（结构相似度），11x11 高斯窗口，sigma=1.5，按通道平均
+
+    Args:
+        a, b: numpy array, uint8, 形状 [H, W, 3] 或 [N, H, W, 3]
+
+    Returns:
+        float, 范围 [-1, 1]，1 表示完全相同
+    """
+    x = torch.from_numpy(np.ascontiguousarray(a)).double()
+    y = torch.from_numpy(np.ascontiguousarray(b)).double()
+    if x.dim() == 3:
+        x, y = x.unsqueeze(0), y.unsqueeze(0)
+
+    # [N, H, W, C] -> [N*C, 1, H, W]
+    n, h, w, c = x.shape
+    x = x.permute(0, 3, 1, 2).reshape(n * c, 1, h, w)
+    y = y.permute(0, 3, 1, 2).reshape(n * c, 1, h, w)
+
+    window = _gaussian_window()
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+
+    mu_x = F.conv2d(x, window)
+    mu_y = F.conv2d(y, window)
+    sigma_x = F.conv2d(x * x, window) - mu_x ** 2
+    sigma_y = F.conv2d(y * y, window) - mu_y ** 2
+    sigma_xy = F.conv2d(x * y, window) - mu_x * mu_y
+
+    ssim_map = ((2 * mu_x * mu_y + c1) * (2 * sigma_xy + c2)) / \
+               ((mu_x ** 2 + mu_y ** 2 + c1) * (sigma_x + sigma_y + c2))
+    return ssim_map.mean().item()
+
+
+def max_abs_diff(a, b):
+    """uint8 图像逐像素最大绝对差"""
+    return int(np.max(np.abs(a.astype(np.int16) - b.astype(np.int16))))
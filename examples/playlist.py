@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+预先计算的形象帧播放列表
+
+SDK 每个渲染周期按 ModelInfo$Frame 的 startFlag / endFlag / actionName 决定下一帧：
+待机时在静音区间内来回播放（0 → n → 0 ...），收到动作时播放对应的动作区间再回到待机。
+每一帧现算既浪费，也没法提前知道后面要用哪些帧。
+
+Playlist 把播放顺序预先展开成行号数组（AvatarBundle 的行号）：
+
+- 待机：静音区间的往返序列 [r0 .. rn, rn-1 .. r1]，第 t 帧为 idle[(t + phase) % len]
+- 动作：play(name, tick) 在 tick 之后等待待机走到离动作首帧最近的位置（最多 max_wait 帧），
+  然后正向播放动作区间，结束后从待机序列中离动作末帧最近的位置接着往返
+- frame_at(t) 是 O(1) 的数组下标；upcoming(t, n) 返回之后 n 帧，供预取
+  （FrameStore 页面、FaceStore / UNet 缓存）提前准备
+
+用法:
+    bundle = AvatarBundle('avatar/')
+    playlist = Playlist(bundle)
+    playlist.play('wave', tick=100)
+    frame_index = playlist.frame_at(t)          # 形象帧号
+    ahead = playlist.upcoming(t, 25)            # 之后 25 帧的帧号
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+
+def pingpong(rows):
+    """往返序列：[0, 1, .., n, n-1, .., 1]，长度 2n（只有一帧时为 [0]）"""
+    rows = np.asarray(rows, dtype=np.int32)
+    if len(rows) <= 2:
+        return rows.copy()
+    return np.concatenate([rows, rows[-2:0:-1]])
+
+
+class Playlist:
+    """
+    Args:
+        bundle: AvatarBundle
+        max_wait: 动作最多等待多少帧再切入（超过时从当前位置直接切入）
+    """
+
+    def __init__(self, bundle, max_wait=None):
+        self.bundle = bundle
+        self.idle = pingpong(bundle.silence_rows)
+        if len(self.idle) == 0:
+            raise ValueError(f"形象 {bundle.avatar_dir} 没有可用于待机的静音区间帧，无法生成播放列表")
+        self.actions = {name: rows for name, rows in bundle.motion_regions}
+        self.max_wait = len(self.idle) if max_wait is None else max_wait
+        # 已安排的部分：sequence[t] 为第 t 帧的行号；之后按 idle 从 tail_phase 接着往返
+        self.sequence = np.zeros(0, dtype=np.int32)
+        self.tail_phase = 0
+
+    # ---- 编排 ----
+
+    def _idle_until(self, ticks):
+        """把待机序列延长到 ticks 帧"""
+        count = ticks - len(self.sequence)
+        if count <= 0:
+            return
+        positions = (self.tail_phase + np.arange(count)) % len(self.idle)
+        self.sequence = np.concatenate([self.sequence, self.idle[positions]])
+        self.tail_phase = (self.tail_phase + count) % len(self.idle)
+
+    def _nearest_phase(self, frame_index, start_phase=0):
+        """从 start_phase 往后，待机序列中帧号离 frame_index 最近的位置（同样近时取先到的）"""
+        order = (start_phase + np.arange(len(self.idle))) % len(self.idle)
+        distance = np.abs(self.bundle.indices[self.idle[order]] - frame_index)
+        return int(order[np.argmin(distance)]), int(np.argmin(distance))
+
+    def play(self, name, tick=None):
+        """
+        安排一个动作
+
+        Args:
+            name: 动作名称（SpecialAction.json / config.j 中的动作区间）
+            tick: 最早开始的帧，None 表示当前已安排部分的末尾
+
+        Returns:
+            (开始帧, 结束帧)，结束帧不含
+        """
+        if name not in self.actions:
+            raise KeyError(f"动作不存在: {name}（可用: {', '.join(self.actions) or '无'}）")
+        rows = self.actions[name]
+        tick = len(self.sequence) if tick is None else tick
+        if tick < len(self.sequence):
+            raise ValueError(f"帧 {tick} 之前已安排到 {len(self.sequence)}，动作只能追加在末尾")
+        self._idle_until(tick)
+
+        indices = self.bundle.indices
+        _, wait = self._nearest_phase(indices[rows[0]], self.tail_phase)
+        if wait > self.max_wait:
+            wait = 0
+        self._idle_until(tick + wait)
+        start = len(self.sequence)
+        self.sequence = np.concatenate([self.sequence, rows.astype(np.int32)])
+        self.tail_phase, _ = self._nearest_phase(indices[rows[-1]])
+        return start, len(self.sequence)
+
+    # ---- 查询 ----
+
+    def row_at(self, tick):
+        """第 tick 帧的行号（O(1)）"""
+        if tick < len(self.sequence):
+            return int(self.sequence[tick])
+        return int(self.idle[(self.tail_phase + tick - len(self.sequence)) % len(self.idle)])
+
+    def frame_at(self, tick):
+        """第 tick 帧的形象帧号（O(1)）"""
+        return int(self.bundle.indices[self.row_at(tick)])
+
+    def rows(self, start, count):
+        """[start, start + count) 帧的行号数组"""
+        ticks = np.arange(start, start + count)
+        scheduled = ticks < len(self.sequence)
+        rows = np.empty(count, dtype=np.int32)
+        rows[scheduled] = self.sequence[ticks[scheduled]]
+        tail = ticks[~scheduled] - len(self.sequence) + self.tail_phase
+        rows[~scheduled] = self.idle[tail % len(self.idle)]
+        return rows
+
+    def upcoming(self, tick, count):
+        """之后 count 帧的形象帧号数组（含 tick），供预取"""
+        return self.bundle.indices[self.rows(tick, count)]
+
+    def frames(self, count):
+        """前 count 帧的 [(帧号, 原帧路径)]，可直接替换 AvatarRenderer.frames 的循环取用"""
+        raw_dir = self.bundle.avatar_dir / 'raw_jpgs'
+        return [(int(self.bundle.indices[r]), raw_dir / self.bundle.names[r]) for r in self.rows(0, count)]
+
+
+def main():
+    import time
+    import argparse
+
+    from bundle import AvatarBundle
+
+    parser = argparse.ArgumentParser(
+        description='预先计算的形象帧播放列表',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python playlist.py avatar/
+  python playlist.py avatar/ --action unknown@50 --ticks 120
+        """
+    )
+    parser.add_argument('avatar_dir', help='形象目录（含 raw_jpgs/、解密后的 bbox.j / config.j）')
+    parser.add_argument('--action', nargs='*', default=[],
+                        help='安排的动作，格式 名称@帧，如 wave@100')
+    parser.add_argument('--ticks', type=int, default=100, help='打印前 N 帧的播放顺序（默认: 100）')
+
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🎞️  形象帧播放列表")
+    print("=" * 60)
+
+    bundle = AvatarBundle(args.avatar_dir)
+    playlist = Playlist(bundle)
+    print(f"\n   待机往返: {len(playlist.idle)} 帧   动作: "
+          f"{', '.join(f'{n}({len(r)})' for n, r in playlist.actions.items()) or '无'}")
+
+    for spec in args.action:
+        name, _, tick = spec.rpartition('@')
+        start, end = playlist.play(name, int(tick))
+        print(f"   ▶ {name}: 请求于 {tick}，播放 [{start}, {end})")
+
+    sequence = playlist.upcoming(0, args.ticks)
+    print(f"\n   前 {args.ticks} 帧: {' '.join(map(str, sequence.tolist()))}")
+
+    ticks = np.random.RandomState(0).randint(0, 1 << 20, 100000)
+    start = time.perf_counter()
+    for t in ticks:
+        playlist.frame_at(int(t))
+    elapsed = (time.perf_counter() - start) / len(ticks)
+    print(f"\n   frame_at: {elapsed * 1e9:.0f} ns / 次")
+
+    print("\n" + "=" * 60)
+    print("✅ 完成")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
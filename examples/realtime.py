@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+实时帧调度（按播放时钟驱动 BNF 索引）
+
+对应原生 RenderThread.renderStep：按固定帧率从播放位置算出当前视频帧和 BNF 索引，
+推理线程在有界的提前量内先行渲染，播放端到点取帧：
+
+    视频帧 k  ←→  播放时刻 k / fps  ←→  BNF 索引 int(k / fps × 25)
+
+- lookahead: 推理最多领先播放头多少帧，限制内存和无效计算
+- delay:     播放相对音频到达的延迟（音画同步延后播放），给推理留出的时间
+- live:      直播模式下 BNF 随音频实时到达，窗口 [i - 10, i + 10) 的音频全部到达后才能渲染帧 i；
+             离线模式下 BNF 已全部就绪，只受 lookahead 限制
+- 推理跟不上时：到点未就绪的帧判为错过截止时间，重复显示上一帧；
+  按最近的单帧耗时估计已经来不及的帧不再渲染（丢帧），渲染完时已过期的帧直接丢弃
+
+统计：截止时间错过率、重复 / 丢帧数，以及音频到达 → 帧渲染完成的端到端延迟分位数，
+其 p99 即直播时需要的最小播放延迟，可用来评估硬件能否支撑直播。
+
+用法:
+    python realtime.py <avatar_dir> <bnf.npy> [选项]
+
+示例:
+    python realtime.py avatar/ audio_bnf.npy --fps 25 --lookahead 8 --delay 0.3
+    python realtime.py avatar/ audio_bnf.npy --live --delay 0.5 --workers 2 --threads 2
+"""
+
+import sys
+import os
+import math
+import time
+import threading
+
+# 添加 models 目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'models'))
+
+import numpy as np
+import torch
+
+from inference import create_model, load_blend_weights
+from render_pipeline import AvatarRenderer
+
+
+# WeNet BNF 帧率（每帧 40ms）
+BNF_FPS = 25
+# bnf_window 以索引为中心取 20 帧，右侧需要 10 帧之后的音频
+BNF_RIGHT_CONTEXT = 10
+
+
+class FrameScheduler:
+    """
+    按播放时钟调度帧渲染
+
+    Args:
+        render_fn: fn(k, bnf_index) -> 帧，在推理线程中调用
+        num_frames: 视频总帧数
+        fps: 视频帧率
+        lookahead: 推理最多领先播放头的帧数
+        delay: 播放延迟（秒），帧 k 的截止时间为 开始 + delay + k / fps
+        live: 是否按音频实时到达限制渲染
+        audio_latency: 直播模式下音频到达后得到 BNF 的额外延迟（秒，如 WeNet 推理）
+        num_bnf: BNF 总帧数（直播模式下用于计算窗口末尾的到达时间）
+        workers: 推理线程数
+        on_frame: 可选，fn(k, 帧, 是否重复)，每个播放时刻在播放线程中调用
+    """
+
+    def __init__(self, render_fn, num_frames, fps=25, lookahead=8, delay=0.2, live=False,
+                 audio_latency=0.0, num_bnf=None, workers=1, on_frame=None):
+        self.render_fn = render_fn
+        self.num_frames = num_frames
+        self.fps = fps
+        self.lookahead = lookahead
+        self.delay = delay
+        self.live = live
+        self.audio_latency = audio_latency
+        self.num_bnf = num_bnf
+        self.workers = workers
+        self.on_frame = on_frame
+
+        self._cond = threading.Condition()
+        self._ready = {}
+        self._next = 0
+        self._playhead = -1
+        self._stop = False
+        self._errors = []
+        self._start = None
+        self._estimate = None
+
+        self.render_ms = []
+        self.ready_latency = []
+        self.shown = 0
+        self.repeated = 0
+        self.skipped = 0
+        self.late = 0
+
+    def bnf_index(self, k):
+        """视频帧 k 对应的 BNF 索引"""
+        return int(k * BNF_FPS / self.fps)
+
+    def audio_time(self, k):
+        """帧 k 对应的音频到达时刻（相对开始）"""
+        return k / self.fps
+
+    def available_time(self, k):
+        """帧 k 可以开始渲染的时刻（相对开始）：BNF 窗口右端的音频到达并完成特征提取"""
+        if not self.live:
+            return 0.0
+        end = self.bnf_index(k) + BNF_RIGHT_CONTEXT
+        if self.num_bnf is not None:
+            end = min(end, self.num_bnf)
+        return end / BNF_FPS + self.audio_latency
+
+    def deadline(self, k):
+        """帧 k 的播放时刻（相对开始）"""
+        return self.delay + k / self.fps
+
+    def _now(self):
+        return time.perf_counter() - self._start
+
+    def _take(self):
+        """领取下一个要渲染的帧，已过截止时间的跳过；全部领完或停止时返回 None"""
+        with self._cond:
+            while True:
+                if self._stop:
+                    return None
+                k = max(self._next, self._playhead + 1)
+                if self._estimate is not None:
+                    # 按最近的渲染耗时估计，来不及在截止时间前完成的帧直接跳过
+                    k = max(k, math.ceil((self._now() + self._estimate - self.delay) * self.fps))
+                self.skipped += k - self._next
+                self._next = k
+                if k >= self.num_frames:
+                    return None
+                if k <= self._playhead + self.lookahead:
+                    self._next = k + 1
+                    return k
+                self._cond.wait()
+
+    def _work(self):
+        while True:
+            k = self._take()
+            if k is None:
+                return
+            wait = self.available_time(k) - self._now()
+            if wait > 0:
+                time.sleep(wait)
+
+            start = time.perf_counter()
+            try:
+                frame = self.render_fn(k, self.bnf_index(k))
+            except Exception as e:
+                with self._cond:
+                    self._errors.append(e)
+                continue
+            done = self._now()
+
+            elapsed = time.perf_counter() - start
+            with self._cond:
+                self.render_ms.append(elapsed * 1000)
+                # 多个推理线程并行时，每个线程的单帧耗时都按 elapsed 计
+                self._estimate = elapsed if self._estimate is None else 0.8 * self._estimate + 0.2 * elapsed
+                self.ready_latency.append(done - self.audio_time(k))
+                if k <= self._playhead:
+                    self.late += 1
+                else:
+                    self._ready[k] = frame
+
+    def run(self):
+        """运行到最后一帧播放完，返回 stats()"""
+        self._start = time.perf_counter()
+        threads = [threading.Thread(target=self._work, name=f'render-{i}', daemon=True)
+                   for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+
+        last = None
+        try:
+            for k in range(self.num_frames):
+                wait = self.deadline(k) - self._now()
+                if wait > 0:
+                    time.sleep(wait)
+                with self._cond:
+                    self._playhead = k
+                    frame = self._ready.pop(k, None)
+                    self._cond.notify_all()
+
+                if frame is not None:
+                    self.shown += 1
+                    last = frame
+                else:
+                    self.repeated += 1
+                if self.on_frame is not None and last is not None:
+                    self.on_frame(k, last, frame is None)
+        finally:
+            with self._cond:
+                self._stop = True
+                self._cond.notify_all()
+            for thread in threads:
+                thread.join()
+
+        if self._errors:
+            print(f"⚠️  {len(self._errors)} 帧渲染失败，首个错误: {self._errors[0]!r}")
+        return self.stats()
+
+    def stats(self):
+        """
+        - miss_rate: 播放时刻帧未就绪（重复上一帧）的比例
+        - skipped: 领取时估计已来不及、未渲染的帧数
+        - late: 渲染完成时已过截止时间、被丢弃的帧数
+        - ready_latency_ms: 帧对应的音频到达 → 帧渲染完成
+        """
+        stats = {
+            'frames': self.num_frames,
+            'shown': self.shown,
+            'repeated': self.repeated,
+            'skipped': self.skipped,
+            'late': self.late,
+            'miss_rate': self.repeated / self.num_frames if self.num_frames else 0.0,
+        }
+        for name, values in (('render_ms', self.render_ms),
+                             ('ready_latency_ms', [v * 1000 for v in self.ready_latency])):
+            if values:
+                p50, p95, p99 = np.percentile(values, [50, 95, 99])
+                stats[name] = {'p50': float(p50), 'p95': float(p95), 'p99': float(p99),
+                               'max': float(np.max(values))}
+        return stats
+
+
+def print_report(stats, scheduler):
+    """打印调度统计"""
+    frames = stats['frames']
+    print(f"   播放: {frames} 帧 @ {scheduler.fps} fps（{frames / scheduler.fps:.1f} s）")
+    print(f"   按时显示: {stats['shown']}   重复上一帧: {stats['repeated']}   "
+          f"跳过: {stats['skipped']}   过期丢弃: {stats['late']}")
+    print(f"   截止时间错过率: {stats['miss_rate']:.1%}\n")
+
+    print(f"   {'指标':<22} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    print("   " + "-" * 58)
+    for name, label in (('render_ms', '单帧渲染 (ms)'), ('ready_latency_ms', '音频 → 帧就绪 (ms)')):
+        if name in stats:
+            s = stats[name]
+            print(f"   {label:<22} {s['p50']:>8.1f} {s['p95']:>8.1f} {s['p99']:>8.1f} {s['max']:>8.1f}")
+
+    if 'render_ms' in stats:
+        capacity = 1000 / stats['render_ms']['p50'] * scheduler.workers
+        print(f"\n   推理能力约 {capacity:.1f} fps（{scheduler.workers} 线程），目标 {scheduler.fps} fps")
+    if scheduler.live and 'ready_latency_ms' in stats:
+        needed = stats['ready_latency_ms']['p99'] / 1000
+        verdict = '✅' if needed <= scheduler.delay else '⚠️ '
+        print(f"   {verdict} 直播所需播放延迟 ≥ {needed:.2f} s（p99），当前 {scheduler.delay:.2f} s")
+        print(f"      其中 BNF 窗口右侧上下文固定 {BNF_RIGHT_CONTEXT / BNF_FPS:.2f} s，"
+              f"特征提取 {scheduler.audio_latency:.2f} s")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='实时帧调度（按播放时钟驱动 BNF 索引）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python realtime.py avatar/ audio_bnf.npy --fps 25 --lookahead 8 --delay 0.3
+  python realtime.py avatar/ audio_bnf.npy --live --delay 0.5 --workers 2 --threads 2
+        """
+    )
+    parser.add_argument('avatar_dir', help='形象目录（含 raw_jpgs/、解密后的 bbox.j）')
+    parser.add_argument('bnf', help='WeNet BNF 特征文件 (.npy, [T, 256])')
+    parser.add_argument('--fps', type=float, default=25, help='视频帧率（默认: 25）')
+    parser.add_argument('--lookahead', type=int, default=8, help='推理最多领先播放头的帧数（默认: 8）')
+    parser.add_argument('--delay', type=float, default=0.2, help='播放延迟，秒（默认: 0.2）')
+    parser.add_argument('--live', action='store_true', help='直播模式：BNF 随音频实时到达')
+    parser.add_argument('--audio-latency', type=float, default=0.0,
+                        help='直播模式下音频到达后得到 BNF 的额外延迟，秒（默认: 0）')
+    parser.add_argument('--workers', type=int, default=1, help='推理线程数（默认: 1）')
+    parser.add_argument('--frames', type=int, default=None, help='只播放前 N 帧')
+    parser.add_argument('--weights', default=None, help='fp32 权重（state_dict），默认随机初始化')
+    parser.add_argument('--quantized', default=None, help='INT8 量化模型（TorchScript）')
+    parser.add_argument('--blend', default=None, help='解密后的 weight_168u.b（不指定则不混合）')
+    parser.add_argument('--bbox', default=None, help='bbox.j 路径（默认 <avatar_dir>/bbox.j）')
+    parser.add_argument('--size', type=int, default=None, choices=[128, 160],
+                        help='工作分辨率（默认按人脸大小自动选择）')
+    parser.add_argument('--threads', type=int, default=None, help='推理使用的 torch 线程数')
+    parser.add_argument('--gpu', action='store_true', help='使用 GPU 推理')
+
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    print("=" * 60)
+    print("⏯️  实时帧调度")
+    print("=" * 60)
+
+    model = create_model(use_gpu=args.gpu, weights_path=args.weights,
+                         quantized_path=args.quantized, fuse=args.quantized is None)
+    device = 'cuda' if args.gpu and torch.cuda.is_available() and args.quantized is None else 'cpu'
+    blend_weights = load_blend_weights(args.blend) if args.blend else None
+    bnf = np.load(args.bnf).astype(np.float32)
+
+    renderer = AvatarRenderer(model, args.avatar_dir, bnf, None, blend_weights,
+                              args.size, device=device, bbox_path=args.bbox)
+
+    def render(k, bnf_index):
+        frame_index, path = renderer.frame_for(k)
+        task = {'index': bnf_index, 'frame_index': frame_index, 'path': path}
+        for stage in (renderer.decode, renderer.crop, renderer.infer, renderer.blend):
+            task = stage(task)
+        return task['frame']
+
+    num_frames = int(len(bnf) * args.fps / BNF_FPS)
+    if args.frames is not None:
+        num_frames = min(num_frames, args.frames)
+    scheduler = FrameScheduler(render, num_frames, args.fps, args.lookahead, args.delay, args.live,
+                               args.audio_latency, len(bnf), args.workers)
+    print(f"\n   模式: {'直播' if args.live else '离线'}   提前量: {args.lookahead} 帧   "
+          f"播放延迟: {args.delay:.2f} s   推理线程: {args.workers}   "
+          f"torch 线程: {torch.get_num_threads()}\n")
+
+    stats = scheduler.run()
+    print_report(stats, scheduler)
+
+    print("\n" + "=" * 60)
+    print("✅ 播放结束")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+"""
+形象视频帧渲染流水线
+
+对应原生 filerst 流程，把整段 BNF 特征渲染成一组视频帧：
+
+    decode → crop → infer → blend → encode
+
+- decode: 读取 raw_jpgs 帧（.sij 即 JPEG）以及 pha 目录中的 alpha mask（若存在）；
+          指定 --frame-store 时直接从预先解码的 mmap 存储取帧（frame_store.py）
+- crop:   按 bbox.j 的 [x1, x2, y1, y2] 裁剪 → resize 168 → 中心裁剪 160，生成遮挡图，
+          归一化为 6 通道输入，并取出对应的 BNF 窗口；指定 --face-store 时直接切片
+          预先算好的人脸输入和贴回几何
+- infer:  MobileNetV2Unet 推理（runner.py：输入拷入预分配缓冲，uint8 结果直接写入帧任务）
+- blend:  转为 uint8，按 weight_168u.b 做 BlendGramAlpha 混合，贴回 540x960 原帧
+          （compositing.py：uint8 缓冲上原地混合，贴回几何按形象帧缓存）
+- encode: 写出 JPEG（有 alpha mask 且指定 --png 时写出 RGBA PNG）；
+          指定 --video 时按帧号顺序以 rawvideo 管道写入 ffmpeg（video_sink.py），不写中间图片；
+          --audio 同时封装音频，--format fmp4 / hls 边渲染边输出可播放的分片
+
+指定 --pcm 时按能量 VAD 找出静音段（silence.py）：静音帧直接输出静音区间的原始图像，
+跳过 crop / infer / blend；静音段两端的过渡帧推理后在人脸区域与原始裁剪交叉淡化。
+
+指定 --cache-mb 时按 (形象帧号, 分辨率, BNF 窗口) 缓存 UNet 输出（face_cache.py），
+命中的帧跳过归一化和推理。
+
+指定 --pingpong / --action 时按预先展开的播放列表取用形象帧（playlist.py）：静音区间往返播放，
+动作区间在指定帧之后插入；播放顺序已知，配合 --frame-store 每秒预取之后要用到的帧。
+
+相邻阶段之间是有界队列，每个阶段有自己的线程池（OpenCV 和 PyTorch 的计算都会释放 GIL），
+队列满时上游阻塞，内存占用有上限。结束时报告每个阶段的处理量、单帧耗时和利用率。
+
+用法:
+    python render_pipeline.py <avatar_dir> <bnf.npy> [output_dir] [选项]
+
+    output_dir 为输出帧目录；指定 --video 时可省略
+
+示例:
+    python render_pipeline.py avatar/ audio_bnf.npy out/ --weights dh_model.pth --blend weight_168u.b
+    python render_pipeline.py avatar/ audio_bnf.npy out/ --workers decode=2 crop=2 blend=2 encode=3
+    python render_pipeline.py avatar/ audio_bnf.npy out/ --pcm audio.wav --crossfade 3
+    python render_pipeline.py avatar/ audio_bnf.npy out/ --cache-mb 256 --cache-tolerance 0.05
+    python render_pipeline.py avatar/ audio_bnf.npy out/ --frame-store avatar/ --face-store avatar/
+    python render_pipeline.py avatar/ audio_bnf.npy out/ --pingpong --action wave@100 --frame-store avatar/
+    python render_pipeline.py avatar/ audio_bnf.npy --video out.mp4 --crf 18
+    python render_pipeline.py avatar/ audio_bnf.npy --video live/index.m3u8 --format hls --audio audio.wav
+"""
+
+import sys
+import os
+import time
+import queue
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from inference import (create_model, model_dtype, load_bbox, list_frames, bnf_window,
+                       select_resolution, crop_face, load_blend_weights, preprocess_faces,
+                       preprocess_audio)
+from compositing import FaceBlender, paste_geometry, paste_faces
+from runner import InferenceRunner
+from face_cache import FaceCache
+from frame_store import FrameStore, FaceStore
+from silence import SilencePlan, load_pcm, detect_speech, load_regions, silence_region
+from bundle import AvatarBundle
+from playlist import Playlist
+from video_sink import VideoSink, has_ffmpeg
+
+
+# 流水线结束标记
+_STOP = object()
+
+# 有播放列表时每隔多少帧预取一次之后的解码帧（1 秒）
+PREFETCH_FRAMES = 25
+
+# 默认的阶段及线程数
+DEFAULT_WORKERS = OrderedDict([
+    ('decode', 2),
+    ('crop', 2),
+    ('infer', 1),
+    ('blend', 2),
+    ('encode', 2),
+])
+
+
+class Stage:
+    """流水线中的一个阶段：从输入队列取任务，执行 fn，放入下一阶段的队列"""
+
+    def __init__(self, name, fn, workers=1, queue_size=8, on_error=None):
+        self.name = name
+        self.fn = fn
+        self.on_error = on_error
+        self.workers = workers
+        self.input = queue.Queue(maxsize=queue_size)
+        self.output = None
+        self.count = 0
+        self.busy = 0.0
+        self.errors = []
+        self._alive = workers
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'{self.name}-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while True:
+            item = self.input.get()
+            if item is _STOP:
+                # 让同阶段的其他线程也能看到结束标记，最后一个线程通知下游
+                self.input.put(_STOP)
+                with self._lock:
+                    self._alive -= 1
+                    last = self._alive == 0
+                if last and self.output is not None:
+                    self.output.put(_STOP)
+                return
+
+            start = time.perf_counter()
+            try:
+                item = self.fn(item)
+            except Exception as e:
+                # 出错的帧丢弃，记录异常后继续处理其他帧
+                with self._lock:
+                    self.errors.append(e)
+                if self.on_error is not None:
+                    self.on_error(item, e)
+                item = None
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                self.count += 1
+                self.busy += elapsed
+            if item is not None and self.output is not None:
+                self.output.put(item)
+
+
+class Pipeline:
+    """
+    由有界队列串联的多阶段流水线
+
+    Args:
+        stages: list of (名称, 函数, 线程数)，函数接收上一阶段的输出，返回 None 表示丢弃
+        queue_size: 每个阶段输入队列的容量
+        on_error: 可选回调 on_error(item, exception)，任一阶段丢弃出错的帧时调用
+    """
+
+    def __init__(self, stages, queue_size=8, on_error=None):
+        self.stages = [Stage(name, fn, workers, queue_size, on_error) for name, fn, workers in stages]
+        for upstream, downstream in zip(self.stages, self.stages[1:]):
+            upstream.output = downstream.input
+        self.wall = 0.0
+
+    def run(self, items):
+        """把 items 依次送入第一阶段，等待全部阶段处理完，返回统计信息"""
+        start = time.perf_counter()
+        for stage in self.stages:
+            stage.start()
+        for item in items:
+            self.stages[0].input.put(item)
+        self.stages[0].input.put(_STOP)
+        for stage in self.stages:
+            stage.join()
+        self.wall = time.perf_counter() - start
+
+        errors = [e for stage in self.stages for e in stage.errors]
+        if errors:
+            print(f"⚠️  {len(errors)} 帧处理失败，首个错误: {errors[0]!r}")
+        return self.stats()
+
+    def stats(self):
+        """
+        每个阶段的统计
+
+        - ms_per_item: 单帧处理耗时（单线程）
+        - capacity_fps: 该阶段按当前线程数能达到的吞吐上限
+        - utilization: 线程忙碌时间占 线程数 × 总墙钟 的比例
+        """
+        stats = OrderedDict()
+        for stage in self.stages:
+            stats[stage.name] = {
+                'workers': stage.workers,
+                'items': stage.count,
+                'errors': len(stage.errors),
+                'ms_per_item': stage.busy / stage.count * 1000 if stage.count else 0.0,
+                'capacity_fps': stage.count * stage.workers / stage.busy if stage.busy else 0.0,
+                'utilization': stage.busy / (stage.workers * self.wall) if self.wall else 0.0,
+            }
+        return stats
+
+
+def print_stats(stats, wall, frames):
+    """打印每个阶段的吞吐表格"""
+    print(f"   {'阶段':<8} {'线程':>4} {'帧数':>6} {'单帧(ms)':>9} {'上限(fps)':>10} {'利用率':>7}")
+    print("   " + "-" * 52)
+    for name, stat in stats.items():
+        print(f"   {name:<8} {stat['workers']:>4} {stat['items']:>6} {stat['ms_per_item']:>9.2f} "
+              f"{stat['capacity_fps']:>10.1f} {stat['utilization']:>6.0%}")
+    print(f"\n   端到端: {frames} 帧 / {wall:.2f} s = {frames / wall:.1f} fps")
+
+
+class AvatarRenderer:
+    """
+    形象渲染的各阶段函数
+
+    Args:
+        model: MobileNetV2Unet（或 create_model 返回的其他变体）
+        avatar_dir: 形象目录（raw_jpgs/、可选 pha/、解密后的 bbox.j）
+        bnf: numpy array [T, 256]，整段音频的 BNF 特征
+        output_dir: 输出帧目录（None 时不使用 encode 阶段，除非设置了 sink）
+        blend_weights: load_blend_weights() 的结果，None 时直接贴回不混合
+        size: 工作分辨率，None 时按人脸框大小自动选择
+        png: 有 alpha mask 时写出 RGBA PNG
+        device: 'cuda' 或 'cpu'
+        silence: SilencePlan，None 时每帧都推理
+        cache: FaceCache，None 时不缓存 UNet 输出
+        frame_store: FrameStore，None 时逐帧解码 JPEG
+        face_store: FaceStore，None 时逐帧裁剪 / 归一化
+        playlist: Playlist，None 时按帧号顺序循环取用形象帧
+        sink: VideoSink，设置时 encode 阶段把帧按顺序写入视频，不再逐帧写图片
+    """
+
+    def __init__(self, model, avatar_dir, bnf, output_dir, blend_weights=None, size=None,
+                 png=False, device='cpu', bbox_path=None, silence=None, cache=None,
+                 frame_store=None, face_store=None, playlist=None,
+                 sink=None):
+        avatar_dir = Path(avatar_dir)
+        self.model = model
+        self.bnf = bnf
+        self.output_dir = Path(output_dir) if output_dir is not None else None
+        self.blend_weights = blend_weights
+        self.size = size
+        self.png = png
+        self.device = device
+        self.dtype = model_dtype(model)
+        self.silence = silence
+        self.cache = cache
+        self.frame_store = frame_store
+        self.face_store = face_store
+        self.playlist = playlist
+        self.sink = sink
+
+        self.bboxes = load_bbox(bbox_path or avatar_dir / 'bbox.j')
+        self.frames = [(idx, path) for idx, path in list_frames(avatar_dir / 'raw_jpgs')
+                       if idx in self.bboxes]
+        if not self.frames:
+            raise ValueError(f"未在 {avatar_dir / 'raw_jpgs'} 找到带 bbox 的帧")
+        self.paths = dict(self.frames)
+        pha_dir = avatar_dir / 'pha'
+        self.masks = dict(list_frames(pha_dir)) if pha_dir.is_dir() else {}
+        # 形象帧循环取用，贴回几何按 (帧号, 分辨率) 缓存；推理 / 混合缓冲每个线程一份
+        self.geometries = {}
+        self._local = threading.local()
+
+    def frame_for(self, index):
+        """第 index 个输出帧使用的 (形象帧号, 路径)"""
+        if self.playlist is not None:
+            frame_index = self.playlist.frame_at(index)
+            return frame_index, self.paths[frame_index]
+        return self.frames[index % len(self.frames)]
+
+    def prefetch(self, index, count=PREFETCH_FRAMES):
+        """播放顺序已知时，把 [index, index + count) 帧的解码帧提前读入 page cache"""
+        if self.playlist is not None and self.frame_store is not None:
+            self.frame_store.warm('raw_jpgs', np.unique(self.playlist.upcoming(index, count)))
+
+    def tasks(self, num_frames=None):
+        """输出帧任务：第 i 帧使用 BNF 第 i 帧，形象帧按播放列表或循环取用"""
+        num_frames = len(self.bnf) if num_frames is None else min(num_frames, len(self.bnf))
+        for index in range(num_frames):
+            if self.sink is not None and self.sink.error is not None:
+                # 编码已失败，不再产生新的帧任务
+                return
+            # render() 按需从这里取任务（第一阶段的队列有界），取到第 index 帧时预取下一秒的帧
+            if index == 0:
+                self.prefetch(0, min(2 * PREFETCH_FRAMES, num_frames))
+            elif index % PREFETCH_FRAMES == 0 and index + PREFETCH_FRAMES < num_frames:
+                self.prefetch(index + PREFETCH_FRAMES, min(PREFETCH_FRAMES, num_frames - index - PREFETCH_FRAMES))
+            frame_index, path = self.frame_for(index)
+            task = {'index': index, 'frame_index': frame_index, 'path': path}
+            entry = self.silence[index] if self.silence is not None else None
+            if entry is not None:
+                kind, value = entry
+                if kind == 'silent':
+                    # 静音帧：直接输出原始图像
+                    task.update(frame_index=value[0], path=value[1], silent=True)
+                else:
+                    # 过渡帧：使用所在静音段的形象帧，推理后与原始裁剪交叉淡化
+                    weight, (frame_index, path) = value
+                    task.update(frame_index=frame_index, path=path, fade=weight)
+            yield task
+
+    def decode(self, task):
+        key = ('raw_jpgs', task['frame_index'])
+        if self.frame_store is not None and key in self.frame_store:
+            frame = self.frame_store.get(*key)
+            # 静音帧原样输出，直接用只读视图；其余帧要原地贴回人脸
+            task['frame'] = frame if task.get('silent') else frame.copy()
+        else:
+            image = cv2.imread(str(task['path']))
+            if image is None:
+                raise IOError(f"无法读取帧: {task['path']}")
+            task['frame'] = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        mask_path = self.masks.get(task['frame_index'])
+        if self.png and mask_path is not None:
+            task['alpha'] = cv2.imread(str(mask_path), cv2.IMREAD_GRAYSCALE)
+        return task
+
+    def crop(self, task):
+        if task.get('silent'):
+            return task
+        box = self.bboxes[task['frame_index']]
+        size = self.size or select_resolution(box)
+        key = (task['frame_index'], size)
+        stored = self.face_store is not None and key in self.face_store
+        face = self.face_store.crop(*key) if stored else crop_face(task['frame'], box, size)
+        # 多个会话共用一个渲染器时，任务携带各自的 BNF
+        window = bnf_window(task.get('bnf', self.bnf), task['index'])
+        task.update({'box': box, 'face': face})
+        if self.cache is not None:
+            cache_key = self.cache.key(task['frame_index'], size, window)
+            generated = self.cache.get(cache_key)
+            if generated is not None:
+                task['generated'] = generated
+                return task
+            task['cache_key'] = cache_key
+        task.update({
+            'face_input': (self.face_store.face_input(*key).to(self.dtype) if stored
+                           else preprocess_faces(face[None], size=size, dtype=self.dtype)),
+            'audio_input': preprocess_audio(window).to(self.dtype),
+        })
+        return task
+
+    def runner(self, size):
+        """当前线程的 InferenceRunner"""
+        runners = getattr(self._local, 'runners', None)
+        if runners is None:
+            runners = self._local.runners = {}
+        if size not in runners:
+            runners[size] = InferenceRunner(self.model, 1, size, self.device, self.dtype)
+        return runners[size]
+
+    def infer(self, task):
+        if task.get('silent') or 'generated' in task:
+            return task
+        face_input = task.pop('face_input')
+        size = face_input.shape[-1]
+        generated = np.empty((size, size, 3), dtype=np.uint8)
+        self.runner(size).run(face_input, task.pop('audio_input'), out=generated[None])
+        task['generated'] = generated
+        self.remember(task)
+        return task
+
+    def remember(self, task):
+        """把推理结果放入缓存（在 blend 原地修改之前调用）"""
+        key = task.pop('cache_key', None)
+        if key is not None:
+            self.cache.put(key, task['generated'])
+
+    def blender(self, size):
+        """当前线程的 FaceBlender"""
+        blenders = getattr(self._local, 'blenders', None)
+        if blenders is None:
+            blenders = self._local.blenders = {}
+        if size not in blenders:
+            blenders[size] = FaceBlender(self.blend_weights[size])
+        return blenders[size]
+
+    def blend(self, task):
+        if task.get('silent'):
+            return task
+        generated = task.pop('generated')
+        face = task.pop('face')
+        size = face.shape[0]
+        if self.blend_weights is not None:
+            self.blender(size).blend(generated, face)
+        if 'fade' in task:
+            weight = task.pop('fade')
+            cv2.addWeighted(generated, 1 - weight, face, weight, 0, dst=generated)
+        key = (task['frame_index'], size)
+        if key not in self.geometries:
+            if self.face_store is not None and key in self.face_store:
+                self.geometries[key] = self.face_store.geometry(*key)
+            else:
+                self.geometries[key] = paste_geometry(task['box'], size)
+        paste_faces([task['frame']], generated[None], [self.geometries[key]])
+        return task
+
+    def encode(self, task):
+        if self.sink is not None:
+            # 多个 encode 线程乱序完成，sink 按帧号重排
+            self.sink.write(task.pop('frame'), task['index'])
+            task['output'] = self.sink.path
+            return task
+        frame = cv2.cvtColor(task.pop('frame'), cv2.COLOR_RGB2BGR)
+        alpha = task.pop('alpha', None)
+        if alpha is not None:
+            path = self.output_dir / f"{task['index']:06d}.png"
+            cv2.imwrite(str(path), np.dstack([frame, alpha]))
+        else:
+            path = self.output_dir / f"{task['index']:06d}.jpg"
+            cv2.imwrite(str(path), frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        task['output'] = path
+        return task
+
+    def failed(self, task, error):
+        """某一阶段丢弃了这一帧：通知 sink 跳过它的帧号，后面的帧不会一直等它"""
+        if self.sink is not None:
+            try:
+                self.sink.skip(task['index'])
+            except RuntimeError:
+                # sink 已经出错，错误会在 close() 时抛出
+                pass
+
+    def stages(self, workers=None):
+        """按 DEFAULT_WORKERS 的顺序返回 (名称, 函数, 线程数) 列表"""
+        workers = dict(DEFAULT_WORKERS, **(workers or {}))
+        return [(name, getattr(self, name), workers[name]) for name in DEFAULT_WORKERS]
+
+    def render(self, num_frames=None, workers=None, queue_size=8):
+        """渲染全部帧，返回 (Pipeline, 帧数)"""
+        if self.sink is None:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+        pipeline = Pipeline(self.stages(workers), queue_size, self.failed)
+        num_frames = len(self.bnf) if num_frames is None else min(num_frames, len(self.bnf))
+        # 生成器直接交给流水线，任务随第一阶段的进度逐个产生，预取与渲染交替进行
+        pipeline.run(self.tasks(num_frames))
+        return pipeline, num_frames
+
+
+def parse_workers(specs):
+    """解析 ['decode=2', 'encode=3'] 形式的线程数配置"""
+    workers = {}
+    for spec in specs or []:
+        name, _, count = spec.partition('=')
+        if name not in DEFAULT_WORKERS or not count.isdigit() or int(count) < 1:
+            raise ValueError(f"无效的线程配置: {spec}（阶段: {', '.join(DEFAULT_WORKERS)}）")
+        workers[name] = int(count)
+    return workers
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='形象视频帧渲染流水线',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python render_pipeline.py avatar/ audio_bnf.npy out/ --weights dh_model.pth --blend weight_168u.b
+  python render_pipeline.py avatar/ audio_bnf.npy out/ --workers decode=2 crop=2 blend=2 encode=3
+  python render_pipeline.py avatar/ audio_bnf.npy out/ --pcm audio.wav --crossfade 3
+  python render_pipeline.py avatar/ audio_bnf.npy out/ --cache-mb 256 --cache-tolerance 0.05
+  python render_pipeline.py avatar/ audio_bnf.npy out/ --frame-store avatar/ --face-store avatar/
+  python render_pipeline.py avatar/ audio_bnf.npy out/ --pingpong --action wave@100 --frame-store avatar/
+  python render_pipeline.py avatar/ audio_bnf.npy --video out.mp4 --crf 18
+  python render_pipeline.py avatar/ audio_bnf.npy --video live/index.m3u8 --format hls --audio audio.wav
+        """
+    )
+    parser.add_argument('avatar_dir', help='形象目录（含 raw_jpgs/、解密后的 bbox.j，可选 pha/）')
+    parser.add_argument('bnf', help='WeNet BNF 特征文件 (.npy, [T, 256])')
+    parser.add_argument('output_dir', nargs='?', default=None, help='输出帧目录（使用 --video 时可省略）')
+    parser.add_argument('--weights', default=None, help='fp32 权重（state_dict），默认随机初始化')
+    parser.add_argument('--quantized', default=None, help='INT8 量化模型（TorchScript）')
+    parser.add_argument('--blend', default=None, help='解密后的 weight_168u.b（不指定则不混合）')
+    parser.add_argument('--bbox', default=None, help='bbox.j 路径（默认 <avatar_dir>/bbox.j）')
+    parser.add_argument('--size', type=int, default=None, choices=[128, 160],
+                        help='工作分辨率（默认按人脸大小自动选择）')
+    parser.add_argument('--frames', type=int, default=None, help='只渲染前 N 帧')
+    parser.add_argument('--workers', nargs='*', default=None,
+                        help='各阶段线程数，如 decode=2 infer=1 encode=3')
+    parser.add_argument('--queue', type=int, default=8, help='阶段间队列容量（默认: 8）')
+    parser.add_argument('--threads', type=int, default=None, help='推理使用的 torch 线程数')
+    parser.add_argument('--png', action='store_true', help='有 pha mask 时输出 RGBA PNG')
+    parser.add_argument('--gpu', action='store_true', help='使用 GPU 推理')
+    parser.add_argument('--video', default=None,
+                        help='直接编码为视频（帧以 rawvideo 管道写入 ffmpeg，不写中间图片）')
+    parser.add_argument('--fps', type=int, default=25, help='--video 的帧率（默认: 25）')
+    parser.add_argument('--crf', type=int, default=18, help='--video 的 libx264 CRF（默认: 18）')
+    parser.add_argument('--audio', default=None,
+                        help='--video 时一起封装的音频（.wav / 16kHz 裸 int16 .pcm，通常与 --pcm 相同）')
+    parser.add_argument('--format', default='mp4', choices=['mp4', 'fmp4', 'hls'],
+                        help='--video 的输出格式：mp4、分片 MP4、HLS（路径为 .m3u8）（默认: mp4）')
+    parser.add_argument('--segment', type=float, default=2.0, help='fmp4 / hls 的分片时长秒数（默认: 2）')
+    parser.add_argument('--pcm', default=None,
+                        help='与 BNF 对应的 16kHz 音频（.wav / 裸 int16 .pcm），用于静音检测')
+    parser.add_argument('--vad-threshold', type=float, default=-40.0,
+                        help='语音能量门限 dBFS（默认: -40）')
+    parser.add_argument('--crossfade', type=int, default=3, help='静音段两端的淡化帧数（默认: 3）')
+    parser.add_argument('--frame-store', default=None,
+                        help='build_frame_store.py 生成的解码帧存储目录（通常为形象目录）')
+    parser.add_argument('--face-store', default=None,
+                        help='build_frame_store.py --faces 生成的人脸输入存储目录')
+    parser.add_argument('--pingpong', action='store_true',
+                        help='按 SDK 的方式在静音区间内往返播放形象帧（默认按帧号循环）')
+    parser.add_argument('--action', nargs='*', default=[],
+                        help='播放动作区间，格式 名称@帧，如 wave@100（隐含 --pingpong）')
+    parser.add_argument('--cache-mb', type=int, default=0,
+                        help='UNet 输出缓存的内存上限 MB（默认: 0，不缓存）')
+    parser.add_argument('--cache-tolerance', type=float, default=0.0,
+                        help='缓存键中 BNF 的量化步长（默认: 0，窗口完全相同才命中）')
+
+    args = parser.parse_args()
+    if args.output_dir is None and args.video is None:
+        parser.error('需要指定输出帧目录或 --video')
+    if (args.audio or args.format != 'mp4') and not has_ffmpeg():
+        parser.error('--audio 和分片输出（--format fmp4 / hls）需要 ffmpeg')
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    print("=" * 60)
+    print("🎬 形象视频帧渲染流水线")
+    print("=" * 60)
+
+    model = create_model(use_gpu=args.gpu, weights_path=args.weights,
+                         quantized_path=args.quantized, fuse=args.quantized is None)
+    device = 'cuda' if args.gpu and torch.cuda.is_available() and args.quantized is None else 'cpu'
+    blend_weights = load_blend_weights(args.blend) if args.blend else None
+    bnf = np.load(args.bnf).astype(np.float32)
+
+    renderer = AvatarRenderer(model, args.avatar_dir, bnf, args.output_dir, blend_weights,
+                              args.size, args.png, device, args.bbox)
+    if args.cache_mb > 0:
+        renderer.cache = FaceCache(args.cache_mb << 20, args.cache_tolerance)
+    if args.frame_store:
+        renderer.frame_store = FrameStore(args.frame_store)
+    if args.face_store:
+        renderer.face_store = FaceStore(args.face_store)
+    if args.pingpong or args.action:
+        renderer.playlist = Playlist(AvatarBundle(args.avatar_dir, args.bbox))
+        for spec in args.action:
+            name, _, tick = spec.rpartition('@')
+            start, end = renderer.playlist.play(name, int(tick))
+            print(f"   ▶ 动作 {name}: 帧 [{start}, {end})")
+    print(f"\n   形象帧: {len(renderer.frames)}   BNF 帧: {len(bnf)}   "
+          f"alpha mask: {len(renderer.masks)}   torch 线程: {torch.get_num_threads()}")
+    if args.pcm:
+        speech = detect_speech(load_pcm(args.pcm), threshold_db=args.vad_threshold)
+        # 音频比 BNF 短时，超出的部分按静音处理
+        speech = np.pad(speech, (0, max(0, len(bnf) - len(speech))))[:len(bnf)]
+        indices = [i for i, _ in renderer.frames]
+        region = silence_region(load_regions(args.avatar_dir, indices), indices)
+        # 有播放列表时按它展开每一帧的形象帧，静音帧沿用同样的播放顺序（只跳过推理）
+        playlist = renderer.playlist
+        frames = playlist.frames(len(bnf)) if playlist is not None else renderer.frames
+        renderer.silence = SilencePlan(speech, frames, region, args.crossfade, follow=playlist is not None)
+        print(f"   静音区间: {region.name or '全部形象帧'}（{len(region.frames)} 帧）")
+    print()
+
+    if args.video:
+        # 在渲染开始前创建，first_segment_s 即从开始渲染到第一个分段可播放的时间
+        renderer.sink = VideoSink(args.video, args.fps, args.crf, audio=args.audio,
+                                  format=args.format, segment_seconds=args.segment)
+    pipeline, frames = renderer.render(args.frames, parse_workers(args.workers), args.queue)
+    if renderer.sink is not None:
+        # 等待队列中剩余的帧编码完成
+        start = time.perf_counter()
+        sink = renderer.sink.close()
+        pipeline.wall += time.perf_counter() - start
+    print_stats(pipeline.stats(), pipeline.wall, frames)
+    if renderer.sink is not None:
+        print(f"   视频编码: {sink['encoder']} {sink['encode_fps']:.0f} fps，"
+              f"流水线因编码队列满等待 {sink['blocked_s']:.2f} s")
+        if sink['first_segment_s'] is not None:
+            print(f"   首个分段可播放: {sink['first_segment_s']:.2f} s（{sink['format']}，"
+                  f"{'含音频' if sink['audio'] else '无音频'}）")
+        if sink['skipped']:
+            print(f"   ⚠️  {sink['skipped']} 帧处理失败，视频中以前一帧代替")
+    if renderer.silence is not None:
+        silence = renderer.silence.stats(frames)
+        print(f"   静音快速路径: 跳过推理 {silence['skipped']} / {silence['frames']} 帧"
+              f"（{silence['skipped_fraction']:.1%}），过渡 {silence['crossfade']} 帧，"
+              f"静音段 {silence['silent_spans']} 个")
+    if renderer.cache is not None:
+        cache = renderer.cache.stats()
+        print(f"   UNet 缓存: 命中 {cache['hits']} / {cache['hits'] + cache['misses']}"
+              f"（{cache['hit_rate']:.1%}），{cache['entries']} 项 {cache['bytes'] / 2**20:.1f} MB，"
+              f"淘汰 {cache['evictions']}")
+    print(f"   💾 输出: {args.video or args.output_dir}")
+
+    print("\n" + "=" * 60)
+    print("✅ 渲染完成")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
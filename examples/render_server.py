@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+多会话渲染服务（asyncio）
+
+仿照 SDK 的会话接口（DuixNcnn.newsession / pushpcm / readycnt / filerst / finsession），
+在本机提供一个 TCP 服务，多个数字人对话共用同一套模型：
+
+- 模型（MobileNetV2Unet、WeNet）和形象数据只加载一次，所有会话共享
+- 每个会话只保存尚未提取特征的 PCM 尾部（含左侧上下文）和已提取的 BNF 特征
+- PCM 按重叠窗口提取：每个 WeNet 窗口两端各留 WENET_CONTEXT 帧上下文，只保留中间的 BNF，
+  下一个窗口从已保留的最后一帧继续，BNF 第 i 帧始终对应音频的 i / 25 秒
+- WeNet 特征提取和帧渲染都是 CPU 密集的，放到线程池中执行（PyTorch / ONNX Runtime /
+  OpenCV 计算时释放 GIL），事件循环只负责收发消息
+- --batch N 时各会话的 UNet 推理由 batching.MicroBatcher 合并成 batch 执行
+- --cache-mb N 时所有会话共享一个 UNet 输出缓存（face_cache.FaceCache），
+  重复的问候语、待机和静音直接命中
+
+协议：每条消息为 4 字节大端长度 + UTF-8 JSON 头，头中 size > 0 时后面紧跟 size 字节的数据。
+
+    请求                                                   响应
+    {"cmd": "newsession"}                                   {"ok": true, "sessid": 1}
+    {"cmd": "pushpcm", "sessid": 1, "kind": 0, "size": N}   {"ok": true, "allcnt": 120}
+        + 16kHz 单声道 int16 PCM（kind=0，需要 --wenet）
+        + 或 float32 BNF 特征 [T, 256]（kind=1，已在客户端提取）
+    {"cmd": "readycnt", "sessid": 1}                        {"ok": true, "readycnt": 110, "allcnt": 120}
+    {"cmd": "filerst", "sessid": 1, "index": 0,             {"ok": true, "size": N, "shape": [960, 540, 3]}
+     "format": "jpg"}                                           + JPEG（或 format=raw 时的 RGB 数据）
+    {"cmd": "finsession", "sessid": 1}                      {"ok": true, "frames": 120}
+    {"cmd": "stats"}                                        {"ok": true, "sessions": 3, ...}
+
+readycnt 与原生一致：BNF 窗口右侧 10 帧的音频都到达后该帧才可渲染；
+pushpcm 时带 "final": true 表示音频结束，剩余的帧全部可渲染。
+出错时响应 {"ok": false, "error": "..."}。
+
+用法:
+    python render_server.py <avatar_dir> [选项]
+
+示例:
+    python render_server.py avatar/ --weights dh_model.pth --blend weight_168u.b --port 8765
+    python render_server.py avatar/ --wenet wenet.onnx --workers 4 --threads 1
+    python render_server.py avatar/ --batch 8 --max-wait 10 --workers 4
+    python render_server.py avatar/ --cache-mb 256 --cache-tolerance 0.05
+"""
+
+import sys
+import os
+import json
+import time
+import struct
+import asyncio
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加 models 目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'models'))
+
+import cv2
+import numpy as np
+import torch
+
+from inference import create_model, load_blend_weights
+from render_pipeline import AvatarRenderer
+from batching import MicroBatcher
+from face_cache import FaceCache
+from frame_store import FrameStore, FaceStore
+
+
+# 与 realtime.py 一致：bnf_window 右侧需要 10 帧之后的音频
+BNF_RIGHT_CONTEXT = 10
+SAMPLE_RATE = 16000
+# 每帧 BNF 对应 40ms 音频
+SAMPLES_PER_BNF = SAMPLE_RATE // 25
+# WeNet 窗口两端各留多少帧 BNF 作为上下文，只保留中间的结果
+WENET_CONTEXT = 8
+
+PCM_KIND = 0
+BNF_KIND = 1
+
+_HEADER = struct.Struct('>I')
+
+
+async def read_message(reader):
+    """读取一条消息，返回 (头, 数据)；连接关闭时返回 (None, None)"""
+    try:
+        length = _HEADER.unpack(await reader.readexactly(_HEADER.size))[0]
+        header = json.loads(await reader.readexactly(length))
+        size = header.get('size', 0)
+        payload = await reader.readexactly(size) if size else b''
+    except asyncio.IncompleteReadError:
+        return None, None
+    return header, payload
+
+
+def write_message(writer, header, payload=b''):
+    """写入一条消息（调用方负责 await writer.drain()）"""
+    if payload:
+        header = dict(header, size=len(payload))
+    data = json.dumps(header, ensure_ascii=False).encode()
+    writer.write(_HEADER.pack(len(data)) + data + payload)
+
+
+class Session:
+    """单个会话的状态：未提取特征的 PCM 尾部 + 已提取的 BNF"""
+
+    __slots__ = ('sessid', 'pcm', 'pcm_start', 'samples', '_bnf', '_count', 'final', 'frames',
+                 'created', 'lock')
+
+    def __init__(self, sessid):
+        self.sessid = sessid
+        self.pcm = np.zeros(0, dtype=np.int16)
+        # pcm[0] 在整段音频中的采样位置，以及已推送的总采样数
+        self.pcm_start = 0
+        self.samples = 0
+        self._bnf = np.zeros((0, 256), dtype=np.float32)
+        self._count = 0
+        self.final = False
+        self.frames = 0
+        self.created = time.time()
+        # 同一会话的特征提取按顺序进行
+        self.lock = asyncio.Lock()
+
+    @property
+    def bnf(self):
+        """已提取的 BNF [allcnt, 256]（视图，之后追加的特征不会改变它）"""
+        return self._bnf[:self._count]
+
+    def append_bnf(self, features):
+        """追加 BNF；容量按倍数增长，长会话不会每次推送都整体拷贝"""
+        end = self._count + len(features)
+        if end > len(self._bnf):
+            grown = np.empty((max(end, 2 * len(self._bnf), 256), 256), dtype=np.float32)
+            grown[:self._count] = self.bnf
+            self._bnf = grown
+        self._bnf[self._count:end] = features
+        self._count = end
+
+    @property
+    def allcnt(self):
+        return self._count
+
+    @property
+    def readycnt(self):
+        if self.final:
+            return self._count
+        return max(0, self._count - BNF_RIGHT_CONTEXT)
+
+
+class RenderServer:
+    """
+    会话管理 + 共享模型的渲染服务
+
+    Args:
+        renderer: AvatarRenderer（共享的模型、形象帧和 bbox）
+        wenet: 可选，WeNetInference；None 时只接受 kind=1 的 BNF 特征
+        workers: 线程池大小（同时进行的特征提取 / 渲染数）
+        jpeg_quality: filerst 返回 JPEG 时的质量
+        batcher: 可选，MicroBatcher；给定时各会话的 UNet 推理合并成 batch 执行
+    """
+
+    def __init__(self, renderer, wenet=None, workers=2, jpeg_quality=90, batcher=None):
+        self.renderer = renderer
+        self.wenet = wenet
+        self.batcher = batcher
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='render')
+        self.jpeg_quality = jpeg_quality
+        self.sessions = {}
+        self._ids = itertools.count(1)
+
+        self.requests = 0
+        self.frames = 0
+        self.render_s = 0.0
+
+    # ---- 在线程池中执行的部分 ----
+
+    def _extract(self, pcm):
+        """一个窗口的 PCM → BNF（WeNet 每次处理 melcnt 帧 Mel，对应 bnfcnt 帧 BNF，不足时补零）"""
+        audio = pcm.astype(np.float32) / 32768.0
+        mel = self.wenet.extract_mfcc(audio, SAMPLE_RATE)
+        return self.wenet.infer(mel).astype(np.float32)
+
+    def _next_window(self, session, final):
+        """
+        会话的下一个 WeNet 窗口
+
+        窗口从 已提取帧数 - 左侧上下文 的位置开始，取 melcnt * 160 个采样；结果中只保留
+        [first, last)：左侧上下文之后、右侧上下文之前。音频结束时最后一个窗口保留到音频末尾。
+
+        Returns:
+            (pcm, first, last)，还不能提取（音频未结束且不足一个窗口）时返回 None
+        """
+        block = self.wenet.melcnt * 160
+        emitted = session.allcnt
+        total = int(round(session.samples / SAMPLES_PER_BNF))
+        if final and emitted >= total:
+            return None
+        first = min(WENET_CONTEXT, emitted)
+        start = (emitted - first) * SAMPLES_PER_BNF - session.pcm_start
+        pcm = session.pcm[start:start + block]
+        if final and start + block >= len(session.pcm):
+            # 窗口已覆盖音频末尾，不再需要右侧上下文
+            last = first + total - emitted
+        elif len(pcm) < block:
+            return None
+        else:
+            last = self.wenet.bnfcnt - WENET_CONTEXT
+        return pcm, first, min(last, self.wenet.bnfcnt)
+
+    def _prepare(self, bnf, index):
+        """解码 + 裁剪 / 归一化"""
+        renderer = self.renderer
+        frame_index, path = renderer.frame_for(index)
+        task = {'index': index, 'frame_index': frame_index, 'path': path, 'bnf': bnf}
+        return renderer.crop(renderer.decode(task))
+
+    def _render(self, bnf, index, fmt):
+        return self._finish(self.renderer.infer(self._prepare(bnf, index)), fmt)
+
+    def _finish(self, task, fmt):
+        """混合 / 贴回 + 编码"""
+        frame = self.renderer.blend(task)['frame']
+        if fmt == 'raw':
+            return frame.tobytes(), list(frame.shape)
+        ok, data = cv2.imencode('.jpg', cv2.cvtColor(frame, cv2.COLOR_RGB2BGR),
+                                [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise RuntimeError("JPEG 编码失败")
+        return data.tobytes(), list(frame.shape)
+
+    # ---- 命令 ----
+
+    def _session(self, header):
+        sessid = header.get('sessid')
+        session = self.sessions.get(sessid)
+        if session is None:
+            raise KeyError(f"会话不存在: {sessid}")
+        return session
+
+    async def newsession(self, header, payload):
+        session = Session(next(self._ids))
+        self.sessions[session.sessid] = session
+        return {'sessid': session.sessid}, b''
+
+    async def pushpcm(self, header, payload):
+        session = self._session(header)
+        kind = header.get('kind', PCM_KIND)
+        async with session.lock:
+            if kind == BNF_KIND:
+                features = np.frombuffer(payload, dtype=np.float32).reshape(-1, 256)
+                session.append_bnf(features)
+            elif kind == PCM_KIND:
+                if self.wenet is None:
+                    raise ValueError("服务未加载 WeNet（--wenet），只能推送 kind=1 的 BNF 特征")
+                pcm = np.frombuffer(payload, dtype=np.int16)
+                session.pcm = np.concatenate([session.pcm, pcm])
+                session.samples += len(pcm)
+                loop = asyncio.get_running_loop()
+                # 攒够一个窗口再提取；音频结束时处理剩余部分
+                while True:
+                    window = self._next_window(session, header.get('final', False))
+                    if window is None:
+                        break
+                    pcm, first, last = window
+                    bnf = await loop.run_in_executor(self.executor, self._extract, pcm)
+                    session.append_bnf(bnf[first:last])
+                    # 只保留下一个窗口的左侧上下文之后的 PCM
+                    keep = max(0, session.allcnt - WENET_CONTEXT) * SAMPLES_PER_BNF
+                    session.pcm = session.pcm[keep - session.pcm_start:]
+                    session.pcm_start = keep
+            else:
+                raise ValueError(f"未知的数据类型 kind={kind}")
+            if header.get('final'):
+                session.final = True
+        return {'allcnt': session.allcnt}, b''
+
+    async def readycnt(self, header, payload):
+        session = self._session(header)
+        return {'readycnt': session.readycnt, 'allcnt': session.allcnt}, b''
+
+    async def filerst(self, header, payload):
+        session = self._session(header)
+        index = header['index']
+        if not 0 <= index < session.readycnt:
+            raise IndexError(f"帧 {index} 未就绪（readycnt={session.readycnt}）")
+        loop = asyncio.get_running_loop()
+        fmt = header.get('format', 'jpg')
+        start = time.perf_counter()
+        if self.batcher is None:
+            data, shape = await loop.run_in_executor(self.executor, self._render, session.bnf, index, fmt)
+        else:
+            # 推理交给跨会话的批处理线程，线程池只做前后处理，不会被等待 batch 的请求占满
+            task = await loop.run_in_executor(self.executor, self._prepare, session.bnf, index)
+            if 'generated' not in task:
+                future = self.batcher.submit(task.pop('face_input'), task.pop('audio_input'))
+                task['generated'] = await asyncio.wrap_future(future)
+                self.renderer.remember(task)
+            data, shape = await loop.run_in_executor(self.executor, self._finish, task, fmt)
+        self.render_s += time.perf_counter() - start
+        self.frames += 1
+        session.frames += 1
+        return {'shape': shape}, data
+
+    async def finsession(self, header, payload):
+        session = self.sessions.pop(header.get('sessid'), None)
+        if session is None:
+            raise KeyError(f"会话不存在: {header.get('sessid')}")
+        return {'frames': session.frames}, b''
+
+    async def stats(self, header, payload):
+        stats = {
+            'sessions': len(self.sessions),
+            'requests': self.requests,
+            'frames': self.frames,
+            'render_ms': self.render_s / self.frames * 1000 if self.frames else 0.0,
+            'session_bytes': sum(s.pcm.nbytes + s.bnf.nbytes for s in self.sessions.values()),
+        }
+        if self.batcher is not None:
+            stats['batching'] = self.batcher.stats()
+        if self.renderer.cache is not None:
+            stats['cache'] = self.renderer.cache.stats()
+        return stats, b''
+
+    COMMANDS = ('newsession', 'pushpcm', 'readycnt', 'filerst', 'finsession', 'stats')
+
+    async def handle(self, reader, writer):
+        """处理一个连接：一个连接上可以依次发送任意请求（包括多个会话）"""
+        try:
+            while True:
+                header, payload = await read_message(reader)
+                if header is None:
+                    break
+                self.requests += 1
+                cmd = header.get('cmd')
+                try:
+                    if cmd not in self.COMMANDS:
+                        raise ValueError(f"未知命令: {cmd}")
+                    response, data = await getattr(self, cmd)(header, payload)
+                    write_message(writer, dict(response, ok=True), data)
+                except Exception as e:
+                    write_message(writer, {'ok': False, 'error': f'{type(e).__name__}: {e}'})
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='多会话渲染服务（asyncio）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python render_server.py avatar/ --weights dh_model.pth --blend weight_168u.b --port 8765
+  python render_server.py avatar/ --wenet wenet.onnx --workers 4 --threads 1
+  python render_server.py avatar/ --batch 8 --max-wait 10 --workers 4
+  python render_server.py avatar/ --cache-mb 256 --cache-tolerance 0.05
+
+压测:
+  python ../tools/load_test_server.py --sessions 8 --frames 100
+        """
+    )
+    parser.add_argument('avatar_dir', help='形象目录（含 raw_jpgs/、解密后的 bbox.j）')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址（默认: 127.0.0.1）')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口（默认: 8765）')
+    parser.add_argument('--workers', type=int, default=2, help='渲染 / 特征提取线程数（默认: 2）')
+    parser.add_argument('--threads', type=int, default=None, help='每次推理使用的 torch 线程数')
+    parser.add_argument('--batch', type=int, default=1,
+                        help='跨会话批处理的最大 batch（默认: 1，即不合并）')
+    parser.add_argument('--max-wait', type=float, default=5.0,
+                        help='批处理时最早的请求最多等待的毫秒数（默认: 5）')
+    parser.add_argument('--frame-store', default=None,
+                        help='build_frame_store.py 生成的解码帧存储目录（通常为形象目录）')
+    parser.add_argument('--face-store', default=None,
+                        help='build_frame_store.py --faces 生成的人脸输入存储目录')
+    parser.add_argument('--cache-mb', type=int, default=0,
+                        help='UNet 输出缓存的内存上限 MB（默认: 0，不缓存；所有会话共享）')
+    parser.add_argument('--cache-tolerance', type=float, default=0.0,
+                        help='缓存键中 BNF 的量化步长（默认: 0）')
+    parser.add_argument('--wenet', default=None, help='解密后的 WeNet ONNX 模型（接受 PCM 时需要）')
+    parser.add_argument('--weights', default=None, help='fp32 权重（state_dict），默认随机初始化')
+    parser.add_argument('--quantized', default=None, help='INT8 量化模型（TorchScript）')
+    parser.add_argument('--blend', default=None, help='解密后的 weight_168u.b（不指定则不混合）')
+    parser.add_argument('--bbox', default=None, help='bbox.j 路径（默认 <avatar_dir>/bbox.j）')
+    parser.add_argument('--size', type=int, default=None, choices=[128, 160],
+                        help='工作分辨率（默认按人脸大小自动选择）')
+
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    print("=" * 60)
+    print("🛰️  多会话渲染服务")
+    print("=" * 60)
+
+    model = create_model(use_gpu=False, weights_path=args.weights,
+                         quantized_path=args.quantized, fuse=args.quantized is None)
+    blend_weights = load_blend_weights(args.blend) if args.blend else None
+    renderer = AvatarRenderer(model, args.avatar_dir, None, None, blend_weights,
+                              args.size, bbox_path=args.bbox)
+    if args.cache_mb > 0:
+        renderer.cache = FaceCache(args.cache_mb << 20, args.cache_tolerance)
+    if args.frame_store:
+        renderer.frame_store = FrameStore(args.frame_store)
+    if args.face_store:
+        renderer.face_store = FaceStore(args.face_store)
+    wenet = None
+    if args.wenet:
+        from audio_inference import WeNetInference
+        wenet = WeNetInference(args.wenet)
+
+    batcher = MicroBatcher(model, args.batch, args.max_wait) if args.batch > 1 else None
+    server = RenderServer(renderer, wenet, args.workers, batcher=batcher)
+    print(f"\n   形象帧: {len(renderer.frames)}   线程池: {args.workers}   "
+          f"torch 线程: {torch.get_num_threads()}   WeNet: {'已加载' if wenet else '未加载（仅 BNF）'}")
+    if batcher is not None:
+        print(f"   批处理: 最大 batch {args.batch}，最长等待 {args.max_wait:g} ms")
+    if renderer.cache is not None:
+        print(f"   UNet 缓存: {args.cache_mb} MB，量化步长 {args.cache_tolerance:g}")
+    print(f"   🚀 监听 {args.host}:{args.port}（Ctrl+C 退出）")
+
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n   已停止")
+    finally:
+        if batcher is not None:
+            batcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+分片多进程离线渲染（长视频）
+
+单进程逐帧渲染一段 10 分钟的口型视频只能用上多核机器的一小部分。这里把 BNF 时间轴切成
+连续的帧区间，每个区间由一个独立的工作进程渲染：
+
+- 每个进程各自加载模型，并设置 torch.set_num_threads（默认 CPU 核数 / 进程数）
+- 进程内逐帧 decode → crop → infer → blend，直接编码成自己的视频分段
+  （--frame-store 时各进程从同一个 mmap 文件取解码好的帧，共享一份 page cache）
+  （video_sink.VideoSink：有 ffmpeg 时 rawvideo 管道交给 libx264，否则用 OpenCV 的 mp4v）
+- 全部完成后用 ffmpeg concat 分离器 -c copy 无损拼接各分段（不重新编码）；
+  没有 ffmpeg 时退化为 OpenCV 解码后重新编码，并给出提示
+
+--scaling 1 2 4 8 时依次用不同的进程数渲染同一段帧，输出 帧/秒 与进程数的扩展性报告。
+
+用法:
+    python render_sharded.py <avatar_dir> <bnf.npy> <output.mp4> [选项]
+
+示例:
+    python render_sharded.py avatar/ audio_bnf.npy out.mp4 --workers 8 --weights dh_model.pth
+    python render_sharded.py avatar/ audio_bnf.npy out.mp4 --workers 4 --threads 2 --crf 18
+    python render_sharded.py avatar/ audio_bnf.npy out.mp4 --workers 8 --frame-store avatar/
+    python render_sharded.py avatar/ audio_bnf.npy out.mp4 --scaling 1 2 4 8 --frames 500
+"""
+
+import sys
+import os
+import time
+import shutil
+import subprocess
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+# 添加 models 目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'models'))
+
+import cv2
+import numpy as np
+import torch
+
+from video_sink import VideoSink, has_ffmpeg
+
+
+def split_frames(num_frames, shards):
+    """把 [0, num_frames) 切成 shards 个连续区间，返回 [(start, end), ...]"""
+    shards = max(1, min(shards, num_frames))
+    bounds = np.linspace(0, num_frames, shards + 1).round().astype(int)
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def render_shard(config, start, end, segment):
+    """
+    工作进程：渲染 [start, end) 帧并编码为 segment
+
+    Returns:
+        dict: 帧数、模型加载耗时、渲染耗时（秒）
+    """
+    t0 = time.perf_counter()
+    torch.set_num_threads(config['threads'])
+    cv2.setNumThreads(1)
+
+    import contextlib
+    import io
+    from inference import create_model, load_blend_weights
+    from render_pipeline import AvatarRenderer
+    from frame_store import FrameStore, FaceStore
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = create_model(use_gpu=False, weights_path=config['weights'],
+                             quantized_path=config['quantized'], fuse=config['quantized'] is None)
+    blend_weights = load_blend_weights(config['blend']) if config['blend'] else None
+    bnf = np.load(config['bnf'], mmap_mode='r')
+    renderer = AvatarRenderer(model, config['avatar_dir'], bnf, None, blend_weights,
+                              config['size'], bbox_path=config['bbox'])
+    if config['frame_store']:
+        renderer.frame_store = FrameStore(config['frame_store'])
+    if config['face_store']:
+        renderer.face_store = FaceStore(config['face_store'])
+    t1 = time.perf_counter()
+
+    # 编码在后台线程进行，与下一帧的渲染重叠
+    sink = VideoSink(segment, config['fps'], config['crf'], threads=1)
+    for index in range(start, end):
+        frame_index, path = renderer.frame_for(index)
+        task = {'index': index, 'frame_index': frame_index, 'path': path}
+        for stage in (renderer.decode, renderer.crop, renderer.infer, renderer.blend):
+            task = stage(task)
+        sink.write(task['frame'])
+    sink.close()
+
+    return {'start': start, 'end': end, 'frames': end - start,
+            'load_s': t1 - t0, 'render_s': time.perf_counter() - t1}
+
+
+def concat_segments(segments, output, fps=25):
+    """
+    拼接视频分段
+
+    Returns:
+        True 表示无损拼接（ffmpeg -c copy），False 表示退化为重新编码
+    """
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    if has_ffmpeg():
+        listing = output.parent / f'.{output.stem}_segments.txt'
+        with open(listing, 'w') as f:
+            for segment in segments:
+                f.write(f"file '{Path(segment).absolute()}'\n")
+        try:
+            subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                            '-i', str(listing), '-c', 'copy', str(output)], check=True)
+        finally:
+            listing.unlink()
+        return True
+
+    writer = None
+    for segment in segments:
+        capture = cv2.VideoCapture(str(segment))
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            if writer is None:
+                height, width = frame.shape[:2]
+                writer = cv2.VideoWriter(str(output), cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+            writer.write(frame)
+        capture.release()
+    if writer is not None:
+        writer.release()
+    return False
+
+
+def render_sharded(config, num_frames, workers, output, keep_segments=False):
+    """
+    多进程渲染并拼接
+
+    Returns:
+        dict: 进程数、每个分片的统计、总墙钟、拼接耗时、是否无损拼接
+    """
+    shards = split_frames(num_frames, workers)
+    output = Path(output)
+    segment_dir = output.parent / f'.{output.stem}_segments'
+    segment_dir.mkdir(parents=True, exist_ok=True)
+    segments = [segment_dir / f'{i:04d}.mp4' for i in range(len(shards))]
+
+    start = time.perf_counter()
+    # spawn：子进程重新导入 torch，不继承父进程的线程池状态
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(len(shards), mp_context=context) as pool:
+        futures = [pool.submit(render_shard, config, a, b, str(segment))
+                   for (a, b), segment in zip(shards, segments)]
+        results = [future.result() for future in futures]
+    render_wall = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lossless = concat_segments(segments, output, config['fps'])
+    concat_s = time.perf_counter() - start
+    if not keep_segments:
+        shutil.rmtree(segment_dir, ignore_errors=True)
+
+    return {'workers': len(shards), 'shards': results, 'wall_s': render_wall,
+            'concat_s': concat_s, 'lossless': lossless}
+
+
+def print_scaling(reports, num_frames):
+    """打印 帧/秒 与进程数的扩展性报告"""
+    print(f"   {'进程':>4} {'线程/进程':>9} {'墙钟(s)':>8} {'渲染fps':>8} {'含加载fps':>9} "
+          f"{'加速比':>7} {'效率':>6}")
+    print("   " + "-" * 60)
+    base = None
+    for threads, report in reports:
+        # 渲染阶段以最慢的分片为准；含加载 = 从启动进程到最后一个分片完成
+        render_s = max(s['render_s'] for s in report['shards'])
+        fps = num_frames / render_s
+        wall_fps = num_frames / report['wall_s']
+        # 加速比和效率相对第一行（通常是 1 个进程）
+        if base is None:
+            base = (fps, report['workers'])
+        speedup = fps / base[0]
+        efficiency = speedup / (report['workers'] / base[1])
+        print(f"   {report['workers']:>4} {threads:>9} {report['wall_s']:>8.1f} {fps:>8.1f} "
+              f"{wall_fps:>9.1f} {speedup:>6.2f}x {efficiency:>5.0%}")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='分片多进程离线渲染',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python render_sharded.py avatar/ audio_bnf.npy out.mp4 --workers 8 --weights dh_model.pth
+  python render_sharded.py avatar/ audio_bnf.npy out.mp4 --workers 4 --threads 2 --crf 18
+  python render_sharded.py avatar/ audio_bnf.npy out.mp4 --workers 8 --frame-store avatar/
+  python render_sharded.py avatar/ audio_bnf.npy out.mp4 --scaling 1 2 4 8 --frames 500
+        """
+    )
+    parser.add_argument('avatar_dir', help='形象目录（含 raw_jpgs/、解密后的 bbox.j）')
+    parser.add_argument('bnf', help='WeNet BNF 特征文件 (.npy, [T, 256])')
+    parser.add_argument('output', help='输出视频 (.mp4)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='工作进程数（默认: CPU 核数）')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='每个进程的 torch 线程数（默认: CPU 核数 / 进程数）')
+    parser.add_argument('--scaling', type=int, nargs='+', default=None,
+                        help='依次用这些进程数渲染，输出扩展性报告（最后一次的结果保留为输出视频）')
+    parser.add_argument('--frames', type=int, default=None, help='只渲染前 N 帧')
+    parser.add_argument('--fps', type=int, default=25, help='视频帧率（默认: 25）')
+    parser.add_argument('--crf', type=int, default=18, help='libx264 CRF（默认: 18）')
+    parser.add_argument('--weights', default=None, help='fp32 权重（state_dict），默认随机初始化')
+    parser.add_argument('--quantized', default=None, help='INT8 量化模型（TorchScript）')
+    parser.add_argument('--blend', default=None, help='解密后的 weight_168u.b（不指定则不混合）')
+    parser.add_argument('--bbox', default=None, help='bbox.j 路径（默认 <avatar_dir>/bbox.j）')
+    parser.add_argument('--size', type=int, default=None, choices=[128, 160],
+                        help='工作分辨率（默认按人脸大小自动选择）')
+    parser.add_argument('--frame-store', default=None,
+                        help='build_frame_store.py 生成的解码帧存储目录（通常为形象目录）')
+    parser.add_argument('--face-store', default=None,
+                        help='build_frame_store.py --faces 生成的人脸输入存储目录')
+    parser.add_argument('--keep-segments', action='store_true', help='保留各进程的视频分段')
+
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🧩 分片多进程离线渲染")
+    print("=" * 60)
+
+    num_frames = len(np.load(args.bnf, mmap_mode='r'))
+    if args.frames is not None:
+        num_frames = min(num_frames, args.frames)
+    if num_frames <= 0:
+        parser.error(f'没有可渲染的帧（{args.bnf} 为空或 --frames 不是正数）')
+    cpus = os.cpu_count() or 1
+    config = {
+        'avatar_dir': args.avatar_dir, 'bnf': args.bnf, 'weights': args.weights,
+        'quantized': args.quantized, 'blend': args.blend, 'bbox': args.bbox, 'size': args.size,
+        'fps': args.fps, 'crf': args.crf, 'frame_store': args.frame_store,
+        'face_store': args.face_store,
+    }
+    print(f"\n   帧数: {num_frames}（{num_frames / args.fps:.1f} s）   CPU: {cpus}   "
+          f"编码: {'ffmpeg libx264' if has_ffmpeg() else 'OpenCV mp4v（未找到 ffmpeg）'}\n")
+
+    reports = []
+    for workers in args.scaling or [args.workers]:
+        threads = args.threads or max(1, cpus // workers)
+        config['threads'] = threads
+        print(f"   ▶ {workers} 进程 × {threads} 线程 ...")
+        report = render_sharded(config, num_frames, workers, args.output, args.keep_segments)
+        reports.append((threads, report))
+
+    print()
+    print_scaling(reports, num_frames)
+    report = reports[-1][1]
+    print(f"\n   拼接 {report['workers']} 个分段: {report['concat_s']:.2f} s"
+          f"（{'无损，-c copy' if report['lossless'] else '⚠️  未找到 ffmpeg，已重新编码'}）")
+    print(f"   💾 输出: {args.output}")
+
+    print("\n" + "=" * 60)
+    print("✅ 渲染完成")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+预分配输入 / 输出缓冲的推理执行器
+
+inference() + postprocess_output() 每帧都会新建设备上的输入副本、缩放 / 截断 / 重排后的
+中间张量和 numpy 结果。InferenceRunner 按 (batch, 分辨率) 一次性申请：
+- 输入缓冲 face [B, 6, S, S] / audio [B, 256, 20]（CUDA 上另有锁页内存的主机端暂存区，
+  拷贝可异步进行）
+- 后处理缓冲：输出精度下的 [B, 3, S, S]，以及 uint8 的 [B, S, S, 3]（仅 CUDA）
+
+每帧只把数据拷入输入缓冲，后处理全部原地完成，uint8 结果直接写入调用方给出的数组。
+执行器自身稳态下每帧零分配；模型前向的分配取决于模型本身，
+配合 models/arena.py 的 ArenaUnet 时 CUDA 上整体为零（CPU 上只剩卷积内核自身的申请）。
+
+缓冲不可跨线程共享，多线程推理时每个线程各建一个执行器。
+
+用法:
+    runner = InferenceRunner(model, batch_size=4, size=160, device='cpu')
+    out = np.empty((4, 160, 160, 3), dtype=np.uint8)
+    preprocess_faces(faces, size=160, out=runner.face_input)   # 直接写入输入缓冲
+    runner.run(runner.face_input[:4], audio, out=out)
+"""
+import numpy as np
+import torch
+
+from inference import model_dtype
+
+
+class InferenceRunner:
+    """
+    复用输入 / 输出缓冲的模型推理
+
+    Args:
+        model: MobileNetV2Unet 或 create_model 返回的其他变体（如 ArenaUnet）
+        batch_size: 最大 batch，每次调用可以小于它
+        size: 工作分辨率（128 或 160）
+        device: 'cuda' 或 'cpu'
+        dtype: 输入精度，默认与模型参数一致
+    """
+
+    def __init__(self, model, batch_size=1, size=160, device='cpu', dtype=None):
+        self.model = model
+        self.batch_size = batch_size
+        self.size = size
+        self.device = torch.device(device)
+        self.dtype = model_dtype(model) if dtype is None else dtype
+
+        cuda = self.device.type == 'cuda'
+        face_shape = (batch_size, 6, size, size)
+        audio_shape = (batch_size, 256, 20)
+        self.face = torch.empty(face_shape, dtype=self.dtype, device=self.device)
+        self.audio = torch.empty(audio_shape, dtype=self.dtype, device=self.device)
+        # 主机端暂存区：preprocess_faces(out=...) 可以直接写入；CPU 上就是输入缓冲本身
+        self.face_input = torch.empty(face_shape, dtype=self.dtype, pin_memory=True) if cuda else self.face
+        self.audio_input = torch.empty(audio_shape, dtype=self.dtype, pin_memory=True) if cuda else self.audio
+
+        # numpy 不支持 bfloat16，后处理在输出精度下完成后截断为 uint8
+        self._scaled = torch.empty(batch_size, 3, size, size, dtype=self.dtype, device=self.device)
+        self._uint8 = (torch.empty(batch_size, size, size, 3, dtype=torch.uint8, device=self.device)
+                       if cuda else None)
+        self._uint8_host = (torch.empty(batch_size, size, size, 3, dtype=torch.uint8, pin_memory=True)
+                            if cuda else None)
+        self.output = np.empty((batch_size, size, size, 3), dtype=np.uint8)
+        # 后处理用的标量：Python 数字参与运算时每次都会包装成新的 0 维张量
+        self._one, self._two, self._zero, self._max = (
+            torch.tensor(v, dtype=self.dtype, device=self.device) for v in (1, 2, 0, 255))
+
+    @staticmethod
+    def _copy(dst, src):
+        """把 src 拷入 dst（src 为 numpy 数组或张量；dst 与 src 相同时跳过）"""
+        if isinstance(src, np.ndarray):
+            src = torch.from_numpy(src)
+        if src.data_ptr() != dst.data_ptr():
+            dst.copy_(src)
+
+    @torch.no_grad()
+    def run(self, face, audio, out=None):
+        """
+        Args:
+            face: [n, 6, S, S]，张量或 numpy 数组（n <= batch_size），
+                  也可以就是 face_input 的切片（跳过主机端拷贝）
+            audio: [n, 256, 20]，张量或 numpy 数组，同上
+            out: uint8 numpy 数组 [n, S, S, 3]；None 时写入内部的 self.output
+                 （返回其前 n 个，下一次调用会被覆盖）
+
+        Returns:
+            out
+        """
+        batch = len(face)
+        if batch > self.batch_size:
+            raise ValueError(f"batch {batch} 超过执行器容量 {self.batch_size}")
+        if out is None:
+            out = self.output[:batch]
+
+        face_input, audio_input = self.face_input[:batch], self.audio_input[:batch]
+        self._copy(face_input, face)
+        self._copy(audio_input, audio)
+        face_buf, audio_buf = self.face[:batch], self.audio[:batch]
+        if face_buf.data_ptr() != face_input.data_ptr():
+            face_buf.copy_(face_input, non_blocking=True)
+            audio_buf.copy_(audio_input, non_blocking=True)
+
+        output = self.model(face_buf, audio_buf)
+
+        # 与 postprocess_output 相同：[-1, 1] → [0, 255]，截断为 uint8，[B, 3, H, W] → [B, H, W, 3]
+        scaled = self._scaled[:batch]
+        torch.add(output, self._one, out=scaled)
+        scaled.div_(self._two).mul_(self._max).clamp_(self._zero, self._max)
+        result = torch.from_numpy(out)
+        if self._uint8 is None:
+            result.copy_(scaled.permute(0, 2, 3, 1))
+        else:
+            self._uint8[:batch].copy_(scaled.permute(0, 2, 3, 1))
+            self._uint8_host[:batch].copy_(self._uint8[:batch])
+            result.copy_(self._uint8_host[:batch])
+        return out
@@ -0,0 +1,237 @@
+"""
+静音区间快速路径
+
+原生 SDK 的 ModelInfo 把形象帧分成 Region：TYPE_SILENCE（静音）和 TYPE_MOTION（动作），
+说话间隙播放静音区间的原始帧，不需要合成嘴型。Python 流水线原本对静音也照常跑 UNet。
+
+这里在 PCM 上做一个能量门限 VAD，把每个 40ms 视频帧标记为语音 / 静音：
+
+- 帧能量（RMS，dBFS）高于 threshold_db 为语音
+- 语音向两侧扩展 hangover 帧：BNF 窗口以当前帧为中心前后各 10 帧，嘴型会在发声前张开、
+  在声音结束后闭合
+- 短于 min_silence 帧的停顿仍按语音处理，避免嘴型频繁切换
+
+SilencePlan 把整段时间轴编排成三类帧：
+
+- 语音帧：照常推理，形象帧按时间轴循环取用
+- 静音帧：直接输出原始图像，不调用模型。静音段（含两端过渡帧）在时间轴上的形象帧都属于
+  静音区间时沿用它们（SDK 没有定义静音区间时即全部形象帧，画面没有跳变），否则整段改为
+  从静音区间第一帧开始循环取用；follow=True 时（frames 为 Playlist.frames() 展开的播放顺序）
+  一律沿用时间轴上的帧，已安排的动作在静音时照常播放，只是跳过推理
+- 过渡帧：静音段两端各 crossfade 帧，使用与该静音段相同的形象帧，照常推理后在人脸区域
+  与原始裁剪按比例交叉淡化，嘴型逐渐闭合到原始图像
+
+用法:
+    pcm = load_pcm('audio.wav')
+    speech = detect_speech(pcm)
+    regions = load_regions('avatar/', frame_indices)
+    plan = SilencePlan(speech, renderer.frames, silence_region(regions), crossfade=3)
+"""
+import json
+import wave
+from pathlib import Path
+
+import numpy as np
+
+
+# ModelInfo$Region.type
+TYPE_SILENCE = 0
+TYPE_MOTION = 1
+
+SAMPLE_RATE = 16000
+
+
+class Region:
+    """对应 ModelInfo$Region：类型、名称、所含形象帧号（升序）"""
+
+    __slots__ = ('type', 'name', 'frames')
+
+    def __init__(self, type, name='', frames=None):
+        self.type = type
+        self.name = name
+        self.frames = list(frames or [])
+
+    def __repr__(self):
+        return f"Region{{type={self.type}, name={self.name}, frames={len(self.frames)}}}"
+
+
+def load_regions(avatar_dir, frame_indices, special_path=None, config_path=None):
+    """
+    读取形象的静音 / 动作区间（与 ModelInfoLoader 的解析顺序一致）
+
+    1. 解密后的 SpecialAction.json：duixAppointInterval.silences / actions，
+       每项 {"name": ..., "action": [起始帧, 结束帧]}（闭区间，取第一个有效的静音区间）
+    2. 否则读取解密后的 config.j 中的 ranges：[{"min": ..., "max": ..., "type": 0/1}]
+
+    Args:
+        avatar_dir: 形象目录
+        frame_indices: 形象帧号列表
+        special_path / config_path: 默认 <avatar_dir>/SpecialAction.json、<avatar_dir>/config.j
+
+    Returns:
+        list of Region（文件不存在或没有区间定义时为空列表）
+    """
+    avatar_dir = Path(avatar_dir)
+    frame_indices = sorted(frame_indices)
+
+    def region(type, name, start, end):
+        return Region(type, name, [i for i in frame_indices if start <= i <= end])
+
+    regions = []
+    special_path = Path(special_path or avatar_dir / 'SpecialAction.json')
+    config_path = Path(config_path or avatar_dir / 'config.j')
+    if special_path.exists():
+        with open(special_path, 'r') as f:
+            interval = json.load(f).get('duixAppointInterval') or {}
+        for item in interval.get('silences') or []:
+            action = item.get('action') or []
+            if item.get('name') and len(action) == 2 and action[1] > action[0]:
+                regions.append(region(TYPE_SILENCE, item['name'], *action))
+                break
+        for item in interval.get('actions') or []:
+            action = item.get('action') or []
+            if item.get('name') and len(action) == 2 and action[1] > action[0]:
+                regions.append(region(TYPE_MOTION, item['name'], *action))
+    elif config_path.exists():
+        with open(config_path, 'r') as f:
+            ranges = json.load(f).get('ranges') or []
+        for item in ranges:
+            type = item.get('type', TYPE_SILENCE)
+            name = 'silence' if type == TYPE_SILENCE else 'unknown'
+            regions.append(region(type, name, item.get('min', 0), item.get('max', 0)))
+    return [r for r in regions if r.frames]
+
+
+def silence_region(regions, frame_indices):
+    """取第一个静音区间；没有时与 SDK 一样以全部形象帧作为静音区间"""
+    for region in regions:
+        if region.type == TYPE_SILENCE:
+            return region
+    return Region(TYPE_SILENCE, '', sorted(frame_indices))
+
+
+def load_pcm(path):
+    """
+    读取 16kHz int16 PCM：.wav（多声道取平均）或裸 .pcm
+
+    Returns:
+        numpy array int16 [N]
+    """
+    path = Path(path)
+    if path.suffix.lower() != '.wav':
+        return np.fromfile(path, dtype=np.int16)
+    with wave.open(str(path), 'rb') as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"只支持 16-bit PCM WAV: {path}")
+        if f.getframerate() != SAMPLE_RATE:
+            raise ValueError(f"采样率需为 {SAMPLE_RATE} Hz（实际 {f.getframerate()}）: {path}")
+        pcm = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+        channels = f.getnchannels()
+    if channels > 1:
+        pcm = pcm.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return pcm
+
+
+def frame_energy(pcm, sample_rate=SAMPLE_RATE, fps=25):
+    """每个视频帧的 RMS 能量（dBFS），最后不足一帧的部分补零"""
+    hop = sample_rate // fps
+    count = -(-len(pcm) // hop)
+    frames = np.zeros(count * hop, dtype=np.float32)
+    frames[:len(pcm)] = pcm
+    frames = frames.reshape(count, hop) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def detect_speech(pcm, sample_rate=SAMPLE_RATE, fps=25, threshold_db=-40.0, hangover=4,
+                  min_silence=8):
+    """
+    能量门限 VAD
+
+    Args:
+        pcm: int16 [N]
+        threshold_db: 语音能量门限（dBFS）
+        hangover: 语音向两侧扩展的帧数
+        min_silence: 短于该帧数的静音段按语音处理
+
+    Returns:
+        numpy bool array [帧数]，True 为语音
+    """
+    speech = frame_energy(pcm, sample_rate, fps) > threshold_db
+    if hangover > 0 and speech.any():
+        # 一维膨胀：任一帧在 hangover 范围内有语音即为语音
+        padded = np.concatenate([np.zeros(hangover, bool), speech, np.zeros(hangover, bool)])
+        counts = np.convolve(padded, np.ones(2 * hangover + 1), mode='valid')
+        speech = counts > 0
+    # 填平短停顿（开头 / 结尾的静音不受 min_silence 限制）
+    for start, end in silent_spans(speech):
+        if end - start < min_silence and start > 0 and end < len(speech):
+            speech[start:end] = True
+    return speech
+
+
+def silent_spans(speech):
+    """连续静音段 [(start, end), ...]（end 不含）"""
+    silent = np.concatenate([[False], ~np.asarray(speech, bool), [False]])
+    edges = np.flatnonzero(silent[1:] != silent[:-1])
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+class SilencePlan:
+    """
+    按 VAD 结果编排每个输出帧
+
+    Args:
+        speech: detect_speech() 的结果（bool [帧数]）
+        frames: AvatarRenderer.frames，[(形象帧号, 路径)]，输出帧按它循环取用
+        region: 静音区间（silence_region() 的结果）
+        crossfade: 静音段两端的交叉淡化帧数
+        follow: 静音帧一律沿用 frames 中的形象帧，不替换为静音区间的帧
+    """
+
+    def __init__(self, speech, frames, region, crossfade=3, follow=False):
+        self.speech = np.asarray(speech, bool)
+        self.crossfade = crossfade
+        paths = dict(frames)
+        members = set(region.frames)
+        self.silence_frames = [(i, paths[i]) for i in region.frames if i in paths]
+        if not self.silence_frames:
+            raise ValueError("静音区间中没有可用的形象帧")
+
+        # 每帧: None（语音）、('fade', (原始图像权重, (形象帧号, 路径))) 或 ('silent', (形象帧号, 路径))
+        self.entries = [None] * len(self.speech)
+        for start, end in silent_spans(self.speech):
+            # 整段（含过渡帧）用同一组形象帧，过渡帧与静音帧之间不会换图
+            span = [frames[index % len(frames)] for index in range(start, end)]
+            if not follow and any(frame[0] not in members for frame in span):
+                span = [self.silence_frames[k % len(self.silence_frames)] for k in range(end - start)]
+            for index, frame in zip(range(start, end), span):
+                # 到相邻语音帧的距离（时间轴两端之外没有语音，不需要过渡）
+                left = index - start + 1 if start > 0 else np.inf
+                right = end - index if end < len(self.speech) else np.inf
+                distance = min(left, right)
+                if distance <= crossfade:
+                    self.entries[index] = ('fade', (distance / (crossfade + 1), frame))
+                else:
+                    self.entries[index] = ('silent', frame)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        return self.entries[index] if index < len(self.entries) else None
+
+    def stats(self, num_frames=None):
+        """前 num_frames 帧中静音帧（跳过推理）、过渡帧和语音帧的数量"""
+        entries = self.entries[:num_frames]
+        skipped = sum(1 for e in entries if e is not None and e[0] == 'silent')
+        faded = sum(1 for e in entries if e is not None and e[0] == 'fade')
+        total = len(entries)
+        return {
+            'frames': total,
+            'speech': total - skipped - faded,
+            'crossfade': faded,
+            'skipped': skipped,
+            'skipped_fraction': skipped / total if total else 0.0,
+            'silent_spans': len(silent_spans(self.speech[:total])),
+        }
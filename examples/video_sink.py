@@ -0,0 +1,264 @@
+"""
+把生成的帧直接编码为视频
+
+tools/merge_video_frames.py 面向磁盘上已有的 .sij 帧：写一个 concat 列表，让 ffmpeg 逐个读取、
+解码再编码。渲染出来的帧如果也走这条路，就得先逐帧写成 JPEG 再合并。
+
+VideoSink 把 uint8 RGB 帧以 rawvideo 格式直接写入 ffmpeg 的 stdin：
+- 后台线程负责写管道，调用方只是放入有界队列，生成与编码重叠进行
+- 队列满时 write() 阻塞（背压），blocked 统计调用方因此等待的时间，
+  明显大于 0 说明编码是瓶颈
+- write(frame, index) 带帧号时按帧号重排，多个线程乱序完成的帧也按顺序写入；
+  上游处理失败的帧调用 skip(index)，用前一帧补位，时间轴（和音频）不会错位。
+  等待前面帧号的帧超过 queue_size 个时直接报错，不会无限制地暂存
+- 宽高在第一帧到达时确定；没有 ffmpeg 时退化为 OpenCV mp4v（同样在后台线程）
+
+边生成边播放：
+- audio: 同时封装驱动口型的音频（.wav，或 16kHz 单声道裸 int16 .pcm），第 i 帧对应音频的
+  i / fps 秒，与 BNF 的 40ms 帧对齐；时长以视频为准（音频长则截断，短则补静音）
+- format='fmp4': 分片 MP4（empty_moov + 每个关键帧一个分片），文件在写入过程中即可播放
+- format='hls': HLS 事件播放列表 + .ts 分段，每 segment_seconds 秒强制一个关键帧并切出一个分段
+- first_segment_s: 从创建 sink 到第一个可播放分片 / 分段写出的时间
+
+用法:
+    sink = VideoSink('out.mp4', fps=25, crf=18)
+    for frame in frames:              # [H, W, 3] uint8 RGB
+        sink.write(frame)
+    stats = sink.close()
+
+    sink = VideoSink('live/index.m3u8', audio='audio.wav', format='hls', segment_seconds=2)
+"""
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+def has_ffmpeg():
+    return shutil.which('ffmpeg') is not None
+
+
+# 队列结束标记
+_STOP = object()
+
+FORMATS = ('mp4', 'fmp4', 'hls')
+
+# 裸 PCM 音频的格式（与 audio_inference / silence 一致）
+PCM_RATE = 16000
+
+
+class VideoSink:
+    """
+    Args:
+        path: 输出视频路径
+        fps: 帧率
+        crf / preset: libx264 参数
+        threads: ffmpeg 编码线程数（None 时由 ffmpeg 决定）
+        queue_size: 等待写入的帧数上限（也是按帧号重排时最多暂存的帧数）
+        audio: 一起封装的音频（.wav 或 16kHz 裸 int16 .pcm），None 时只有视频
+        format: 'mp4'、'fmp4'（分片 MP4）或 'hls'（path 为 .m3u8）
+        segment_seconds: fmp4 / hls 的分片时长（秒）
+    """
+
+    def __init__(self, path, fps=25, crf=18, preset='veryfast', threads=None, queue_size=16,
+                 audio=None, format='mp4', segment_seconds=2.0):
+        if format not in FORMATS:
+            raise ValueError(f"不支持的格式: {format}（可选: {', '.join(FORMATS)}）")
+        if (audio is not None or format != 'mp4') and not has_ffmpeg():
+            raise RuntimeError("封装音频和分片输出需要 ffmpeg")
+        self.path = str(path)
+        self.audio = audio
+        self.format = format
+        self.segment_seconds = segment_seconds
+        self.fps = fps
+        self.crf = crf
+        self.preset = preset
+        self.threads = threads
+        self.size = None
+        self.frames = 0
+        self.blocked = 0.0
+        self.busy = 0.0
+        self.error = None
+        self.started = time.perf_counter()
+        self.first_segment_s = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._max_pending = queue_size
+        self._pending = {}
+        self._next = 0
+        # 重排时最后放入队列的帧，以及开头还没有前一帧可补的失败帧数
+        self._last = None
+        self._owed = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._process = None
+        self._writer = None
+        self._watcher = None
+        self._thread = threading.Thread(target=self._run, name='video-sink', daemon=True)
+        self._thread.start()
+
+    def command(self, width, height):
+        """ffmpeg 命令行：stdin 为 rawvideo rgb24，可选第二个输入为音频"""
+        cmd = ['ffmpeg', '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(self.fps),
+               '-i', '-']
+        if self.audio is not None:
+            if Path(self.audio).suffix.lower() != '.wav':
+                cmd += ['-f', 's16le', '-ar', str(PCM_RATE), '-ac', '1']
+            cmd += ['-i', str(self.audio)]
+        cmd += ['-c:v', 'libx264', '-preset', self.preset, '-crf', str(self.crf), '-pix_fmt', 'yuv420p']
+        if self.threads:
+            cmd += ['-threads', str(self.threads)]
+        if self.format != 'mp4':
+            # 分片 / 分段只能从关键帧开始
+            cmd += ['-force_key_frames', f'expr:gte(t,n_forced*{self.segment_seconds})']
+        if self.audio is not None:
+            # apad + shortest：音频补静音到无限长，再按视频结束
+            cmd += ['-map', '0:v', '-map', '1:a', '-c:a', 'aac', '-b:a', '64k', '-af', 'apad', '-shortest']
+        if self.format == 'fmp4':
+            cmd += ['-movflags', 'frag_keyframe+empty_moov+default_base_moof']
+        elif self.format == 'hls':
+            path = Path(self.path)
+            cmd += ['-f', 'hls', '-hls_time', str(self.segment_seconds), '-hls_list_size', '0',
+                    '-hls_playlist_type', 'event',
+                    '-hls_segment_filename', str(path.with_name(f'{path.stem}_%05d.ts'))]
+        return cmd + [self.path]
+
+    def _segment_ready(self):
+        """第一个可播放的分片 / 分段是否已经写出"""
+        path = Path(self.path)
+        if not path.exists():
+            return False
+        if self.format == 'hls':
+            return '#EXTINF' in path.read_text(errors='ignore')
+        with open(path, 'rb') as f:
+            return b'moof' in f.read()
+
+    def _watch(self):
+        """轮询输出文件，记录第一个分片 / 分段出现的时间"""
+        while self._process.poll() is None:
+            if self._segment_ready():
+                self.first_segment_s = time.perf_counter() - self.started
+                return
+            time.sleep(0.02)
+        if self._segment_ready():
+            self.first_segment_s = time.perf_counter() - self.started
+
+    def _open(self, frame):
+        height, width = frame.shape[:2]
+        self.size = (width, height)
+        if has_ffmpeg():
+            if self.format == 'hls':
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._process = subprocess.Popen(self.command(width, height), stdin=subprocess.PIPE)
+            if self.format != 'mp4':
+                self._watcher = threading.Thread(target=self._watch, name='video-sink-watch', daemon=True)
+                self._watcher.start()
+        else:
+            self._writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, (width, height))
+
+    def _run(self):
+        while True:
+            frame = self._queue.get()
+            if frame is _STOP:
+                break
+            if self.error is not None:
+                continue
+            start = time.perf_counter()
+            try:
+                if self.size is None:
+                    self._open(frame)
+                if frame.shape[1::-1] != self.size:
+                    raise ValueError(f"帧尺寸不一致: {frame.shape[1::-1]}，应为 {self.size}")
+                if self._process is not None:
+                    self._process.stdin.write(np.ascontiguousarray(frame).data)
+                else:
+                    self._writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+                self.frames += 1
+            except Exception as e:
+                # 之后的帧直接丢弃，close() 时抛出；继续取队列，避免调用方一直阻塞
+                self.error = e
+            self.busy += time.perf_counter() - start
+
+    def _put(self, frame):
+        start = time.perf_counter()
+        self._queue.put(frame)
+        self.blocked += time.perf_counter() - start
+
+    def write(self, frame, index=None):
+        """
+        放入一帧（[H, W, 3] uint8 RGB）。帧在写入前不会被拷贝，调用方之后不要再修改它
+
+        Args:
+            index: 帧号（从 0 开始）。给出时按帧号顺序写入，先到的帧暂存等待前面的帧
+        """
+        if self.error is not None:
+            raise RuntimeError(f"视频编码失败: {self.path}") from self.error
+        if index is None:
+            self._put(frame)
+            return
+        self._add(index, frame)
+
+    def skip(self, index):
+        """第 index 帧处理失败：用前一帧补位（第一帧就失败时用之后第一个成功的帧）"""
+        if self.error is None:
+            self._add(index, None)
+
+    def _add(self, index, frame):
+        with self._lock:
+            self._pending[index] = frame
+            while self._next in self._pending:
+                frame = self._pending.pop(self._next)
+                self._next += 1
+                if frame is None:
+                    self.skipped += 1
+                    frame = self._last
+                    if frame is None:
+                        self._owed += 1
+                        continue
+                for _ in range(self._owed + 1):
+                    self._put(frame)
+                self._owed = 0
+                self._last = frame
+            if len(self._pending) > self._max_pending:
+                self._pending.clear()
+                self.error = RuntimeError(f"第 {self._next} 帧迟迟未到，之后已有 "
+                                          f"{self._max_pending} 帧在等待，既没有写入也没有 skip()")
+                raise RuntimeError(f"视频编码失败: {self.path}") from self.error
+
+    def close(self):
+        """等待全部帧写完并结束编码，返回 stats()"""
+        with self._lock:
+            if self._pending:
+                missing = self._next
+                self._pending.clear()
+                self.error = self.error or ValueError(f"缺少第 {missing} 帧，之后的帧未写入")
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self._process is not None:
+            self._process.stdin.close()
+            if self._process.wait() != 0 and self.error is None:
+                self.error = RuntimeError(f"ffmpeg 退出码 {self._process.returncode}")
+            if self._watcher is not None:
+                self._watcher.join()
+        elif self._writer is not None:
+            self._writer.release()
+        if self.error is not None:
+            raise RuntimeError(f"视频编码失败: {self.path}") from self.error
+        return self.stats()
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'encoder': 'ffmpeg' if self._process is not None else 'opencv',
+            'encode_fps': self.frames / self.busy if self.busy else 0.0,
+            'blocked_s': self.blocked,
+            'skipped': self.skipped,
+            'format': self.format,
+            'audio': self.audio is not None,
+            'first_segment_s': self.first_segment_s,
+        }
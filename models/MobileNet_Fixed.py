@@ -3,11 +3,32 @@
 与 NCNN 模型结构完全对齐
 """
 import torch
+import torch.fx
 import torch.nn as nn
 import torch.nn.functional as F
 import math
 
 
+def audio_to_nchw(x):
+    """
+    将音频特征统一转换为 [B, 1, 20, 256]（交换高宽）
+
+    支持 [B, 256, 20] 与 [B, 1, 256, 20] 两种输入。该函数在 FX 追踪时
+    作为叶子节点保留（见 torch.fx.wrap），使整网可以被 symbolic_trace，
+    用于 FX 图模式量化。
+    """
+    if x.dim() == 3:
+        # [B, 256, 20] → [B, 20, 256] → [B, 1, 20, 256]
+        x = x.transpose(1, 2).unsqueeze(1)
+    elif x.dim() == 4 and x.shape[1] == 1 and x.shape[2] == 256:
+        # [B, 1, 256, 20] → [B, 1, 20, 256]
+        x = x.transpose(2, 3)
+    return x
+
+
+torch.fx.wrap('audio_to_nchw')
+
+
 class Conv2d(nn.Module):
     """基础卷积块"""
     def __init__(self, cin, cout, kernel_size, stride, padding, residual=False, 
@@ -62,12 +83,15 @@ def conv_1x1_bn(inp, oup, use_groupnorm=False):
 
 class InvertedResidual(nn.Module):
     """Inverted Residual Block (MobileNetV2)"""
-    def __init__(self, inp, oup, stride, expand_ratio, use_groupnorm=False):
+    def __init__(self, inp, oup, stride, expand_ratio, use_groupnorm=False, hidden_dim=None):
         super(InvertedResidual, self).__init__()
         self.stride = stride
         assert stride in [1, 2]
 
-        hidden_dim = round(inp * expand_ratio)
+        # hidden_dim 可显式指定（结构化剪枝后的扩展通道数）
+        if hidden_dim is None or expand_ratio == 1:
+            hidden_dim = round(inp * expand_ratio)
+        self.hidden_dim = hidden_dim
         self.use_res_connect = self.stride == 1 and inp == oup
 
         if expand_ratio == 1:
@@ -134,7 +158,7 @@ class InvertedResidual(nn.Module):
 class MobileNetV2(nn.Module):
     """修正后的 MobileNetV2 编码器（与 NCNN 对齐）"""
     def __init__(self, n_class=1000, input_size=224, width_mult=1., 
-                 use_groupnorm=False):
+                 use_groupnorm=False, hidden_dims=None):
         super(MobileNetV2, self).__init__()
         block = InvertedResidual
         input_channel = 32
@@ -188,15 +212,21 @@ class MobileNetV2(nn.Module):
             ])
         
         # 构建 inverted residual blocks
+        # hidden_dims: 可选，按顺序给出每个 block 的扩展通道数（剪枝后的配置）
+        self.hidden_dims = []
         for t, c, n, s in interverted_residual_setting:
             output_channel = int(c * width_mult)
             for i in range(n):
+                hidden_dim = hidden_dims[len(self.hidden_dims)] if hidden_dims else None
                 if i == 0:
                     self.features.append(block(input_channel, output_channel, s, 
-                                             expand_ratio=t, use_groupnorm=use_groupnorm))
+                                             expand_ratio=t, use_groupnorm=use_groupnorm,
+                                             hidden_dim=hidden_dim))
                 else:
                     self.features.append(block(input_channel, output_channel, 1, 
-                                             expand_ratio=t, use_groupnorm=use_groupnorm))
+                                             expand_ratio=t, use_groupnorm=use_groupnorm,
+                                             hidden_dim=hidden_dim))
+                self.hidden_dims.append(self.features[-1].hidden_dim)
                 input_channel = output_channel
         
         # 最后一层
@@ -283,14 +313,9 @@ class AudioEncoder(nn.Module):
         self.conv8 = nn.Conv2d(128, 128, 3, stride=1, padding=1)
         self.bn8 = nn.BatchNorm2d(128)
         
-    def forward(self, x):
+    def forward(self, x, output_size=(5, 5)):
         # x: [B, 256, 20] → 需要转换为 [B, 1, 20, 256] (交换高宽)
-        if x.dim() == 3:
-            # [B, 256, 20] → [B, 20, 256] → [B, 1, 20, 256]
-            x = x.transpose(1, 2).unsqueeze(1)
-        elif x.dim() == 4 and x.shape[1] == 1 and x.shape[2] == 256:
-            # [B, 1, 256, 20] → [B, 1, 20, 256]
-            x = x.transpose(2, 3)
+        x = audio_to_nchw(x)
         
         x = self.conv1(x)  # [B, 16, 9, 127]
         x = self.conv2(x)  # [B, 32, 4, 63]
@@ -314,22 +339,52 @@ class AudioEncoder(nn.Module):
         x = x + identity
         x = F.relu(x)      # [B, 128, 1, 4]
         
-        # 调整到 5×5 以匹配解码器
-        x = F.adaptive_avg_pool2d(x, (5, 5))  # [B, 128, 5, 5]
+        # 调整到解码器最深层的尺寸（160 输入为 5×5，128 输入为 4×4）
+        x = F.adaptive_avg_pool2d(x, output_size)  # [B, 128, S/32, S/32]
         
         return x
 
 
+# 解码器各级跳跃连接的编码器通道数 (x5, x4, x3, x2, x1)
+SKIP_CHANNELS = (320, 96, 32, 24, 16)
+
+
+def default_unet_config():
+    """
+    MobileNetV2Unet 的完整宽度通道配置
+
+    - backbone_hidden: 编码器 17 个 InvertedResidual 的扩展通道数（None 表示 inp * t）
+    - dconv: dconv0 ~ dconv5 的输出通道数
+    - invres: invres0 ~ invres4 的输出通道数
+    - invres_hidden: invres0 ~ invres4 的扩展通道数（None 表示 inp * 6）
+
+    剪枝工具（tools/prune_model.py）输出的就是这种格式的配置。
+    """
+    return {
+        'backbone_hidden': None,
+        'dconv': [128, 96, 32, 24, 16, 8],
+        'invres': [96, 96, 32, 24, 16],
+        'invres_hidden': None,
+    }
+
+
 class MobileNetV2Unet(nn.Module):
     """✅ 完全修正的 MobileNetV2 U-Net（对齐 NCNN + 参考老版本）"""
-    def __init__(self, channel_scale_factor=2, use_groupnorm=False, **kwargs):
+    def __init__(self, channel_scale_factor=2, use_groupnorm=False, config=None, **kwargs):
         super(MobileNetV2Unet, self).__init__()
 
         self.channel_scale_factor = channel_scale_factor
         self.use_groupnorm = use_groupnorm
 
+        # 通道配置：默认为完整宽度，剪枝后的模型传入更窄的配置
+        cfg = default_unet_config()
+        cfg.update(config or {})
+        dconv, invres = cfg['dconv'], cfg['invres']
+        invres_hidden = cfg['invres_hidden'] or [None] * 5
+
         # 图像编码器 - 保持原结构但调整第一层
-        self.backbone = MobileNetV2(use_groupnorm=use_groupnorm)
+        self.backbone = MobileNetV2(use_groupnorm=use_groupnorm,
+                                    hidden_dims=cfg['backbone_hidden'])
         # 删除不使用的 classifier，避免 DDP 中的未使用参数问题
         if hasattr(self.backbone, 'classifier'):
             del self.backbone.classifier
@@ -337,72 +392,87 @@ class MobileNetV2Unet(nn.Module):
         # 音频编码器
         self.audio_encoder = AudioEncoder(use_groupnorm=use_groupnorm)
 
-        # 解码器 - 参考老版本的结构
-        self.dconv0 = nn.ConvTranspose2d(128, 128, kernel_size=1, stride=1, padding=0)
-        self.invres0 = InvertedResidual(448, 96, 1, 6, use_groupnorm=use_groupnorm)
+        # 解码器 - 参考老版本的结构（完整宽度时依次为
+        # 128→[448→96], 96→[192→96], 32→[64→32], 24→[48→24], 16→[32→16], 8）
+        self.dconv0 = nn.ConvTranspose2d(128, dconv[0], kernel_size=1, stride=1, padding=0)
+        self.invres0 = InvertedResidual(SKIP_CHANNELS[0] + dconv[0], invres[0], 1, 6,
+                                        use_groupnorm=use_groupnorm, hidden_dim=invres_hidden[0])
 
-        self.dconv1 = nn.ConvTranspose2d(96, 96, 3, padding=1, stride=2, output_padding=1)
-        self.invres1 = InvertedResidual(192, 96, 1, 6, use_groupnorm=use_groupnorm)
+        self.dconv1 = nn.ConvTranspose2d(invres[0], dconv[1], 3, padding=1, stride=2, output_padding=1)
+        self.invres1 = InvertedResidual(SKIP_CHANNELS[1] + dconv[1], invres[1], 1, 6,
+                                        use_groupnorm=use_groupnorm, hidden_dim=invres_hidden[1])
 
-        self.dconv2 = nn.ConvTranspose2d(96, 32, 3, padding=1, stride=2, output_padding=1)
-        self.invres2 = InvertedResidual(64, 32, 1, 6, use_groupnorm=use_groupnorm)
+        self.dconv2 = nn.ConvTranspose2d(invres[1], dconv[2], 3, padding=1, stride=2, output_padding=1)
+        self.invres2 = InvertedResidual(SKIP_CHANNELS[2] + dconv[2], invres[2], 1, 6,
+                                        use_groupnorm=use_groupnorm, hidden_dim=invres_hidden[2])
 
-        self.dconv3 = nn.ConvTranspose2d(32, 24, 3, padding=1, stride=2, output_padding=1)
-        self.invres3 = InvertedResidual(48, 24, 1, 6, use_groupnorm=use_groupnorm)
+        self.dconv3 = nn.ConvTranspose2d(invres[2], dconv[3], 3, padding=1, stride=2, output_padding=1)
+        self.invres3 = InvertedResidual(SKIP_CHANNELS[3] + dconv[3], invres[3], 1, 6,
+                                        use_groupnorm=use_groupnorm, hidden_dim=invres_hidden[3])
 
-        self.dconv4 = nn.ConvTranspose2d(24, 16, 3, padding=1, stride=2, output_padding=1)
-        self.invres4 = InvertedResidual(32, 16, 1, 6, use_groupnorm=use_groupnorm)
+        self.dconv4 = nn.ConvTranspose2d(invres[3], dconv[4], 3, padding=1, stride=2, output_padding=1)
+        self.invres4 = InvertedResidual(SKIP_CHANNELS[4] + dconv[4], invres[4], 1, 6,
+                                        use_groupnorm=use_groupnorm, hidden_dim=invres_hidden[4])
 
-        self.dconv5 = nn.ConvTranspose2d(16, 8, 3, padding=1, stride=2, output_padding=1)
+        self.dconv5 = nn.ConvTranspose2d(invres[4], dconv[5], 3, padding=1, stride=2, output_padding=1)
 
         # ✅ 修正：输出层使用 TanH（老版本用的是 sigmoid，需要改）
-        self.conv_last = nn.Conv2d(8, 3, 1)
+        self.conv_last = nn.Conv2d(dconv[5], 3, 1)
         self.conv_score = nn.Conv2d(3, 3, 1)
 
+        # 记录实际使用的通道配置（可直接序列化为 JSON）
+        self.config = {
+            'backbone_hidden': list(self.backbone.hidden_dims),
+            'dconv': list(dconv),
+            'invres': list(invres),
+            'invres_hidden': [getattr(self, f'invres{i}').hidden_dim for i in range(5)],
+        }
+
     def forward(self, x, audio):
-        # 音频编码 - audio: [B, 256, 20] -> [B, 1, 256, 20]
-        if audio.dim() == 3:
-            audio = audio.unsqueeze(1)
-        audio_embedding = self.audio_encoder(audio)  # [B, 128, 5, 5]
+        # 输入人脸 x: [B, 6, S, S]，S 为工作分辨率（160 或 128，需为 32 的倍数）
+        # 音频 audio: [B, 256, 20]（形状转换在 AudioEncoder 内完成）
 
         # ✅ 图像编码器：提取多尺度特征
-        # 根据实际输出，正确的跳跃连接位置：
-        # Layer 7:  [1, 16, 80, 80]  → x1
-        # Layer 9:  [1, 24, 40, 40]  → x2
-        # Layer 12: [1, 32, 20, 20]  → x3
-        # Layer 17: [1, 96, 10, 10]  → x4
-        # Layer 24: [1, 320, 5, 5]   → x5
+        # 根据实际输出，正确的跳跃连接位置（括号内为 S=160 时的尺寸）：
+        # Layer 7:  [B, 16, S/2, S/2]    → x1 (80)
+        # Layer 9:  [B, 24, S/4, S/4]    → x2 (40)
+        # Layer 12: [B, 32, S/8, S/8]    → x3 (20)
+        # Layer 17: [B, 96, S/16, S/16]  → x4 (10)
+        # Layer 24: [B, 320, S/32, S/32] → x5 (5)
         
         for i, layer in enumerate(self.backbone.features):
             x = layer(x)
             if i == 7:
-                x1 = x  # [1, 16, 80, 80]
+                x1 = x  # [B, 16, S/2, S/2]
             elif i == 9:
-                x2 = x  # [1, 24, 40, 40]
+                x2 = x  # [B, 24, S/4, S/4]
             elif i == 12:
-                x3 = x  # [1, 32, 20, 20]
+                x3 = x  # [B, 32, S/8, S/8]
             elif i == 17:
-                x4 = x  # [1, 96, 10, 10]
+                x4 = x  # [B, 96, S/16, S/16]
         
-        x5 = x  # [1, 320, 5, 5]
+        x5 = x  # [B, 320, S/32, S/32]
+
+        # 音频编码，池化到与 x5 相同的空间尺寸
+        audio_embedding = self.audio_encoder(audio, x5.shape[2:])  # [B, 128, S/32, S/32]
 
-        # ✅ 解码器：上采样 + 跳跃连接
-        # 解码器层 0: [320, 5, 5] + [128, 5, 5] → [448, 5, 5] → [96, 5, 5]
+        # ✅ 解码器：上采样 + 跳跃连接（以 S/32 = s 记）
+        # 解码器层 0: [320, s, s] + [128, s, s] → [448, s, s] → [96, s, s]
         x = self.invres0(torch.cat([x5, self.dconv0(audio_embedding)], dim=1))
         
-        # 解码器层 1: [96, 5, 5] → [96, 10, 10] concat [96, 10, 10] → [192, 10, 10] → [96, 10, 10]
+        # 解码器层 1: [96, s, s] → [96, 2s, 2s] concat [96, 2s, 2s] → [192, 2s, 2s] → [96, 2s, 2s]
         x = self.invres1(torch.cat([x4, self.dconv1(x)], dim=1))
         
-        # 解码器层 2: [96, 10, 10] → [32, 20, 20] concat [32, 20, 20] → [64, 20, 20] → [32, 20, 20]
+        # 解码器层 2: [96, 2s, 2s] → [32, 4s, 4s] concat [32, 4s, 4s] → [64, 4s, 4s] → [32, 4s, 4s]
         x = self.invres2(torch.cat([x3, self.dconv2(x)], dim=1))
         
-        # 解码器层 3: [32, 20, 20] → [24, 40, 40] concat [24, 40, 40] → [48, 40, 40] → [24, 40, 40]
+        # 解码器层 3: [32, 4s, 4s] → [24, 8s, 8s] concat [24, 8s, 8s] → [48, 8s, 8s] → [24, 8s, 8s]
         x = self.invres3(torch.cat([x2, self.dconv3(x)], dim=1))
         
-        # 解码器层 4: [24, 40, 40] → [16, 80, 80] concat [16, 80, 80] → [32, 80, 80] → [16, 80, 80]
+        # 解码器层 4: [24, 8s, 8s] → [16, 16s, 16s] concat [16, 16s, 16s] → [32, 16s, 16s] → [16, 16s, 16s]
         x = self.invres4(torch.cat([x1, self.dconv4(x)], dim=1))
         
-        # 最终输出: [16, 80, 80] → [8, 160, 160] → [3, 160, 160]
+        # 最终输出: [16, S/2, S/2] → [8, S, S] → [3, S, S]
         x = self.dconv5(x)
         x = self.conv_last(x)
         x = self.conv_score(x)
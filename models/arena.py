@@ -0,0 +1,333 @@
+"""
+MobileNetV2Unet 静态缓冲推理模式
+
+按 (batch, 分辨率) 预分配所有激活缓冲，稳态下每帧不再新建张量：
+- BN 折叠进卷积，ReLU / 残差相加 / tanh 均原地完成
+- 编码器跳跃连接输出直接写入解码器拼接缓冲的前半段通道，
+  dconvN 的上采样结果写入后半段，省掉 torch.cat
+- 1x1 卷积（占大部分计算）用 matmul(out=) 写入目标缓冲，不产生临时张量
+- 3x3 / 深度卷积 / 反卷积：CPU 上的内核总会自己申请结果张量，这是剩下的唯一分配来源
+  （count_allocations() 可以看到）；CUDA 上全部写入缓冲，整段前向被捕获为
+  CUDA Graph，重放时零分配
+
+缓冲在某个形状第一次出现时创建（或用 reserve() 提前创建），
+返回的输出张量属于缓冲区，下一帧会被覆盖，需要保留时请先拷贝。
+
+用法:
+    from arena import ArenaUnet
+    runner = ArenaUnet(model)          # model 为 eval 模式、BatchNorm 版本的 MobileNetV2Unet
+    output = runner(face, audio)
+"""
+from collections import namedtuple, Counter
+
+import torch
+import torch.nn as nn
+
+from MobileNet_Fixed import audio_to_nchw, SKIP_CHANNELS
+
+
+# 折叠后的卷积：weight 为 2 维时表示逐点卷积（[out, in]），走 matmul
+ConvSpec = namedtuple('ConvSpec', ['weight', 'bias', 'stride', 'padding', 'groups',
+                                   'transposed', 'output_padding', 'relu'])
+
+# 编码器 features 下标 → 写入的拼接缓冲编号（x1 → cat4, ..., x5 → cat0）
+SKIP_LAYERS = {7: 4, 9: 3, 12: 2, 17: 1, 24: 0}
+
+# ATen 中真正申请存储的算子，其余 empty_like / zeros 等都会落到它们上
+ALLOC_OPS = ('aten::empty', 'aten::empty_strided')
+
+
+def _fold(conv, norm=None, relu=False):
+    """把卷积（及其后的 BatchNorm）折叠成 ConvSpec"""
+    if norm is not None and not isinstance(norm, nn.BatchNorm2d):
+        raise TypeError(f"静态缓冲模式只支持 BatchNorm，不支持 {type(norm).__name__}")
+
+    transposed = isinstance(conv, nn.ConvTranspose2d)
+    weight = conv.weight.detach().clone()
+    out_channels = conv.out_channels
+    bias = (conv.bias.detach().clone() if conv.bias is not None
+            else weight.new_zeros(out_channels))
+    if norm is not None:
+        scale = norm.weight.detach() / torch.sqrt(norm.running_var + norm.eps)
+        weight = weight * scale.view(-1, 1, 1, 1)
+        bias = (bias - norm.running_mean) * scale + norm.bias.detach()
+
+    pointwise = (conv.kernel_size == (1, 1) and conv.stride == (1, 1)
+                 and conv.padding == (0, 0) and conv.groups == 1)
+    if pointwise:
+        # ConvTranspose2d 的权重为 [in, out, 1, 1]
+        weight = weight[:, :, 0, 0]
+        weight = weight.t().contiguous() if transposed else weight
+    return ConvSpec(nn.Parameter(weight, requires_grad=False),
+                    nn.Parameter(bias, requires_grad=False),
+                    list(conv.stride), list(conv.padding), conv.groups, transposed,
+                    list(getattr(conv, 'output_padding', (0, 0))), relu)
+
+
+def _fold_sequential(seq):
+    """(Conv, Norm, ReLU) 三元组组成的 Sequential → ConvSpec 列表"""
+    layers = list(seq)
+    return [_fold(layers[i], layers[i + 1], relu=True) for i in range(0, len(layers), 3)]
+
+
+def _out_shape(spec, x):
+    batch, _, h, w = x.shape
+    if spec.weight.dim() == 2:
+        return batch, spec.weight.shape[0], h, w
+    k = spec.weight.shape[2]
+    if spec.transposed:
+        h = (h - 1) * spec.stride[0] - 2 * spec.padding[0] + k + spec.output_padding[0]
+        w = (w - 1) * spec.stride[1] - 2 * spec.padding[1] + k + spec.output_padding[1]
+        return batch, spec.weight.shape[1] * spec.groups, h, w
+    h = (h + 2 * spec.padding[0] - k) // spec.stride[0] + 1
+    w = (w + 2 * spec.padding[1] - k) // spec.stride[1] + 1
+    return batch, spec.weight.shape[0], h, w
+
+
+class _Arena:
+    """某个 (batch, 高, 宽) 下的全部激活缓冲，以及可选的 CUDA Graph"""
+
+    def __init__(self):
+        self.buffers = {}
+        self.graph = None
+
+    def get(self, name, shape, like):
+        buf = self.buffers.get(name)
+        if buf is None:
+            buf = self.buffers[name] = like.new_empty(shape)
+        return buf
+
+    def nbytes(self):
+        return sum(b.numel() * b.element_size() for b in self.buffers.values())
+
+
+class ArenaUnet(nn.Module):
+    """
+    预分配激活缓冲的 MobileNetV2Unet 推理封装
+
+    Args:
+        model: eval 模式的 MobileNetV2Unet（BatchNorm 版本，可为剪枝后的配置）
+        cuda_graph: 在 CUDA 上是否把前向捕获为 CUDA Graph（默认 True）
+    """
+
+    def __init__(self, model, cuda_graph=True):
+        super().__init__()
+        if model.use_groupnorm:
+            raise TypeError("静态缓冲模式只支持 BatchNorm 版本的模型")
+        self.cuda_graph = cuda_graph
+        self._arenas = {}
+
+        features = list(model.backbone.features)
+        # features 0~3: ZeroPad(1) + Conv(p=0) 等价于 Conv(p=1)
+        stem = _fold(features[1], features[2], relu=True)
+        stem = stem._replace(padding=[1, 1])
+        self.encoder = [(0, [stem, _fold(features[4], features[5], relu=True)], False)]
+        for i in range(7, len(features)):
+            layer = features[i]
+            if hasattr(layer, 'use_res_connect'):
+                self.encoder.append((i, _fold_sequential(layer.conv), layer.use_res_connect))
+            else:
+                self.encoder.append((i, _fold_sequential(layer), False))
+
+        audio = model.audio_encoder
+        self.audio = {
+            'conv1': _fold(audio.conv1[0], audio.conv1[1], relu=True),
+            'conv2': _fold(audio.conv2[0], audio.conv2[1], relu=True),
+            'conv3': _fold(audio.conv3, audio.bn3),
+            'conv4': _fold(audio.conv4[0], audio.conv4[1], relu=True),
+            'conv5': _fold(audio.conv5[0], audio.conv5[1], relu=True),
+            'conv6': _fold(audio.conv6[0], audio.conv6[1], relu=True),
+            'conv7': _fold(audio.conv7[0], audio.conv7[1], relu=True),
+            'conv8': _fold(audio.conv8, audio.bn8),
+        }
+
+        self.dconv = [_fold(getattr(model, f'dconv{k}')) for k in range(6)]
+        self.invres = [_fold_sequential(getattr(model, f'invres{k}').conv) for k in range(5)]
+        self.conv_last = _fold(model.conv_last)
+        self.conv_score = _fold(model.conv_score)
+
+        # 注册为参数，使 .to() / model_dtype() 等对折叠后的权重生效
+        self.weights = nn.ParameterList()
+        for spec in self._specs():
+            self.weights.append(spec.weight)
+            self.weights.append(spec.bias)
+
+    def _specs(self):
+        for _, specs, _ in self.encoder:
+            yield from specs
+        yield from self.audio.values()
+        yield from self.dconv
+        for specs in self.invres:
+            yield from specs
+        yield self.conv_last
+        yield self.conv_score
+
+    def _apply(self, fn, *args, **kwargs):
+        # 设备或精度变化后旧缓冲失效
+        self._arenas = {}
+        return super()._apply(fn, *args, **kwargs)
+
+    @staticmethod
+    def _conv(spec, x, out):
+        """执行一层卷积；空间卷积的 out 为 None 时直接使用内核申请的结果"""
+        if spec.weight.dim() == 2:
+            torch.matmul(spec.weight, x.flatten(2), out=out.flatten(2))
+            out.add_(spec.bias.view(-1, 1, 1))
+        elif out is not None:
+            torch.ops.aten.convolution.out(x, spec.weight, spec.bias, spec.stride, spec.padding,
+                                           [1, 1], spec.transposed, spec.output_padding,
+                                           spec.groups, out=out)
+        else:
+            out = torch.convolution(x, spec.weight, spec.bias, spec.stride, spec.padding,
+                                    [1, 1], spec.transposed, spec.output_padding, spec.groups)
+        if spec.relu:
+            out.relu_()
+        return out
+
+    def _block(self, arena, name, specs, residual, x, out=None):
+        """
+        依次执行 specs，最后一层写入 out（默认为名为 name 的缓冲）
+
+        CPU 上空间卷积（3x3 / 深度卷积 / 反卷积）的内核总会自己申请结果张量，
+        中间层直接使用该结果，省掉一次拷贝；CUDA 上全部写入缓冲以便捕获 CUDA Graph。
+        """
+        identity = x
+        for i, spec in enumerate(specs):
+            last = i == len(specs) - 1
+            if last and out is not None:
+                dst = out
+            elif spec.weight.dim() == 2 or x.is_cuda:
+                dst = arena.get(name if last else f'{name}.{i}', _out_shape(spec, x), x)
+            else:
+                dst = None
+            x = self._conv(spec, x, dst)
+        if residual:
+            x.add_(identity)
+        return x
+
+    def _cat(self, arena, k, skip):
+        """第 k 级解码器的拼接缓冲 [B, skip + dconvK, h, w]"""
+        batch, _, h, w = skip
+        spec = self.dconv[k]
+        up = spec.weight.shape[0] if spec.weight.dim() == 2 else spec.weight.shape[1] * spec.groups
+        return arena.get(f'cat{k}', (batch, SKIP_CHANNELS[k] + up, h, w), arena.buffers['face'])
+
+    def _compute(self, arena):
+        """arena['face'] / arena['audio'] → arena['output']，全部写入预分配缓冲"""
+        face = arena.buffers['face']
+
+        # 编码器：跳跃连接直接写入拼接缓冲的前半段
+        x = face
+        for index, specs, residual in self.encoder:
+            out = None
+            if index in SKIP_LAYERS:
+                k = SKIP_LAYERS[index]
+                shape = _out_shape(specs[-1], x)
+                out = self._cat(arena, k, shape)[:, :SKIP_CHANNELS[k]]
+            x = self._block(arena, f'features.{index}', specs, residual, x, out)
+        x5 = x
+
+        # 音频编码器
+        a = arena.buffers['audio']
+        a = self._block(arena, 'audio.conv1', [self.audio['conv1']], False, a)
+        a = self._block(arena, 'audio.conv2', [self.audio['conv2']], False, a)
+        a = self._block(arena, 'audio.conv3', [self.audio['conv3']], True, a).relu_()
+        for name in ('conv4', 'conv5', 'conv6', 'conv7'):
+            a = self._block(arena, f'audio.{name}', [self.audio[name]], False, a)
+        a = self._block(arena, 'audio.conv8', [self.audio['conv8']], True, a).relu_()
+        batch, channels, h5, w5 = x5.shape
+        pooled = arena.get('audio.pool', (batch, a.shape[1], h5, w5), a)
+        torch.ops.aten.adaptive_avg_pool2d.out(a, [h5, w5], out=pooled)
+
+        # 解码器：dconvN 的输出写入拼接缓冲的后半段
+        cat = arena.buffers['cat0']
+        self._block(arena, 'dconv0', [self.dconv[0]], False, pooled, cat[:, SKIP_CHANNELS[0]:])
+        for k in range(5):
+            x = self._block(arena, f'invres{k}', self.invres[k], False, cat)
+            if k < 4:
+                cat = arena.buffers[f'cat{k + 1}']
+                self._block(arena, f'dconv{k + 1}', [self.dconv[k + 1]], False, x,
+                            cat[:, SKIP_CHANNELS[k + 1]:])
+            else:
+                x = self._block(arena, 'dconv5', [self.dconv[5]], False, x)
+        x = self._block(arena, 'conv_last', [self.conv_last], False, x)
+        x = self._block(arena, 'output', [self.conv_score], False, x)
+        return x.tanh_()
+
+    def _arena(self, batch, height, width):
+        key = (batch, height, width)
+        arena = self._arenas.get(key)
+        if arena is None:
+            arena = self._arenas[key] = _Arena()
+            like = self.weights[0]
+            arena.get('face', (batch, 6, height, width), like)
+            arena.get('audio', (batch, 1, 20, 256), like)
+        return arena
+
+    @torch.no_grad()
+    def reserve(self, batch=1, resolution=160):
+        """提前为指定 (batch, 分辨率) 创建全部缓冲（及 CUDA Graph）"""
+        like = self.weights[0]
+        self(like.new_zeros(batch, 6, resolution, resolution), like.new_zeros(batch, 256, 20))
+        return self._arenas[(batch, resolution, resolution)].nbytes()
+
+    @torch.no_grad()
+    def forward(self, face, audio):
+        """
+        Args:
+            face: [B, 6, H, W]
+            audio: [B, 256, 20] 或 [B, 1, 256, 20]
+
+        Returns:
+            [B, 3, H, W]，范围 [-1, 1]；属于内部缓冲，下一次调用会被覆盖
+        """
+        batch, _, height, width = face.shape
+        arena = self._arena(batch, height, width)
+        arena.buffers['face'].copy_(face)
+        arena.buffers['audio'].copy_(audio_to_nchw(audio))
+
+        if arena.graph is not None:
+            arena.graph.replay()
+            return arena.buffers['output']
+
+        output = self._compute(arena)
+        if self.cuda_graph and output.is_cuda:
+            # 缓冲已全部创建，捕获后每帧只需拷入输入并重放
+            stream = torch.cuda.Stream()
+            stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(stream):
+                for _ in range(2):
+                    self._compute(arena)
+            torch.cuda.current_stream().wait_stream(stream)
+            arena.graph = torch.cuda.CUDAGraph()
+            with torch.cuda.graph(arena.graph):
+                self._compute(arena)
+            arena.graph.replay()
+        return output
+
+
+def count_allocations(fn, top_level=True):
+    """
+    统计 fn() 执行期间 ATen 层的存储申请次数
+
+    Args:
+        fn: 无参可调用对象
+        top_level: True 时按触发申请的顶层算子归类，否则按直接调用者归类
+
+    Returns:
+        Counter: 算子名 → 申请次数
+    """
+    from torch.profiler import profile, ProfilerActivity
+
+    with profile(activities=[ProfilerActivity.CPU]) as prof:
+        fn()
+
+    counts = Counter()
+    for event in prof.events():
+        if event.name not in ALLOC_OPS:
+            continue
+        owner = event.cpu_parent
+        while top_level and owner is not None and owner.cpu_parent is not None:
+            owner = owner.cpu_parent
+        counts[owner.name if owner is not None else event.name] += 1
+    return counts
@@ -0,0 +1,431 @@
+"""
+NCNN 权重加载器
+
+解析解密后的 dh_model.param（文本格式）并内存映射 dh_model.bin，
+将每个权重 blob 以零拷贝张量视图的形式挂到 MobileNetV2Unet 对应的参数上。
+
+加载只需一次 mmap 加上一次按 .param 顺序的指针遍历，不会整体读取 .bin。
+张量直接引用映射页（copy-on-write），多个进程加载同一文件时共享页缓存。
+
+对齐方式：
+- 两侧分别按“音频分支 / 人脸分支 / 融合后的解码器”划分（NCNN 侧根据 blob
+  对 Input 层的依赖，PyTorch 侧根据 FX 图对输入的依赖），分支内按拓扑顺序一一对应
+- NCNN 中已融合进卷积的 BatchNorm 在 PyTorch 侧置为恒等变换，卷积 bias 移入 BN
+- 形状不一致的 blob 不会被赋值，并在报告中列出
+
+用法:
+    python ncnn_weights.py <dh_model.param> <dh_model.bin> [--groupnorm]
+"""
+import sys
+import mmap
+import struct
+from collections import namedtuple
+
+import torch
+import torch.fx
+import torch.nn as nn
+
+
+# .param 中的一层：类型、名称、输入/输出 blob 名、参数字典 {id: 值}
+NcnnLayer = namedtuple('NcnnLayer', ['type', 'name', 'inputs', 'outputs', 'params'])
+
+# .bin 中的一个权重 blob：所属层、角色、字节偏移、元素个数、存储类型
+NcnnBlob = namedtuple('NcnnBlob', ['layer', 'role', 'offset', 'count', 'dtype'])
+
+PARAM_MAGIC = 7767517
+
+# 带 flag 头的权重存储类型（ncnn ModelBinFromDataReader::load type=0）
+TAG_FP16 = 0x01306B47
+TAG_INT8 = 0x000D4B38
+TAG_FP32_EXTRA = 0x0002C056
+
+CONV_TYPES = ('Convolution', 'ConvolutionDepthWise', 'Deconvolution', 'DeconvolutionDepthWise')
+NORM_TYPES = ('BatchNorm', 'GroupNorm', 'InstanceNorm')
+
+
+def _parse_value(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def parse_ncnn_param(param_path):
+    """
+    解析 NCNN .param 文本文件
+
+    Args:
+        param_path: 解密后的 .param 文件路径
+
+    Returns:
+        list of NcnnLayer，按文件中的（拓扑）顺序
+    """
+    with open(param_path, 'r') as f:
+        lines = [line.split() for line in f if line.strip()]
+
+    if int(lines[0][0]) != PARAM_MAGIC:
+        raise ValueError(f"不是 NCNN param 文件，魔数: {lines[0][0]}")
+    layer_count = int(lines[1][0])
+
+    layers = []
+    for tokens in lines[2:2 + layer_count]:
+        layer_type, name = tokens[0], tokens[1]
+        n_in, n_out = int(tokens[2]), int(tokens[3])
+        inputs = tokens[4:4 + n_in]
+        outputs = tokens[4 + n_in:4 + n_in + n_out]
+
+        params = {}
+        for item in tokens[4 + n_in + n_out:]:
+            key, value = item.split('=', 1)
+            key = int(key)
+            if key <= -23300:
+                # 数组参数: -233xx=n,v1,v2,...
+                values = value.split(',')
+                params[-key - 23300] = [_parse_value(v) for v in values[1:]]
+            else:
+                params[key] = _parse_value(value)
+
+        layers.append(NcnnLayer(layer_type, name, inputs, outputs, params))
+    return layers
+
+
+def _layer_blobs(layer):
+    """
+    按 ncnn 各层 load_model() 的读取顺序，返回 [(角色, 元素个数, 是否带 flag 头)]
+    """
+    p = layer.params
+    t = layer.type
+    if t in CONV_TYPES or t == 'InnerProduct':
+        if p.get(8, 0):
+            raise ValueError(f"{layer.name}: 不支持 int8 量化权重")
+        blobs = [('weight', p.get(6, 0), True)]
+        if p.get(5, 0):
+            blobs.append(('bias', p[0], False))
+        return blobs
+    if t == 'BatchNorm':
+        c = p[0]
+        return [('slope', c, False), ('mean', c, False), ('var', c, False), ('bias', c, False)]
+    if t == 'GroupNorm':
+        return [('gamma', p[1], False), ('beta', p[1], False)] if p.get(3, 1) else []
+    if t == 'InstanceNorm':
+        return [('gamma', p[0], False), ('beta', p[0], False)] if p.get(2, 1) else []
+    if t == 'Scale':
+        if p.get(0, 0) == -233:
+            return []
+        blobs = [('scale', p[0], False)]
+        if p.get(1, 0):
+            blobs.append(('bias', p[0], False))
+        return blobs
+    if t == 'PReLU':
+        return [('slope', p.get(0, 0), False)]
+    if t == 'MemoryData':
+        count = max(p.get(0, 0), 1) * max(p.get(1, 0), 1) * max(p.get(11, 0), 1) * max(p.get(2, 0), 1)
+        return [('data', count, False)]
+    return []
+
+
+class NcnnWeights:
+    """
+    内存映射的 NCNN .bin 权重
+
+    构造时只做 mmap 和指针遍历（每个带 flag 的 blob 读 4 字节头），
+    不读取权重内容；view() 返回直接引用映射页的张量。
+    """
+
+    def __init__(self, bin_path, layers):
+        self.bin_path = bin_path
+        with open(bin_path, 'rb') as f:
+            # ACCESS_COPY：可写的私有映射，张量可原地修改而不会写回文件
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        self.blobs = {}
+        offset = 0
+        for layer in layers:
+            blobs = []
+            for role, count, tagged in _layer_blobs(layer):
+                dtype = 'float32'
+                if tagged:
+                    tag = struct.unpack_from('<I', self._mm, offset)[0]
+                    offset += 4
+                    if tag == TAG_FP16:
+                        dtype = 'float16'
+                    elif tag == TAG_INT8:
+                        dtype = 'int8'
+                    elif tag != TAG_FP32_EXTRA and sum(self._mm[offset - 4:offset]) != 0:
+                        dtype = 'quantized'
+                        offset += 256 * 4  # 量化查找表
+                blobs.append(NcnnBlob(layer.name, role, offset, count, dtype))
+                itemsize = {'float32': 4, 'float16': 2}.get(dtype, 1)
+                offset += (count * itemsize + 3) // 4 * 4
+            if blobs:
+                self.blobs[layer.name] = blobs
+
+        if offset > len(self._mm):
+            raise ValueError(f".bin 大小 {len(self._mm)} 小于 .param 描述的权重大小 {offset}")
+        self.size = offset
+
+    def view(self, blob):
+        """
+        返回 blob 的一维 float32 张量
+
+        float32 为零拷贝视图；float16 需转换（会复制）；其余类型不支持。
+        """
+        if blob.dtype == 'float32':
+            return torch.frombuffer(self._mm, dtype=torch.float32,
+                                    count=blob.count, offset=blob.offset)
+        if blob.dtype == 'float16':
+            return torch.frombuffer(self._mm, dtype=torch.float16,
+                                    count=blob.count, offset=blob.offset).float()
+        raise ValueError(f"{blob.layer}.{blob.role}: 不支持的存储类型 {blob.dtype}")
+
+
+def _ncnn_branches(layers, audio_input='audio', face_input='face'):
+    """根据 blob 对 Input 层的依赖，给每层标注分支：audio / face / fused"""
+    deps = {}
+    tags = {}
+    for layer in layers:
+        if layer.type == 'Input':
+            src = {layer.name}
+        else:
+            src = set()
+            for blob in layer.inputs:
+                src |= deps.get(blob, set())
+        for blob in layer.outputs:
+            deps[blob] = src
+        tags[layer.name] = _branch_tag(audio_input in src, face_input in src)
+    return tags
+
+
+def _branch_tag(has_audio, has_face):
+    if has_audio and has_face:
+        return 'fused'
+    return 'audio' if has_audio else 'face'
+
+
+WEIGHTED_MODULES = (nn.Conv2d, nn.ConvTranspose2d, nn.BatchNorm2d, nn.GroupNorm)
+
+
+def _torch_slots(model):
+    """FX 追踪模型，按拓扑顺序返回 {分支: [(模块名, 模块)]}"""
+    traced = torch.fx.symbolic_trace(model)
+    placeholders = [n.name for n in traced.graph.nodes if n.op == 'placeholder']
+    face_name, audio_name = placeholders[0], placeholders[1]
+
+    deps = {}
+    slots = {'audio': [], 'face': [], 'fused': []}
+    for node in traced.graph.nodes:
+        if node.op == 'placeholder':
+            deps[node] = {node.name}
+            continue
+        src = set()
+        for inp in node.all_input_nodes:
+            src |= deps[inp]
+        deps[node] = src
+        if node.op == 'call_module':
+            module = model.get_submodule(node.target)
+            if isinstance(module, WEIGHTED_MODULES):
+                tag = _branch_tag(audio_name in src, face_name in src)
+                slots[tag].append((node.target, module))
+    return slots
+
+
+def _ncnn_weight_shape(layer, count):
+    """由层参数推出 NCNN 卷积权重形状 (out, in/group, kh, kw)"""
+    p = layer.params
+    out = p[0]
+    kw = p.get(1, 0)
+    kh = p.get(11, kw)
+    return (out, count // max(out * kh * kw, 1), kh, kw)
+
+
+class _Mapper:
+    """把 NCNN blob 视图赋给 PyTorch 参数，并记录报告"""
+
+    def __init__(self, weights):
+        self.weights = weights
+        self.report = {'matched': [], 'mismatched': [], 'folded': [], 'converted': [],
+                       'unmatched_ncnn': [], 'unmatched_torch': []}
+
+    def view(self, blob):
+        if blob.dtype != 'float32':
+            self.report['converted'].append(f"{blob.layer}.{blob.role} ({blob.dtype})")
+        return self.weights.view(blob)
+
+    def assign(self, module, module_name, attr, tensor, src):
+        target = getattr(module, attr)
+        if target is None or tuple(tensor.shape) != tuple(target.shape):
+            expected = None if target is None else tuple(target.shape)
+            self.report['mismatched'].append(
+                f"{src} {tuple(tensor.shape)} -> {module_name}.{attr} {expected}")
+            return False
+        if attr in module._parameters:
+            module._parameters[attr] = nn.Parameter(tensor, requires_grad=False)
+        else:
+            module._buffers[attr] = tensor
+        self.report['matched'].append(f"{src} -> {module_name}.{attr}")
+        return True
+
+    def map_conv(self, layer, module_name, module):
+        blobs = {b.role: b for b in self.weights.blobs[layer.name]}
+        weight = self.view(blobs['weight'])
+        shape = _ncnn_weight_shape(layer, weight.numel())
+        if weight.numel() != shape[0] * shape[1] * shape[2] * shape[3]:
+            self.report['mismatched'].append(f"{layer.name}.weight: 无法从参数推出形状")
+            return None
+        weight = weight.view(shape)
+        if isinstance(module, nn.ConvTranspose2d):
+            # NCNN Deconvolution 存储为 (out, in, kh, kw)，PyTorch 为 (in, out, kh, kw)
+            weight = weight.transpose(0, 1)
+        self.assign(module, module_name, 'weight', weight, f"{layer.name}.weight")
+
+        if 'bias' not in blobs:
+            return None
+        bias = self.view(blobs['bias'])
+        if module.bias is None:
+            # 原模型把归一化融合进了卷积，bias 交给后面的 BN
+            return bias
+        self.assign(module, module_name, 'bias', bias, f"{layer.name}.bias")
+        return None
+
+    def map_norm(self, layer, module_name, module):
+        blobs = {b.role: b for b in self.weights.blobs.get(layer.name, [])}
+        if layer.type == 'BatchNorm' and isinstance(module, nn.BatchNorm2d):
+            module.eps = layer.params.get(1, module.eps)
+            pairs = [('slope', 'weight'), ('mean', 'running_mean'),
+                     ('var', 'running_var'), ('bias', 'bias')]
+        elif layer.type in ('GroupNorm', 'InstanceNorm') and isinstance(module, nn.GroupNorm):
+            module.eps = layer.params.get(2 if layer.type == 'GroupNorm' else 1, module.eps)
+            pairs = [('gamma', 'weight'), ('beta', 'bias')]
+        else:
+            self.report['mismatched'].append(
+                f"{layer.name} ({layer.type}) -> {module_name} ({type(module).__name__})")
+            return
+        for role, attr in pairs:
+            if role in blobs:
+                self.assign(module, module_name, attr, self.view(blobs[role]), f"{layer.name}.{role}")
+
+    def fold_bn(self, module_name, module, pending_bias):
+        """NCNN 侧没有对应的 BN：置为恒等变换，并承接卷积 bias"""
+        with torch.no_grad():
+            module.weight.fill_(1)
+            module.bias.zero_()
+            module.running_mean.zero_()
+            module.running_var.fill_(1 - module.eps)
+        if pending_bias is not None:
+            self.assign(module, module_name, 'bias', pending_bias, f"{module_name} <- conv bias")
+        self.report['folded'].append(module_name)
+
+    def map_branch(self, ncnn_layers, torch_slots):
+        i = j = 0
+        pending_bias = None
+        while i < len(ncnn_layers) and j < len(torch_slots):
+            layer = ncnn_layers[i]
+            module_name, module = torch_slots[j]
+            is_torch_conv = isinstance(module, (nn.Conv2d, nn.ConvTranspose2d))
+
+            if layer.type in CONV_TYPES and is_torch_conv:
+                if pending_bias is not None:
+                    self.report['mismatched'].append(f"{module_name}: 前一层卷积 bias 无处放置")
+                pending_bias = self.map_conv(layer, module_name, module)
+                i += 1
+                j += 1
+            elif layer.type in NORM_TYPES and not is_torch_conv:
+                if pending_bias is not None:
+                    self.report['mismatched'].append(f"{layer.name}: 前一层卷积 bias 无处放置")
+                    pending_bias = None
+                self.map_norm(layer, module_name, module)
+                i += 1
+                j += 1
+            elif isinstance(module, nn.BatchNorm2d):
+                self.fold_bn(module_name, module, pending_bias)
+                pending_bias = None
+                j += 1
+            elif is_torch_conv:
+                self.report['unmatched_ncnn'].append(f"{layer.name} ({layer.type})")
+                i += 1
+            else:
+                self.report['unmatched_torch'].append(module_name)
+                j += 1
+
+        self.report['unmatched_ncnn'] += [f"{l.name} ({l.type})" for l in ncnn_layers[i:]]
+        for module_name, module in torch_slots[j:]:
+            if isinstance(module, nn.BatchNorm2d) and pending_bias is not None:
+                self.fold_bn(module_name, module, pending_bias)
+                pending_bias = None
+            else:
+                self.report['unmatched_torch'].append(module_name)
+
+
+def load_ncnn_weights(model, param_path, bin_path, audio_input='audio', face_input='face'):
+    """
+    将 NCNN 权重以零拷贝视图加载到 MobileNetV2Unet
+
+    Args:
+        model: MobileNetV2Unet（建议 use_groupnorm=True，与 NCNN 的 GroupNorm 对齐）
+        param_path: 解密后的 .param 文件
+        bin_path: 解密后的 .bin 文件
+        audio_input / face_input: .param 中两个 Input 层的名称
+
+    Returns:
+        dict 报告：matched / mismatched / folded / converted / unmatched_ncnn / unmatched_torch
+    """
+    layers = parse_ncnn_param(param_path)
+    weights = NcnnWeights(bin_path, layers)
+    tags = _ncnn_branches(layers, audio_input, face_input)
+
+    ncnn_branches = {'audio': [], 'face': [], 'fused': []}
+    for layer in layers:
+        if layer.name in weights.blobs:
+            ncnn_branches[tags[layer.name]].append(layer)
+
+    mapper = _Mapper(weights)
+    torch_branches = _torch_slots(model)
+    for tag in ('audio', 'face', 'fused'):
+        mapper.map_branch(ncnn_branches[tag], torch_branches[tag])
+    return mapper.report
+
+
+def print_report(report):
+    """打印加载报告"""
+    print(f"   ✅ 已映射: {len(report['matched'])} 个张量")
+    print(f"   🔁 BN 置为恒等: {len(report['folded'])} 个")
+    for key, title in [('converted', '⚠️  需要类型转换（非零拷贝）'),
+                       ('mismatched', '❌ 形状/类型不匹配'),
+                       ('unmatched_ncnn', '❌ NCNN 层未匹配'),
+                       ('unmatched_torch', '❌ PyTorch 模块未匹配')]:
+        if report[key]:
+            print(f"   {title}: {len(report[key])}")
+            for item in report[key]:
+                print(f"      - {item}")
+
+
+def main():
+    import argparse
+    import time
+
+    from MobileNet_Fixed import MobileNetV2Unet
+
+    parser = argparse.ArgumentParser(description='将 NCNN 权重加载到 MobileNetV2Unet 并报告匹配情况')
+    parser.add_argument('param', help='解密后的 .param 文件')
+    parser.add_argument('bin', help='解密后的 .bin 文件')
+    parser.add_argument('--groupnorm', action='store_true', help='使用 GroupNorm（与 NCNN 对齐）')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📥 NCNN 权重加载")
+    print("=" * 60)
+
+    model = MobileNetV2Unet(use_groupnorm=args.groupnorm).eval()
+    start = time.perf_counter()
+    report = load_ncnn_weights(model, args.param, args.bin)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    print(f"   ⏱️  加载耗时: {elapsed:.1f} ms")
+    print_report(report)
+
+    if report['mismatched'] or report['unmatched_ncnn'] or report['unmatched_torch']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+人脸混合与贴回基准
+
+对比 examples/inference.py 中逐帧的 blend_face / paste_face
+与 examples/compositing.py 中的 FaceBlender / paste_faces：
+
+- blend: 每秒混合次数，以及与 blend_face 的最大差（应为 0）
+- paste: 每秒贴回次数，以及 crop_face → 贴回 的往返误差（人脸框内与原帧的平均绝对差）
+
+贴回几何在计时之外预先计算（渲染时每个形象帧只算一次）。
+
+用法:
+    python benchmark_compositing.py [--batch 1 8 32] [选项]
+
+示例:
+    python benchmark_compositing.py
+    python benchmark_compositing.py --batch 1 16 --size 128 --box 240
+"""
+
+import sys
+import os
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'models'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'examples'))
+
+import cv2
+import numpy as np
+
+from inference import blend_face, paste_face, crop_face
+from compositing import FaceBlender, paste_geometry, paste_faces
+
+
+def time_ms(fn, iterations, warmup=3):
+    """fn 的耗时中位数（毫秒）"""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1000)
+
+
+def make_frames(batch, box_side, rng):
+    """生成带平滑纹理的 540x960 帧及各自的人脸框（随机噪声会放大插值误差，不具代表性）"""
+    frames, boxes = [], []
+    for _ in range(batch):
+        small = rng.randint(0, 256, (60, 34, 3), dtype=np.uint8)
+        frames.append(cv2.resize(small, (540, 960), interpolation=cv2.INTER_CUBIC))
+        x1 = rng.randint(0, 540 - box_side)
+        y1 = rng.randint(0, 960 - box_side)
+        boxes.append([x1, x1 + box_side, y1, y1 + box_side])
+    return frames, boxes
+
+
+def roundtrip_error(frames, boxes, paste):
+    """crop_face 后原样贴回，人脸框内与原帧的平均绝对差"""
+    errors = []
+    for frame, box in zip(frames, boxes):
+        pasted = frame.copy()
+        paste(pasted, box)
+        x1, x2, y1, y2 = box
+        errors.append(np.abs(pasted[y1:y2, x1:x2].astype(np.int16) - frame[y1:y2, x1:x2]).mean())
+    return float(np.mean(errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='人脸混合与贴回基准',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python benchmark_compositing.py
+  python benchmark_compositing.py --batch 1 16 --size 128 --box 240
+        """
+    )
+    parser.add_argument('--batch', type=int, nargs='+', default=[1, 8, 32],
+                        help='batch 大小（默认: 1 8 32）')
+    parser.add_argument('--size', type=int, default=160, choices=[128, 160], help='工作分辨率')
+    parser.add_argument('--box', type=int, default=276, help='人脸框边长（默认: 276）')
+    parser.add_argument('--iterations', type=int, default=20, help='计时次数（默认: 20）')
+    parser.add_argument('--threads', type=int, default=1, help='OpenCV 线程数（默认: 1，即单核）')
+
+    args = parser.parse_args()
+    cv2.setNumThreads(args.threads)
+
+    print("=" * 60)
+    print("🎭 人脸混合与贴回基准")
+    print("=" * 60)
+    print(f"\n   OpenCV {args.threads} 线程, 工作分辨率 {args.size}, 人脸框 {args.box}x{args.box}\n")
+    print(f"   {'B':>4} {'blend_face/s':>13} {'FaceBlender/s':>14} {'最大差':>6} "
+          f"{'paste_face/s':>13} {'paste_faces/s':>14}")
+    print("   " + "-" * 70)
+
+    rng = np.random.RandomState(0)
+    weights = rng.randint(0, 256, (args.size, args.size), dtype=np.uint8)
+    blender = FaceBlender(weights, max_batch=max(args.batch))
+    for batch in args.batch:
+        generated = rng.randint(0, 256, (batch, args.size, args.size, 3), dtype=np.uint8)
+        original = rng.randint(0, 256, (batch, args.size, args.size, 3), dtype=np.uint8)
+        frames, boxes = make_frames(batch, args.box, rng)
+        geometries = [paste_geometry(box, args.size) for box in boxes]
+        out = np.empty_like(generated)
+
+        old_blend = time_ms(lambda: [blend_face(generated[i], original[i], weights)
+                                     for i in range(batch)], args.iterations)
+        new_blend = time_ms(lambda: blender.blend(generated, original, out=out), args.iterations)
+        reference = np.stack([blend_face(generated[i], original[i], weights) for i in range(batch)])
+        diff = int(np.abs(blender.blend(generated, original, out=out).astype(np.int16) - reference).max())
+
+        old_paste = time_ms(lambda: [paste_face(frames[i], generated[i], boxes[i])
+                                     for i in range(batch)], args.iterations)
+        new_paste = time_ms(lambda: paste_faces(frames, generated, geometries), args.iterations)
+
+        print(f"   {batch:>4} {batch / old_blend * 1000:>13.0f} {batch / new_blend * 1000:>14.0f} "
+              f"{diff:>6} {batch / old_paste * 1000:>13.0f} {batch / new_paste * 1000:>14.0f}")
+
+    frames, boxes = make_frames(16, args.box, rng)
+    old_error = roundtrip_error(frames, boxes, lambda frame, box: paste_face(
+        frame, crop_face(frame, box, args.size), box))
+    new_error = roundtrip_error(frames, boxes, lambda frame, box: paste_faces(
+        [frame], crop_face(frame, box, args.size)[None], [paste_geometry(box, args.size)]))
+    print(f"\n   往返误差（人脸框内平均绝对差）: paste_face {old_error:.3f}, paste_faces {new_error:.3f}")
+    print("   ℹ️  paste_faces 只写回人脸覆盖的像素，边距保持原帧不变")
+
+    print("\n" + "=" * 60)
+    print("✅ 基准完成")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
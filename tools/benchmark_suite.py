@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+端到端性能基准套件
+
+覆盖渲染链路上的各个环节，按 batch / 线程数 / 分辨率 / 后端组合扫描，
+报告 p50 / p95 / p99 延迟和吞吐，结果写入 JSON，可与之前的结果对比找出性能回退。
+
+环节（--components）:
+- mel:        音频前端，librosa Mel 频谱（WeNetInference.extract_mfcc，需要 --wenet）
+- wenet:      WeNet ONNX 推理（WeNetInference.infer，需要 --wenet）
+- preprocess: 人脸预处理（preprocess_faces，uint8 裁剪 → [B, 6, S, S]）
+- unet:       MobileNetV2Unet 前向，后端见 --backend
+- blend:      BlendGramAlpha 混合 + 贴回原帧（FaceBlender + paste_faces）
+- encode:     540x960 帧编码（JPEG 单帧压缩 / mp4v 视频写入）
+
+UNet 后端（--backend）:
+- eager:     原始模型
+- fused:     BN 折叠（create_model(fuse=True)）
+- arena:     静态缓冲推理模式（models/arena.py）
+- onnx:      导出 ONNX 后用 onnxruntime 推理（需要 onnxruntime）
+- quantized: INT8 静态量化（--quantized 指定的模型，未指定时用随机输入校准一个）
+
+缺少可选依赖或模型文件的环节 / 后端会跳过并给出提示。
+
+用法:
+    python benchmark_suite.py run [选项] --output results.json
+    python benchmark_suite.py compare <baseline.json> <current.json> [--threshold 0.1]
+
+示例:
+    python benchmark_suite.py run --output base.json
+    python benchmark_suite.py run --components unet --backend eager fused onnx quantized \\
+        --batch 1 4 --threads 1 4 --resolution 128 160 --output unet.json
+    python benchmark_suite.py run --components mel wenet --wenet wenet.onnx --threads 1 2
+    python benchmark_suite.py compare base.json new.json --metric p95_ms --threshold 0.05
+"""
+
+import sys
+import os
+import io
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'models'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'examples'))
+
+import cv2
+import numpy as np
+import torch
+
+from inference import create_model, preprocess_faces
+from compositing import FaceBlender, paste_geometry, paste_faces
+from arena import ArenaUnet
+
+
+COMPONENTS = ('mel', 'wenet', 'preprocess', 'unet', 'blend', 'encode')
+BACKENDS = ('eager', 'fused', 'arena', 'onnx', 'quantized')
+CODECS = ('jpeg', 'mp4v')
+
+# 对比时用来匹配同一测试点的字段
+KEY_FIELDS = ('component', 'backend', 'batch', 'threads', 'resolution')
+
+FRAME_SIZE = (540, 960)  # 宽, 高
+FACE_BOX = 276
+
+
+def time_ms(fn, iterations, warmup=5):
+    """每次调用 fn 的耗时（毫秒）"""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return np.array(times) * 1000
+
+
+def summarize(times, items):
+    """延迟分位数（毫秒）和吞吐（items 个 / 秒）"""
+    p50, p95, p99 = np.percentile(times, [50, 95, 99])
+    return {
+        'iterations': len(times),
+        'mean_ms': round(float(times.mean()), 4),
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'throughput': round(items * 1000 / float(times.mean()), 2),
+    }
+
+
+def set_threads(threads):
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+
+
+def result_key(result):
+    return tuple(result.get(field) for field in KEY_FIELDS)
+
+
+def format_key(key):
+    component, backend, batch, threads, resolution = key
+    name = f'{component}/{backend}' if backend else component
+    res = f'{resolution}px' if resolution else '-'
+    return f'{name:<18} B={batch:<3} T={threads:<3} {res:<6}'
+
+
+class UnetBackends:
+    """按需构建各个 UNet 后端，构建失败的后端只提示一次"""
+
+    def __init__(self, quantized_path=None, calib_samples=4):
+        self.quantized_path = quantized_path
+        self.calib_samples = calib_samples
+        self._models = {}
+        self._sessions = {}
+        self._skipped = {}
+        self._tmpdir = tempfile.mkdtemp(prefix='benchmark_onnx_')
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.base = create_model(use_gpu=False)
+
+    def close(self):
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def skip_reason(self, backend):
+        return self._skipped.get(backend)
+
+    def _model(self, backend):
+        if backend not in self._models:
+            with contextlib.redirect_stdout(io.StringIO()):
+                if backend == 'eager':
+                    model = self.base
+                elif backend == 'fused':
+                    model = torch.fx.experimental.optimization.fuse(self.base)
+                elif backend == 'arena':
+                    model = ArenaUnet(self.base)
+                elif self.quantized_path:
+                    model = create_model(use_gpu=False, quantized_path=self.quantized_path)
+                else:
+                    from quantize_model import quantize
+                    samples = [(torch.rand(1, 6, 160, 160) * 2 - 1, torch.randn(1, 256, 20))
+                               for _ in range(self.calib_samples)]
+                    model = quantize(self.base, samples)
+            self._models[backend] = model
+        return self._models[backend]
+
+    def _onnx(self, batch, size, threads):
+        """导出固定形状的 ONNX 并创建 onnxruntime 会话"""
+        key = (batch, size, threads)
+        if key not in self._sessions:
+            import onnxruntime as ort
+
+            path = os.path.join(self._tmpdir, f'unet_b{batch}_{size}.onnx')
+            if not os.path.exists(path):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    torch.onnx.export(self.base, (torch.randn(batch, 6, size, size),
+                                                  torch.randn(batch, 256, 20)),
+                                      path, input_names=['face', 'audio'], output_names=['output'],
+                                      opset_version=17, dynamo=False)
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = threads
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self._sessions[key] = ort.InferenceSession(path, sess_options=options,
+                                                       providers=['CPUExecutionProvider'])
+        return self._sessions[key]
+
+    def runner(self, backend, batch, size, threads):
+        """返回 fn(face, audio)，后端不可用时返回 None"""
+        if backend in self._skipped:
+            return None
+        try:
+            if backend == 'onnx':
+                session = self._onnx(batch, size, threads)
+                return lambda face, audio: session.run(None, {'face': face.numpy(),
+                                                              'audio': audio.numpy()})
+            model = self._model(backend)
+        except ImportError as e:
+            self._skipped[backend] = f'缺少依赖: {e.name}'
+            return None
+        except Exception as e:
+            self._skipped[backend] = f'{type(e).__name__}: {e}'
+            return None
+        return torch.no_grad()(model)
+
+
+def bench_audio(component, args, threads):
+    """mel / wenet，返回 (结果 list, 跳过原因)"""
+    if not args.wenet:
+        return [], '未指定 --wenet'
+    try:
+        from audio_inference import WeNetInference
+    except ImportError as e:
+        return [], f'缺少依赖: {e.name}'
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        wenet = WeNetInference(args.wenet, num_threads=threads)
+    rng = np.random.RandomState(0)
+    if component == 'mel':
+        # melcnt 帧对应的 16 kHz 音频（帧移 160）
+        audio = rng.uniform(-0.5, 0.5, wenet.melcnt * 160).astype(np.float32)
+        times = time_ms(lambda: wenet.extract_mfcc(audio), args.iterations, args.warmup)
+    else:
+        mel = rng.rand(wenet.melcnt, 80).astype(np.float32)
+        times = time_ms(lambda: wenet.infer(mel), args.iterations, args.warmup)
+    return [dict(component=component, backend='onnx' if component == 'wenet' else None,
+                 batch=1, threads=threads, resolution=None, **summarize(times, 1))], None
+
+
+def bench_preprocess(args, threads, batch, size):
+    faces = np.random.RandomState(0).randint(0, 256, (batch, size, size, 3), dtype=np.uint8)
+    out = torch.empty(batch, 6, size, size)
+    times = time_ms(lambda: preprocess_faces(faces, size=size, out=out), args.iterations, args.warmup)
+    return dict(component='preprocess', backend=None, batch=batch, threads=threads,
+                resolution=size, **summarize(times, batch))
+
+
+def bench_unet(fn, backend, args, threads, batch, size):
+    face = torch.rand(batch, 6, size, size) * 2 - 1
+    audio = torch.randn(batch, 256, 20)
+    times = time_ms(lambda: fn(face, audio), args.iterations, args.warmup)
+    return dict(component='unet', backend=backend, batch=batch, threads=threads,
+                resolution=size, **summarize(times, batch))
+
+
+def bench_blend(args, threads, batch, size):
+    rng = np.random.RandomState(0)
+    generated = rng.randint(0, 256, (batch, size, size, 3), dtype=np.uint8)
+    original = rng.randint(0, 256, (batch, size, size, 3), dtype=np.uint8)
+    out = np.empty_like(generated)
+    frames = [rng.randint(0, 256, (FRAME_SIZE[1], FRAME_SIZE[0], 3), dtype=np.uint8)
+              for _ in range(batch)]
+    box = [100, 100 + FACE_BOX, 300, 300 + FACE_BOX]
+    geometries = [paste_geometry(box, size)] * batch
+    blender = FaceBlender(rng.randint(0, 256, (size, size), dtype=np.uint8), max_batch=batch)
+
+    def step():
+        blender.blend(generated, original, out=out)
+        paste_faces(frames, out, geometries)
+
+    times = time_ms(step, args.iterations, args.warmup)
+    return dict(component='blend', backend=None, batch=batch, threads=threads,
+                resolution=size, **summarize(times, batch))
+
+
+def bench_encode(codec, args, threads, batch):
+    # 平滑的图像更接近真实帧的压缩耗时
+    small = np.random.RandomState(0).randint(0, 256, (96, 54, 3), dtype=np.uint8)
+    frames = [cv2.resize(np.roll(small, i, axis=1), FRAME_SIZE, interpolation=cv2.INTER_CUBIC)
+              for i in range(batch)]
+    if codec == 'jpeg':
+        def step():
+            for frame in frames:
+                cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        times = time_ms(step, args.iterations, args.warmup)
+    else:
+        tmpdir = tempfile.mkdtemp(prefix='benchmark_encode_')
+        writer = cv2.VideoWriter(os.path.join(tmpdir, 'out.mp4'), cv2.VideoWriter_fourcc(*codec),
+                                 25, FRAME_SIZE)
+        try:
+            if not writer.isOpened():
+                return None
+
+            def step():
+                for frame in frames:
+                    writer.write(frame)
+            times = time_ms(step, args.iterations, args.warmup)
+        finally:
+            writer.release()
+            shutil.rmtree(tmpdir, ignore_errors=True)
+    return dict(component='encode', backend=codec, batch=batch, threads=threads,
+                resolution=None, **summarize(times, batch))
+
+
+def print_result(result):
+    print(f"   {format_key(result_key(result))} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+          f"{result['p99_ms']:>9.2f} {result['throughput']:>10.1f}")
+
+
+def run(args):
+    print("=" * 60)
+    print("⏱️  端到端性能基准套件")
+    print("=" * 60)
+    print(f"\n   环节: {' '.join(args.components)}")
+    print(f"   UNet 后端: {' '.join(args.backend)}")
+    print(f"   batch {args.batch}, 线程 {args.threads}, 分辨率 {args.resolution}, "
+          f"每点 {args.iterations} 次\n")
+    print(f"   {'测试点':<41} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9} {'吞吐(/s)':>10}")
+    print("   " + "-" * 82)
+
+    results, skipped = [], {}
+    backends = UnetBackends(args.quantized) if 'unet' in args.components else None
+    try:
+        for threads in args.threads:
+            set_threads(threads)
+            for component in args.components:
+                if component in ('mel', 'wenet'):
+                    rows, reason = bench_audio(component, args, threads)
+                    if reason:
+                        skipped[component] = reason
+                elif component == 'encode':
+                    rows = [bench_encode(codec, args, threads, batch)
+                            for codec in CODECS for batch in args.batch]
+                    if None in rows:
+                        skipped['encode/mp4v'] = 'OpenCV 不支持 mp4v 编码'
+                    rows = [row for row in rows if row is not None]
+                else:
+                    rows = []
+                    for size in args.resolution:
+                        for batch in args.batch:
+                            if component == 'preprocess':
+                                rows.append(bench_preprocess(args, threads, batch, size))
+                            elif component == 'blend':
+                                rows.append(bench_blend(args, threads, batch, size))
+                            else:
+                                for backend in args.backend:
+                                    fn = backends.runner(backend, batch, size, threads)
+                                    if fn is None:
+                                        skipped[f'unet/{backend}'] = backends.skip_reason(backend)
+                                        continue
+                                    rows.append(bench_unet(fn, backend, args, threads, batch, size))
+                for row in rows:
+                    print_result(row)
+                results.extend(rows)
+    finally:
+        if backends is not None:
+            backends.close()
+
+    if skipped:
+        print()
+    for name, reason in skipped.items():
+        print(f"   ⚠️  跳过 {name}: {reason}")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'opencv': cv2.__version__,
+            'args': {k: v for k, v in vars(args).items() if k != 'func'},
+        },
+        'skipped': skipped,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n   💾 结果已写入: {args.output}（{len(results)} 个测试点）")
+
+    print("\n" + "=" * 60)
+    print("✅ 基准完成")
+    print("=" * 60)
+
+
+def compare(args):
+    """对比两次结果，返回发现的回退数"""
+    with open(args.baseline) as f:
+        baseline = {result_key(r): r for r in json.load(f)['results']}
+    with open(args.current) as f:
+        current = {result_key(r): r for r in json.load(f)['results']}
+
+    print("=" * 60)
+    print("📊 基准结果对比")
+    print("=" * 60)
+    print(f"\n   基线: {args.baseline}")
+    print(f"   当前: {args.current}")
+    print(f"   指标: {args.metric}，变化超过 ±{args.threshold:.0%} 视为回退 / 提升\n")
+    print(f"   {'测试点':<41} {'基线':>9} {'当前':>9} {'变化':>8}")
+    print("   " + "-" * 72)
+
+    # throughput 越大越好，其余（延迟）越小越好
+    higher_better = args.metric == 'throughput'
+    regressions = improvements = 0
+    for key in sorted(baseline.keys() & current.keys(), key=str):
+        old, new = baseline[key][args.metric], current[key][args.metric]
+        change = (new - old) / old if old else 0.0
+        worse = -change if higher_better else change
+        if worse > args.threshold:
+            flag = '⚠️ 回退'
+            regressions += 1
+        elif worse < -args.threshold:
+            flag = '✅ 提升'
+            improvements += 1
+        else:
+            flag = ''
+        print(f"   {format_key(key)} {old:>9.2f} {new:>9.2f} {change:>+7.1%}  {flag}")
+
+    only_old = baseline.keys() - current.keys()
+    only_new = current.keys() - baseline.keys()
+    if only_old:
+        print(f"\n   ℹ️  仅在基线中: {len(only_old)} 个测试点")
+    if only_new:
+        print(f"   ℹ️  仅在当前结果中: {len(only_new)} 个测试点")
+
+    print("\n" + "=" * 60)
+    if regressions:
+        print(f"⚠️  {regressions} 个测试点回退, {improvements} 个提升")
+    else:
+        print(f"✅ 无回退（{improvements} 个提升）")
+    print("=" * 60)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='端到端性能基准套件',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  # 默认扫描（preprocess / unet / blend / encode）
+  python benchmark_suite.py run --output base.json
+
+  # UNet 各后端的完整扫描
+  python benchmark_suite.py run --components unet --backend eager fused onnx quantized \\
+      --batch 1 4 --threads 1 4 --resolution 128 160 --output unet.json
+
+  # 音频前端（需要解密后的 WeNet ONNX 模型）
+  python benchmark_suite.py run --components mel wenet --wenet wenet.onnx --threads 1 2
+
+  # 对比两次结果（有回退时退出码为 1）
+  python benchmark_suite.py compare base.json new.json --metric p95_ms --threshold 0.05
+        """
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='运行基准并写出 JSON')
+    run_parser.add_argument('--components', nargs='+', choices=COMPONENTS,
+                            default=['preprocess', 'unet', 'blend', 'encode'],
+                            help='测试的环节（默认: preprocess unet blend encode）')
+    run_parser.add_argument('--backend', nargs='+', choices=BACKENDS, default=['eager', 'fused'],
+                            help='UNet 后端（默认: eager fused）')
+    run_parser.add_argument('--batch', type=int, nargs='+', default=[1, 4], help='batch 大小（默认: 1 4）')
+    run_parser.add_argument('--threads', type=int, nargs='+', default=[torch.get_num_threads()],
+                            help='线程数（torch / OpenCV / onnxruntime，默认: 当前 torch 线程数）')
+    run_parser.add_argument('--resolution', type=int, nargs='+', default=[160], choices=[128, 160],
+                            help='工作分辨率（默认: 160）')
+    run_parser.add_argument('--iterations', type=int, default=50, help='每个测试点的计时次数（默认: 50）')
+    run_parser.add_argument('--warmup', type=int, default=5, help='预热次数（默认: 5）')
+    run_parser.add_argument('--wenet', default=None, help='解密后的 WeNet ONNX 模型（mel / wenet 环节需要）')
+    run_parser.add_argument('--quantized', default=None,
+                            help='INT8 量化模型（tools/quantize_model.py 生成；不指定时用随机输入校准）')
+    run_parser.add_argument('--output', '-o', default='benchmark_results.json',
+                            help='结果 JSON（默认: benchmark_results.json）')
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser('compare', help='对比两次结果')
+    compare_parser.add_argument('baseline', help='基线结果 JSON')
+    compare_parser.add_argument('current', help='当前结果 JSON')
+    compare_parser.add_argument('--metric', default='p50_ms',
+                                choices=['mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'throughput'],
+                                help='对比的指标（默认: p50_ms）')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='相对变化阈值（默认: 0.1，即 10%%）')
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    if args.command == 'compare':
+        sys.exit(1 if compare(args) else 0)
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+形象帧解码存储生成工具
+
+一次性把形象的 raw_jpgs / raw_sg 帧（.sij 即 JPEG）解码为 mmap 文件
+<avatar_dir>/frames.npy + frames.json（examples/frame_store.py），
+之后渲染时以零拷贝视图读取，多个工作进程共享同一份 page cache。
+
+--faces 时再按 bbox.j 预先计算每帧的人脸裁剪、归一化后的 6 通道模型输入和贴回参数
+（faces_<S>.npy、crops_<S>.npy、faces.json），渲染时 crop 阶段只剩切片。
+
+--benchmark 对比逐帧处理与 mmap 读取：
+- jpeg:        cv2.imread + BGR→RGB（渲染器原来的 decode 阶段）
+- mmap 视图:   FrameStore.get（零拷贝）
+- mmap + copy: 视图拷贝为可写数组（需要原地贴回人脸时）
+- 有 --faces 时: crop_face + preprocess_faces + paste_geometry 对比 FaceStore 切片
+
+用法:
+    python build_frame_store.py <avatar_dir> [选项]
+
+示例:
+    python build_frame_store.py avatar/
+    python build_frame_store.py avatar/ --output cache/avatar01 --dirs raw_jpgs
+    python build_frame_store.py avatar/ --benchmark --iterations 500
+    python build_frame_store.py avatar/ --faces --size 160 --benchmark
+"""
+
+import sys
+import os
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'models'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'examples'))
+
+import cv2
+import numpy as np
+
+from inference import list_frames, load_bbox, select_resolution, crop_face, preprocess_faces
+from compositing import paste_geometry
+from frame_store import FrameStore, FaceStore, build_frame_store, build_face_store, FRAME_DIRS
+
+
+def time_per_frame(fn, keys, iterations):
+    """按 keys 的顺序循环调用 fn，返回每帧耗时的中位数和 p95（毫秒）"""
+    times = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(keys[i % len(keys)])
+        times.append(time.perf_counter() - start)
+    p50, p95 = np.percentile(np.array(times) * 1000, [50, 95])
+    return float(p50), float(p95)
+
+
+def print_results(results):
+    base = results[0][1]
+    print(f"   {'方式':<12} {'p50(ms)':>9} {'p95(ms)':>9} {'帧/秒':>9} {'加速':>8}")
+    print("   " + "-" * 52)
+    for name, p50, p95 in results:
+        print(f"   {name:<12} {p50:>9.3f} {p95:>9.3f} {1000 / max(p50, 1e-6):>9.0f} "
+              f"{base / max(p50, 1e-6):>7.1f}x")
+
+
+def benchmark(avatar_dir, store, iterations, rng):
+    paths = dict(list_frames(Path(avatar_dir) / 'raw_jpgs'))
+    keys = [k for k in paths if ('raw_jpgs', k) in store]
+    rng.shuffle(keys)
+
+    def jpeg(k):
+        return cv2.cvtColor(cv2.imread(str(paths[k])), cv2.COLOR_BGR2RGB)
+
+    def view(k):
+        return store.get('raw_jpgs', k)
+
+    def copy(k):
+        return store.get('raw_jpgs', k).copy()
+
+    # 先把存储读一遍，测的是 page cache 命中后的稳态（渲染循环第二轮起的情况）
+    for k in keys:
+        store.get('raw_jpgs', k).sum()
+
+    results = [(name, *time_per_frame(fn, keys, iterations))
+               for name, fn in (('jpeg', jpeg), ('mmap 视图', view), ('mmap + copy', copy))]
+    print_results(results)
+    return results
+
+
+def benchmark_faces(store, faces, bboxes, size, iterations, rng):
+    """逐帧 裁剪 + 归一化 + 贴回几何 对比 FaceStore 切片（原帧已在内存中）"""
+    keys = [k for k in bboxes if ('raw_jpgs', k) in store
+            and (k, size or select_resolution(bboxes[k])) in faces]
+    rng.shuffle(keys)
+
+    def compute(k):
+        box = bboxes[k]
+        face_size = size or select_resolution(box)
+        face = crop_face(store.get('raw_jpgs', k), box, face_size)
+        preprocess_faces(face[None], size=face_size)
+        paste_geometry(box, face_size)
+
+    def stored(k):
+        face_size = size or select_resolution(bboxes[k])
+        faces.crop(k, face_size)
+        faces.face_input(k, face_size)
+
+    def stored_geometry(k):
+        faces.geometry(k, size or select_resolution(bboxes[k]))
+
+    for k in keys:
+        faces.face_input(k, size or select_resolution(bboxes[k])).sum()
+    results = [(name, *time_per_frame(fn, keys, iterations))
+               for name, fn in (('逐帧计算', compute), ('切片', stored), ('几何重建', stored_geometry))]
+    print_results(results)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='形象帧解码存储生成工具',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python build_frame_store.py avatar/
+  python build_frame_store.py avatar/ --output cache/avatar01 --dirs raw_jpgs
+  python build_frame_store.py avatar/ --benchmark --iterations 500
+  python build_frame_store.py avatar/ --faces --size 160 --benchmark
+        """
+    )
+    parser.add_argument('avatar_dir', help='形象目录（含 raw_jpgs/、raw_sg/）')
+    parser.add_argument('--output', default=None, help='存储目录（默认: 形象目录）')
+    parser.add_argument('--dirs', nargs='+', default=list(FRAME_DIRS),
+                        help=f"打包的帧目录（默认: {' '.join(FRAME_DIRS)}）")
+    parser.add_argument('--faces', action='store_true', help='同时生成人脸输入存储')
+    parser.add_argument('--size', type=int, default=None, choices=[128, 160],
+                        help='人脸工作分辨率（默认按人脸大小逐帧选择，与渲染器一致）')
+    parser.add_argument('--bbox', default=None, help='bbox.j 路径（默认 <avatar_dir>/bbox.j）')
+    parser.add_argument('--rebuild', action='store_true', help='已存在时也重新生成')
+    parser.add_argument('--benchmark', action='store_true', help='对比逐帧解码 / 预处理与 mmap 读取')
+    parser.add_argument('--iterations', type=int, default=300, help='基准每种方式的读取次数（默认: 300）')
+
+    args = parser.parse_args()
+    output = Path(args.output or args.avatar_dir)
+
+    print("=" * 60)
+    print("🗃️  形象帧解码存储")
+    print("=" * 60)
+
+    if args.rebuild or not FrameStore.exists(output):
+        def progress(done, total):
+            if done == total or done % 50 == 0:
+                print(f"\r   解码 {done}/{total}", end='', flush=True)
+
+        start = time.perf_counter()
+        store = build_frame_store(args.avatar_dir, output, args.dirs, progress)
+        print(f"\n   ✅ 生成完成: {time.perf_counter() - start:.1f} s")
+    else:
+        store = FrameStore(output)
+        print("\n   已存在，直接使用（--rebuild 重新生成）")
+
+    counts = '，'.join(f"{name} {len(rows)}" for name, rows in store.index.items() if rows)
+    print(f"   帧数: {len(store)}（{counts}）   形状: {store.array.shape[1:]}   "
+          f"大小: {store.nbytes / 2**20:.1f} MB")
+    print(f"   💾 {output / 'frames.npy'}")
+
+    faces = None
+    if args.faces:
+        if args.rebuild or not FaceStore.exists(output):
+            start = time.perf_counter()
+            faces = build_face_store(args.avatar_dir, output, args.size, args.bbox)
+            print(f"\n   ✅ 人脸输入生成完成: {time.perf_counter() - start:.1f} s")
+        else:
+            faces = FaceStore(output)
+            print("\n   人脸输入已存在，直接使用（--rebuild 重新生成）")
+        sizes = '，'.join(f"{size}: {len(rows)} 帧" for size, rows in sorted(faces.rows.items()))
+        print(f"   人脸输入: {sizes}   大小: {faces.nbytes / 2**20:.1f} MB")
+
+    if args.benchmark:
+        print()
+        benchmark(args.avatar_dir, store, args.iterations, np.random.RandomState(0))
+        if faces is not None:
+            print()
+            bboxes = load_bbox(args.bbox or Path(args.avatar_dir) / 'bbox.j')
+            benchmark_faces(store, faces, bboxes, args.size, args.iterations, np.random.RandomState(0))
+
+    print("\n" + "=" * 60)
+    print("✅ 完成")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+多会话渲染服务压测客户端
+
+连接本机的 examples/render_server.py，模拟多个并发对话：每个会话
+newsession → 分块 pushpcm → 轮询 readycnt → 按顺序 filerst 取帧 → finsession。
+
+- 默认推送随机 BNF 特征（kind=1），不依赖 WeNet；--pcm 时推送随机 PCM（服务端需加载 --wenet）
+- --realtime 时按音频实时速度推送（每 40ms 一帧 BNF），否则一次推完
+- 报告每个请求类型的延迟分位数、每个会话的帧率和服务整体吞吐
+
+用法:
+    python load_test_server.py [--sessions 8] [--frames 100] [选项]
+
+示例:
+    python load_test_server.py --sessions 4 --frames 50
+    python load_test_server.py --sessions 16 --frames 250 --realtime --chunk 25
+    python load_test_server.py --port 9000 --pcm --format raw
+"""
+
+import sys
+import os
+import time
+import asyncio
+import argparse
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'models'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'examples'))
+
+import numpy as np
+
+from render_server import read_message, write_message, BNF_KIND, PCM_KIND, SAMPLE_RATE
+
+
+class Client:
+    """一个连接：按请求 / 响应顺序收发，记录每类请求的耗时"""
+
+    def __init__(self, reader, writer, timings):
+        self.reader = reader
+        self.writer = writer
+        self.timings = timings
+
+    @classmethod
+    async def connect(cls, host, port, timings):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer, timings)
+
+    async def request(self, cmd, payload=b'', **fields):
+        start = time.perf_counter()
+        write_message(self.writer, dict(fields, cmd=cmd), payload)
+        await self.writer.drain()
+        header, data = await read_message(self.reader)
+        self.timings[cmd].append(time.perf_counter() - start)
+        if header is None:
+            raise ConnectionError("服务端关闭了连接")
+        if not header.get('ok'):
+            raise RuntimeError(f"{cmd} 失败: {header.get('error')}")
+        return header, data
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def run_session(args, timings, rng):
+    """一个会话的完整流程，返回 (帧数, 耗时秒)"""
+    client = await Client.connect(args.host, args.port, timings)
+    try:
+        header, _ = await client.request('newsession')
+        sessid = header['sessid']
+        start = time.perf_counter()
+
+        async def push():
+            for offset in range(0, args.frames, args.chunk):
+                count = min(args.chunk, args.frames - offset)
+                final = offset + count >= args.frames
+                if args.pcm:
+                    samples = count * SAMPLE_RATE // 25
+                    payload = (rng.randn(samples) * 3000).astype(np.int16).tobytes()
+                    kind = PCM_KIND
+                else:
+                    payload = rng.randn(count, 256).astype(np.float32).tobytes()
+                    kind = BNF_KIND
+                await pusher.request('pushpcm', payload, sessid=sessid, kind=kind, final=final)
+                if args.realtime and not final:
+                    await asyncio.sleep(count / 25)
+
+        # 推送与取帧使用不同的连接，和 SDK 中音频线程 / 渲染线程分开的方式一致
+        pusher = await Client.connect(args.host, args.port, timings)
+        push_task = asyncio.create_task(push())
+        try:
+            index = 0
+            while index < args.frames:
+                header, _ = await client.request('readycnt', sessid=sessid)
+                ready = header['readycnt']
+                if index >= ready:
+                    if push_task.done() and push_task.exception():
+                        raise push_task.exception()
+                    await asyncio.sleep(0.01)
+                    continue
+                while index < ready:
+                    await client.request('filerst', sessid=sessid, index=index, format=args.format)
+                    index += 1
+            await push_task
+        finally:
+            push_task.cancel()
+            await pusher.close()
+
+        elapsed = time.perf_counter() - start
+        await client.request('finsession', sessid=sessid)
+        return index, elapsed
+    finally:
+        await client.close()
+
+
+async def load_test(args):
+    timings = defaultdict(list)
+    rng = np.random.RandomState(0)
+
+    # 先确认服务可用
+    probe = await Client.connect(args.host, args.port, defaultdict(list))
+    await probe.request('stats')
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[run_session(args, timings, rng) for _ in range(args.sessions)],
+                                   return_exceptions=True)
+    wall = time.perf_counter() - start
+
+    header, _ = await probe.request('stats')
+    await probe.close()
+    return results, timings, wall, header
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='多会话渲染服务压测客户端',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python load_test_server.py --sessions 4 --frames 50
+  python load_test_server.py --sessions 16 --frames 250 --realtime --chunk 25
+  python load_test_server.py --port 9000 --pcm --format raw
+        """
+    )
+    parser.add_argument('--host', default='127.0.0.1', help='服务地址（默认: 127.0.0.1）')
+    parser.add_argument('--port', type=int, default=8765, help='服务端口（默认: 8765）')
+    parser.add_argument('--sessions', type=int, default=8, help='并发会话数（默认: 8）')
+    parser.add_argument('--frames', type=int, default=100, help='每个会话的帧数（默认: 100，即 4 秒）')
+    parser.add_argument('--chunk', type=int, default=25, help='每次 pushpcm 的帧数（默认: 25，即 1 秒）')
+    parser.add_argument('--realtime', action='store_true', help='按音频实时速度推送')
+    parser.add_argument('--pcm', action='store_true', help='推送 PCM 而不是 BNF（服务端需要 --wenet）')
+    parser.add_argument('--format', default='jpg', choices=['jpg', 'raw'], help='取帧格式（默认: jpg）')
+
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🧪 多会话渲染服务压测")
+    print("=" * 60)
+    print(f"\n   服务: {args.host}:{args.port}   会话: {args.sessions}   每会话 {args.frames} 帧   "
+          f"{'实时推送' if args.realtime else '一次推完'}   {'PCM' if args.pcm else 'BNF'}\n")
+
+    try:
+        results, timings, wall, server_stats = asyncio.run(load_test(args))
+    except (ConnectionError, OSError) as e:
+        print(f"❌ 无法连接服务: {e}")
+        sys.exit(1)
+
+    errors = [r for r in results if isinstance(r, BaseException)]
+    done = [r for r in results if not isinstance(r, BaseException)]
+
+    print(f"   {'请求':<11} {'次数':>6} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9}")
+    print("   " + "-" * 48)
+    for cmd in ('newsession', 'pushpcm', 'readycnt', 'filerst', 'finsession'):
+        if timings[cmd]:
+            p50, p95, p99 = np.percentile(np.array(timings[cmd]) * 1000, [50, 95, 99])
+            print(f"   {cmd:<11} {len(timings[cmd]):>6} {p50:>9.2f} {p95:>9.2f} {p99:>9.2f}")
+
+    frames = sum(n for n, _ in done)
+    if done:
+        session_fps = [n / t for n, t in done if t > 0]
+        print(f"\n   会话帧率: 最低 {min(session_fps):.1f} / 中位 {np.median(session_fps):.1f} fps"
+              f"（实时需要 25 fps）")
+    print(f"   总吞吐: {frames} 帧 / {wall:.2f} s = {frames / wall:.1f} fps")
+    print(f"   服务端: 单帧渲染 {server_stats['render_ms']:.1f} ms，"
+          f"剩余会话 {server_stats['sessions']}")
+    batching = server_stats.get('batching')
+    if batching:
+        histogram = ' '.join(f'{k}×{v}' for k, v in batching['batch_histogram'].items())
+        wait = batching['wait_ms']
+        print(f"   批处理: 平均 batch {batching['mean_batch']:.2f}（{histogram}），"
+              f"最大队列深度 {batching['max_queue_depth']}")
+        print(f"           附加等待 p50/p95/p99 {wait['p50']:.1f} / {wait['p95']:.1f} / {wait['p99']:.1f} ms，"
+              f"前向 {batching['forward_ms_per_frame']:.1f} ms/帧")
+    cache = server_stats.get('cache')
+    if cache:
+        print(f"   UNet 缓存: 命中率 {cache['hit_rate']:.1%}（{cache['hits']} / {cache['hits'] + cache['misses']}），"
+              f"{cache['entries']} 项，淘汰 {cache['evictions']}")
+    if errors:
+        print(f"\n   ⚠️  {len(errors)} 个会话失败，首个错误: {errors[0]!r}")
+
+    print("\n" + "=" * 60)
+    print("✅ 压测完成" if not errors else "⚠️  压测完成（有失败的会话）")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
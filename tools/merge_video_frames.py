@@ -4,80 +4,167 @@
 
 将 .sij 帧文件合并成视频文件
 
+渲染生成的帧不需要先写成图片再用本脚本合并，
+examples/video_sink.py 可以把帧直接以 rawvideo 管道写入 ffmpeg。
+
+三种方式:
+- 默认:      ffmpeg concat 逐帧解码 JPEG，单个进程编码为 H.264
+- --fast:    .sij 本身就是 JPEG，原样写入 ffmpeg 后 -c:v copy 封装为 MJPEG（不解码、不编码），
+             适合预览；MP4 对 MJPEG 支持较差，建议输出 .mkv / .avi
+- --jobs N:  按帧区间切成 N 段，N 个 ffmpeg 并行编码 H.264，最后 concat -c copy 无损拼接
+
 用法:
-    python merge_video_frames.py <frames_dir> <output_video> [--fps FPS]
-    
+    python merge_video_frames.py <frames_dir> <output_video> [--fps FPS] [--fast] [--jobs N]
+
 示例:
     python merge_video_frames.py raw_jpgs output.mp4
     python merge_video_frames.py raw_jpgs output.mp4 --fps 25
+    python merge_video_frames.py raw_jpgs preview.mkv --fast
+    python merge_video_frames.py raw_jpgs output.mp4 --jobs 4
+    python merge_video_frames.py raw_jpgs output.mp4 --benchmark --jobs 4
 """
 
+import os
 import sys
+import time
+import shutil
 import subprocess
 import argparse
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+
+def list_sij_files(frames_dir):
+    """获取所有 .sij 文件并按数字排序"""
+    return sorted(
+        Path(frames_dir).glob("*.sij"),
+        key=lambda x: int(x.stem) if x.stem.isdigit() else float('inf')
+    )
+
 
-def merge_frames_to_video(frames_dir, output_video, fps=25):
+def run_ffmpeg(cmd):
+    """执行 ffmpeg，失败时抛出带 stderr 的 RuntimeError"""
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg 错误:\n{result.stderr}")
+
+
+def encode_frames(sij_files, output_path, fps=25, threads=None):
+    """使用 ffmpeg 的 concat demuxer 读取 JPEG 帧，编码为 H.264"""
+    # 由于 .sij 文件实际上是 JPEG 格式，可以直接使用
+    concat_file = output_path.with_name(f'.{output_path.name}.concat.txt')
+    with open(concat_file, 'w') as f:
+        for sij_file in sij_files:
+            f.write(f"file '{sij_file.absolute()}'\n")
+            f.write(f"duration {1.0/fps}\n")
+        # 最后一帧需要指定持续时间
+        f.write(f"file '{sij_files[-1].absolute()}'\n")
+
+    # 重复的最后一帧只是为了让它有持续时间，-frames:v 按实际帧数截止，不会多出一帧；
+    # --jobs 的每个分段也因此恰好是自己的帧数，拼接处不会重复
+    cmd = [
+        'ffmpeg', '-y', '-f', 'concat', '-safe', '0',
+        '-i', str(concat_file),
+        '-c:v', 'libx264', '-pix_fmt', 'yuv420p',
+        '-r', str(fps), '-frames:v', str(len(sij_files)),
+    ]
+    if threads:
+        cmd += ['-threads', str(threads)]
+    try:
+        run_ffmpeg(cmd + [str(output_path)])
+    finally:
+        concat_file.unlink()  # 删除临时文件
+
+
+def copy_frames(sij_files, output_path, fps=25):
+    """--fast：JPEG 数据原样写入 ffmpeg 的 stdin，-c:v copy 封装为 MJPEG"""
+    cmd = [
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-f', 'image2pipe', '-framerate', str(fps), '-c:v', 'mjpeg', '-i', '-',
+        '-c:v', 'copy', str(output_path)
+    ]
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        for sij_file in sij_files:
+            process.stdin.write(sij_file.read_bytes())
+        process.stdin.close()
+    except BrokenPipeError:
+        pass
+    stderr = process.stderr.read().decode(errors='ignore')
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg 错误:\n{stderr}")
+
+
+def encode_parallel(sij_files, output_path, fps=25, jobs=2):
+    """--jobs：按帧区间并行编码各分段，再用 concat -c copy 无损拼接"""
+    jobs = max(1, min(jobs, len(sij_files)))
+    bounds = [len(sij_files) * i // jobs for i in range(jobs + 1)]
+    parts = [sij_files[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+    # 每个 ffmpeg 分到的编码线程数，避免 N 个进程各自占满全部核
+    threads = max(1, (os.cpu_count() or 1) // jobs)
+
+    segment_dir = output_path.with_name(f'.{output_path.stem}_segments')
+    segment_dir.mkdir(parents=True, exist_ok=True)
+    segments = [segment_dir / f'{i:04d}{output_path.suffix}' for i in range(len(parts))]
+    try:
+        with ThreadPoolExecutor(len(parts)) as pool:
+            # list() 取出结果，任一分段失败时异常在这里抛出
+            list(pool.map(lambda item: encode_frames(item[0], item[1], fps, threads),
+                          zip(parts, segments)))
+
+        listing = segment_dir / 'segments.txt'
+        with open(listing, 'w') as f:
+            for segment in segments:
+                f.write(f"file '{segment.absolute()}'\n")
+        run_ffmpeg(['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', str(listing),
+                    '-c', 'copy', str(output_path)])
+    finally:
+        shutil.rmtree(segment_dir, ignore_errors=True)
+
+
+def merge_frames_to_video(frames_dir, output_video, fps=25, fast=False, jobs=1):
     """将 .sij 帧文件合并成视频"""
+    mode = 'MJPEG 直接封装（不重新编码）' if fast else f'H.264，{jobs} 个并行编码进程' if jobs > 1 else 'H.264'
     print(f"\n🎬 正在合并帧为视频...")
     print(f"   输入目录: {frames_dir}")
     print(f"   输出视频: {output_video}")
     print(f"   帧率: {fps} fps")
-    
+    print(f"   方式: {mode}")
+
     frames_dir = Path(frames_dir)
-    
+
     if not frames_dir.exists():
         print(f"❌ 错误：目录不存在: {frames_dir}")
         return False
-    
-    # 获取所有 .sij 文件并按数字排序
-    sij_files = sorted(
-        frames_dir.glob("*.sij"),
-        key=lambda x: int(x.stem) if x.stem.isdigit() else float('inf')
-    )
-    
+
+    sij_files = list_sij_files(frames_dir)
+
     if not sij_files:
         print("❌ 错误：未找到 .sij 文件")
         return False
-    
+
     print(f"   📸 找到 {len(sij_files)} 帧")
-    
-    # 使用 ffmpeg 合并视频
-    # 由于 .sij 文件实际上是 JPEG 格式，可以直接使用
+
+    output_path = Path(output_video)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if fast and output_path.suffix.lower() == '.mp4':
+        print("   ⚠️  MP4 对 MJPEG 支持较差，部分播放器无法播放，建议使用 .mkv / .avi")
+
     try:
-        # 使用 ffmpeg 的 concat demuxer
-        concat_file = frames_dir / "concat_list.txt"
-        with open(concat_file, 'w') as f:
-            for sij_file in sij_files:
-                f.write(f"file '{sij_file.absolute()}'\n")
-                f.write(f"duration {1.0/fps}\n")
-            # 最后一帧需要指定持续时间
-            f.write(f"file '{sij_files[-1].absolute()}'\n")
-        
-        output_path = Path(output_video)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        cmd = [
-            'ffmpeg', '-y', '-f', 'concat', '-safe', '0',
-            '-i', str(concat_file),
-            '-c:v', 'libx264', '-pix_fmt', 'yuv420p',
-            '-r', str(fps),
-            str(output_path)
-        ]
-        
-        print(f"   🎥 执行命令: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            print(f"   ✅ 视频生成成功: {output_video}")
-            concat_file.unlink()  # 删除临时文件
-            print(f"   📁 输出文件大小: {output_path.stat().st_size / 1024 / 1024:.2f} MB")
-            return True
+        start = time.perf_counter()
+        if fast:
+            copy_frames(sij_files, output_path, fps)
+        elif jobs > 1:
+            encode_parallel(sij_files, output_path, fps, jobs)
         else:
-            print(f"   ❌ ffmpeg 错误:")
-            print(result.stderr)
-            return False
-            
+            encode_frames(sij_files, output_path, fps)
+        elapsed = time.perf_counter() - start
+
+        print(f"   ✅ 视频生成成功: {output_video}")
+        print(f"   ⏱️  耗时: {elapsed:.2f} s（{len(sij_files) / elapsed:.0f} 帧/秒）")
+        print(f"   📁 输出文件大小: {output_path.stat().st_size / 1024 / 1024:.2f} MB")
+        return True
+
     except FileNotFoundError:
         print("   ❌ 错误：未找到 ffmpeg，请先安装 ffmpeg")
         print("   Ubuntu/Debian: sudo apt install ffmpeg")
@@ -88,6 +175,50 @@ def merge_frames_to_video(frames_dir, output_video, fps=25):
         print(f"   ❌ 错误: {e}")
         return False
 
+
+def benchmark(frames_dir, output_video, fps=25, jobs=None):
+    """依次用 默认 / --jobs / --fast 合并同一目录，对比耗时（输出写到临时文件后删除）"""
+    sij_files = list_sij_files(frames_dir)
+    if not sij_files:
+        print("❌ 错误：未找到 .sij 文件")
+        return False
+    jobs = jobs if jobs and jobs > 1 else max(2, os.cpu_count() or 1)
+    output_path = Path(output_video)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    runs = [
+        ('默认（H.264）', output_path.with_name(f'.bench_default{output_path.suffix}'),
+         lambda out: encode_frames(sij_files, out, fps)),
+        (f'--jobs {jobs}', output_path.with_name(f'.bench_jobs{output_path.suffix}'),
+         lambda out: encode_parallel(sij_files, out, fps, jobs)),
+        ('--fast（MJPEG）', output_path.with_name('.bench_fast.mkv'),
+         lambda out: copy_frames(sij_files, out, fps)),
+    ]
+    print(f"\n⏱️  合并 {len(sij_files)} 帧（{fps} fps，CPU 核数 {os.cpu_count()}）\n")
+    print(f"   {'方式':<14} {'耗时(s)':>8} {'帧/秒':>8} {'大小(MB)':>9} {'加速':>7}")
+    print("   " + "-" * 52)
+    base = None
+    try:
+        for name, out, fn in runs:
+            start = time.perf_counter()
+            fn(out)
+            elapsed = time.perf_counter() - start
+            base = base or elapsed
+            print(f"   {name:<14} {elapsed:>8.2f} {len(sij_files) / elapsed:>8.0f} "
+                  f"{out.stat().st_size / 1024 / 1024:>9.2f} {base / elapsed:>6.1f}x")
+    except FileNotFoundError:
+        print("   ❌ 错误：未找到 ffmpeg，请先安装 ffmpeg")
+        return False
+    except Exception as e:
+        print(f"   ❌ 错误: {e}")
+        return False
+    finally:
+        for _, out, _ in runs:
+            if out.exists():
+                out.unlink()
+    return True
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='将 .sij 帧文件合并成视频',
@@ -96,27 +227,46 @@ def main():
 示例:
   # 基本用法（默认 25 fps）
   python merge_video_frames.py raw_jpgs output.mp4
-  
+
   # 指定帧率
   python merge_video_frames.py raw_jpgs output.mp4 --fps 30
-  
+
   # 使用相对路径
   python merge_video_frames.py ./frames video.mp4 --fps 24
+
+  # 预览：JPEG 直接封装为 MJPEG，不重新编码
+  python merge_video_frames.py raw_jpgs preview.mkv --fast
+
+  # 4 个 ffmpeg 并行编码帧区间，再无损拼接
+  python merge_video_frames.py raw_jpgs output.mp4 --jobs 4
+
+  # 对比三种方式的耗时
+  python merge_video_frames.py raw_jpgs output.mp4 --benchmark --jobs 4
         """
     )
-    
+
     parser.add_argument('frames_dir', help='包含 .sij 帧文件的目录')
     parser.add_argument('output_video', help='输出视频文件路径')
     parser.add_argument('--fps', type=int, default=25, help='视频帧率（默认: 25）')
-    
+    parser.add_argument('--fast', action='store_true',
+                        help='不重新编码，JPEG 直接封装为 MJPEG（建议输出 .mkv / .avi）')
+    parser.add_argument('--jobs', type=int, default=1, help='并行编码的 ffmpeg 进程数（默认: 1）')
+    parser.add_argument('--benchmark', action='store_true', help='对比 默认 / --jobs / --fast 的耗时')
+
     args = parser.parse_args()
-    
+    if args.fast and args.jobs > 1:
+        parser.error('--fast 不编码，不需要 --jobs')
+
     print("=" * 60)
     print("🎬 视频帧合成工具")
     print("=" * 60)
-    
-    success = merge_frames_to_video(args.frames_dir, args.output_video, args.fps)
-    
+
+    if args.benchmark:
+        success = benchmark(args.frames_dir, args.output_video, args.fps, args.jobs)
+    else:
+        success = merge_frames_to_video(args.frames_dir, args.output_video, args.fps,
+                                        args.fast, args.jobs)
+
     if success:
         print("\n" + "=" * 60)
         print("✅ 视频合成完成！")
@@ -126,5 +276,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
-
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+MobileNetV2Unet 逐层性能分析脚本
+
+在每个叶子子模块上挂 forward hook，记录：
+- 墙钟耗时
+- FLOPs（由卷积/反卷积/全连接的形状解析计算）
+- 输出激活字节数
+
+结果按“块”汇总（backbone 的 25 层、AudioEncoder 各级、dconv*/invres* 解码器块），
+输出排序表格，并可写出 JSON 汇总和 Chrome Trace（chrome://tracing / Perfetto）。
+支持 eager、fused（BN 折叠）、quantized（INT8 GraphModule）三种模型。
+
+用法:
+    python profile_model.py [--variant eager|fused|quantized] [选项]
+
+示例:
+    python profile_model.py
+    python profile_model.py --variant quantized --threads 4 --json profile.json --trace trace.json
+    python profile_model.py --variant fused --resolution 128 --batch 4 --leaves
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'models'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'examples'))
+
+import torch
+
+from inference import create_model
+
+
+def block_name(name):
+    """
+    将叶子模块名归并到块：
+    backbone.features.N.* → backbone.features.N；audio_encoder.convN.* → audio_encoder.convN；
+    其余取第一级（dconv0、invres0、conv_last ...）
+    """
+    parts = name.split('.')
+    if name.startswith('backbone.features.'):
+        return '.'.join(parts[:3])
+    if name.startswith('audio_encoder.'):
+        return '.'.join(parts[:2])
+    return parts[0]
+
+
+def module_flops(module, inputs, output):
+    """按形状解析计算 FLOPs（乘加各算一次），非卷积/全连接层返回 0"""
+    kind = type(module).__name__
+    if hasattr(module, 'kernel_size') and hasattr(module, 'in_channels'):
+        kh, kw = module.kernel_size
+        if 'Transpose' in kind:
+            # 每个输入元素向 out_channels/groups 个通道散射 kh*kw 次
+            macs = inputs[0].numel() * (module.out_channels // module.groups) * kh * kw
+        else:
+            macs = output.numel() * (module.in_channels // module.groups) * kh * kw
+        return 2 * macs
+    if hasattr(module, 'in_features') and hasattr(module, 'out_features'):
+        return 2 * output.numel() * module.in_features
+    return 0
+
+
+def tensor_bytes(value):
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (tuple, list)):
+        return sum(tensor_bytes(v) for v in value)
+    return 0
+
+
+class LayerProfiler:
+    """在模型的所有叶子模块上挂 hook 的逐层分析器"""
+
+    def __init__(self, model):
+        if isinstance(model, torch.jit.ScriptModule):
+            raise TypeError("TorchScript 模块无法挂 hook，请传入 nn.Module / GraphModule")
+        self.model = model
+        self.stats = OrderedDict()
+        self.events = []
+        self.recording = False
+        self._starts = {}
+        self._t0 = 0.0
+        self._handles = []
+
+        for name, module in model.named_modules():
+            if name and not any(True for _ in module.children()):
+                self.stats[name] = {'type': type(module).__name__, 'calls': 0, 'time_ms': 0.0,
+                                    'flops': 0, 'act_bytes': 0}
+                self._handles.append(module.register_forward_pre_hook(self._pre_hook(name)))
+                self._handles.append(module.register_forward_hook(self._post_hook(name)))
+
+    def _pre_hook(self, name):
+        def hook(module, inputs):
+            self._starts[name] = time.perf_counter()
+        return hook
+
+    def _post_hook(self, name):
+        def hook(module, inputs, output):
+            end = time.perf_counter()
+            if not self.recording:
+                return
+            start = self._starts[name]
+            stat = self.stats[name]
+            stat['calls'] += 1
+            stat['time_ms'] += (end - start) * 1000
+            stat['flops'] += module_flops(module, inputs, output)
+            stat['act_bytes'] += tensor_bytes(output)
+            self.events.append({
+                'name': name, 'cat': stat['type'], 'ph': 'X', 'pid': 0, 'tid': 0,
+                'ts': (start - self._t0) * 1e6, 'dur': (end - start) * 1e6,
+            })
+        return hook
+
+    def remove(self):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+    @torch.no_grad()
+    def run(self, face, audio, iterations=20, warmup=3):
+        """
+        运行多次前向，返回每次前向的平均总耗时（毫秒）
+
+        stats 中的数值为每次前向的平均值，events 只保留最后一次前向。
+        """
+        for _ in range(warmup):
+            self.model(face, audio)
+
+        self.recording = True
+        total = 0.0
+        for _ in range(iterations):
+            self.events = []
+            self._t0 = time.perf_counter()
+            self.model(face, audio)
+            total += time.perf_counter() - self._t0
+        self.recording = False
+
+        for stat in self.stats.values():
+            for key in ('calls', 'time_ms', 'flops', 'act_bytes'):
+                stat[key] /= iterations
+        return total / iterations * 1000
+
+    def blocks(self):
+        """按 block_name() 汇总叶子模块统计"""
+        blocks = OrderedDict()
+        for name, stat in self.stats.items():
+            block = blocks.setdefault(block_name(name),
+                                      {'time_ms': 0.0, 'flops': 0, 'act_bytes': 0, 'layers': 0})
+            block['time_ms'] += stat['time_ms']
+            block['flops'] += stat['flops']
+            block['act_bytes'] += stat['act_bytes']
+            block['layers'] += 1
+        return blocks
+
+
+def print_table(rows, total_ms, top=None):
+    """打印按耗时降序排列的表格"""
+    rows = sorted(rows.items(), key=lambda kv: kv[1]['time_ms'], reverse=True)
+    if top:
+        rows = rows[:top]
+    print(f"   {'名称':<32} {'耗时(ms)':>9} {'占比':>7} {'MFLOPs':>9} {'GFLOP/s':>8} {'激活(KB)':>9}")
+    print("   " + "-" * 80)
+    for name, stat in rows:
+        share = stat['time_ms'] / total_ms * 100 if total_ms else 0
+        gflops = stat['flops'] / (stat['time_ms'] * 1e6) if stat['time_ms'] else 0
+        print(f"   {name:<32} {stat['time_ms']:>9.3f} {share:>6.1f}% {stat['flops'] / 1e6:>9.2f} "
+              f"{gflops:>8.2f} {stat['act_bytes'] / 1024:>9.1f}")
+
+
+def build_model(variant, face, audio):
+    """构建待分析的模型变体"""
+    model = create_model(use_gpu=False, fuse=(variant == 'fused'))
+    if variant == 'quantized':
+        from quantize_model import quantize
+        calib = [(torch.randn_like(face), torch.randn_like(audio)) for _ in range(8)]
+        model = quantize(model, calib, script=False)
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='MobileNetV2Unet 逐层性能分析',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python profile_model.py
+  python profile_model.py --variant quantized --json profile.json --trace trace.json
+        """
+    )
+    parser.add_argument('--variant', default='eager', choices=['eager', 'fused', 'quantized'],
+                        help='模型变体（默认: eager）')
+    parser.add_argument('--resolution', type=int, default=160, choices=[128, 160],
+                        help='工作分辨率（默认: 160）')
+    parser.add_argument('--batch', type=int, default=1, help='batch 大小（默认: 1）')
+    parser.add_argument('--threads', type=int, default=None, help='torch 线程数（默认不修改）')
+    parser.add_argument('--iterations', type=int, default=20, help='计时迭代次数（默认: 20）')
+    parser.add_argument('--leaves', action='store_true', help='同时打印叶子模块表格')
+    parser.add_argument('--top', type=int, default=None, help='只显示耗时最高的 N 行')
+    parser.add_argument('--json', default=None, help='输出 JSON 汇总文件')
+    parser.add_argument('--trace', default=None, help='输出 Chrome Trace 文件')
+
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    print("=" * 60)
+    print(f"🔬 MobileNetV2Unet 逐层性能分析 ({args.variant})")
+    print("=" * 60)
+
+    face = torch.randn(args.batch, 6, args.resolution, args.resolution)
+    audio = torch.randn(args.batch, 256, 20)
+    model = build_model(args.variant, face, audio)
+
+    profiler = LayerProfiler(model)
+    total_ms = profiler.run(face, audio, args.iterations)
+    profiler.remove()
+
+    blocks = profiler.blocks()
+    hooked_ms = sum(b['time_ms'] for b in blocks.values())
+    total_flops = sum(b['flops'] for b in blocks.values())
+    print(f"\n   输入: face {list(face.shape)}, audio {list(audio.shape)}, "
+          f"{torch.get_num_threads()} 线程")
+    print(f"   前向总耗时: {total_ms:.2f} ms   模块内耗时: {hooked_ms:.2f} ms   "
+          f"函数式算子/调度: {total_ms - hooked_ms:.2f} ms")
+    print(f"   总计算量: {total_flops / 1e9:.3f} GFLOPs\n")
+
+    print_table(blocks, total_ms, args.top)
+    if args.leaves:
+        print()
+        print_table(profiler.stats, total_ms, args.top)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'variant': args.variant,
+                'resolution': args.resolution,
+                'batch': args.batch,
+                'threads': torch.get_num_threads(),
+                'total_ms': total_ms,
+                'blocks': blocks,
+                'layers': profiler.stats,
+            }, f, indent=2)
+        print(f"\n   💾 JSON: {args.json}")
+
+    if args.trace:
+        with open(args.trace, 'w') as f:
+            json.dump({'traceEvents': profiler.events, 'displayTimeUnit': 'ms'}, f)
+        print(f"   💾 Chrome Trace: {args.trace}")
+
+    print("\n" + "=" * 60)
+    print("✅ 分析完成")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+MobileNetV2Unet 延迟感知结构化通道剪枝脚本
+
+可剪枝的通道组（同一组内的张量按相同的通道索引一起裁剪，保证跳跃连接拼接后通道对齐）：
+- 编码器 / 解码器 InvertedResidual 的扩展通道（pw → dw → pw-linear 的输入）
+- 解码器 invres0 ~ invres4 的输出通道（下一级 dconv 的输入）
+- 解码器 dconv0 ~ dconv5 的输出通道（拼接在跳跃连接之后，作为 invres 输入的后半段）
+
+编码器各级输出通道参与残差和跳跃连接，保持不变，以便继续复用原始权重布局。
+
+通道重要性 = 生产者归一化层 |gamma|（无归一化层时为卷积核 L1）× 消费者卷积核 L1；
+每个通道的延迟代价由 LayerProfiler 在 CPU 上实测的叶子模块耗时按通道数均摊得到。
+按“重要性 / 延迟代价”从低到高贪心删除，直到估计节省的耗时达到目标比例，
+再把每组保留的通道数向上取整到 --divisor 的倍数（对 SIMD 友好）。
+
+剪枝后的模型用 MobileNetV2Unet(config=...) 重建，输出通道配置 JSON 和 state_dict，
+可由 examples/inference.py 的 create_model(config=..., weights_path=...) 加载。
+同时在 CPU 上实测每个剪枝比例的延迟，以及相对未剪枝模型的 PSNR/SSIM（未微调）。
+
+用法:
+    python prune_model.py <output_dir> [选项]
+
+示例:
+    python prune_model.py pruned/ --weights dh_model.pth --ratios 0.1 0.2 0.3
+    python prune_model.py pruned/ --weights dh_model.pth --avatar avatar/ --bnf audio_bnf.npy
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'models'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'examples'))
+
+import numpy as np
+import torch
+
+from MobileNet_Fixed import MobileNetV2Unet, SKIP_CHANNELS
+from inference import create_model, postprocess_output
+from metrics import compute_psnr, compute_ssim
+from profile_model import LayerProfiler
+
+
+def _norm_keys(prefix):
+    return [f'{prefix}.{name}' for name in ('weight', 'bias', 'running_mean', 'running_var')]
+
+
+def channel_groups(model):
+    """
+    列出模型的可剪枝通道组
+
+    Returns:
+        dict: 组名 → {
+            'size': 通道数,
+            'cfg': (配置键, 下标),
+            'tensors': [(state_dict 键, 维度, 偏移)]，偏移为该维度上排在本组之前的固定通道数,
+            'norm': 生产者归一化层的 weight 键（None 表示用 'producer' 的 L1）,
+            'producer': (键, 维度), 'consumer': (键, 维度, 偏移),
+            'layers': [(叶子模块名, 该模块在本组维度上的通道数)]，用于均摊延迟,
+        }
+    """
+    cfg = model.config
+    groups = {}
+
+    def hidden_group(prefix, cfg_key, index):
+        # 扩展通道: conv.0 输出 → conv.1 → conv.3 (dw) → conv.4 → conv.6 输入
+        size = cfg[cfg_key][index]
+        tensors = [(f'{prefix}.conv.0.weight', 0, 0), (f'{prefix}.conv.3.weight', 0, 0),
+                   (f'{prefix}.conv.6.weight', 1, 0)]
+        tensors += [(key, 0, 0) for key in _norm_keys(f'{prefix}.conv.1') + _norm_keys(f'{prefix}.conv.4')]
+        groups[f'{prefix}.hidden'] = {
+            'size': size, 'cfg': (cfg_key, index), 'tensors': tensors,
+            'norm': f'{prefix}.conv.4.weight', 'producer': None,
+            'consumer': (f'{prefix}.conv.6.weight', 1, 0),
+            'layers': [(f'{prefix}.conv.{i}', size) for i in range(6)] +
+                      [(f'{prefix}.conv.6', size)],
+        }
+
+    # 编码器: features.7 的 expand_ratio 为 1，没有独立的扩展通道
+    for j in range(1, len(cfg['backbone_hidden'])):
+        hidden_group(f'backbone.features.{7 + j}', 'backbone_hidden', j)
+
+    for k in range(5):
+        hidden_group(f'invres{k}', 'invres_hidden', k)
+
+        # invresK 输出 → dconv(K+1) 输入（ConvTranspose2d 权重为 [in, out, kh, kw]）
+        size = cfg['invres'][k]
+        groups[f'invres{k}.out'] = {
+            'size': size, 'cfg': ('invres', k),
+            'tensors': [(f'invres{k}.conv.6.weight', 0, 0), (f'dconv{k + 1}.weight', 0, 0)] +
+                       [(key, 0, 0) for key in _norm_keys(f'invres{k}.conv.7')],
+            'norm': f'invres{k}.conv.7.weight', 'producer': None,
+            'consumer': (f'dconv{k + 1}.weight', 0, 0),
+            'layers': [(f'invres{k}.conv.{i}', size) for i in (6, 7, 8)] +
+                      [(f'dconv{k + 1}', size)],
+        }
+
+    for k in range(6):
+        # dconvK 输出拼接在跳跃连接之后，消费者为 invresK 的第一个 1x1 卷积（或 conv_last）
+        size = cfg['dconv'][k]
+        if k < 5:
+            consumer = (f'invres{k}.conv.0.weight', 1, SKIP_CHANNELS[k])
+            consumer_layer = (f'invres{k}.conv.0', SKIP_CHANNELS[k] + size)
+        else:
+            consumer = ('conv_last.weight', 1, 0)
+            consumer_layer = ('conv_last', size)
+        groups[f'dconv{k}.out'] = {
+            'size': size, 'cfg': ('dconv', k),
+            'tensors': [(f'dconv{k}.weight', 1, 0), (f'dconv{k}.bias', 0, 0), consumer],
+            'norm': None, 'producer': (f'dconv{k}.weight', 1),
+            'consumer': consumer,
+            'layers': [(f'dconv{k}', size), consumer_layer],
+        }
+
+    return groups
+
+
+def _l1(tensor, dim, offset, size):
+    tensor = tensor.narrow(dim, offset, size).abs()
+    return tensor.transpose(0, dim).reshape(size, -1).sum(dim=1)
+
+
+def channel_importance(state_dict, group):
+    """通道重要性: 生产者尺度 × 消费者 L1"""
+    size = group['size']
+    if group['norm'] is not None:
+        scale = state_dict[group['norm']].abs()
+    else:
+        key, dim = group['producer']
+        scale = _l1(state_dict[key], dim, 0, size)
+    key, dim, offset = group['consumer']
+    return (scale * _l1(state_dict[key], dim, offset, size)).float()
+
+
+def channel_cost(group, layer_ms):
+    """每个通道的延迟代价（毫秒），按叶子模块耗时 / 通道数均摊"""
+    return sum(layer_ms.get(name, 0.0) / channels for name, channels in group['layers'])
+
+
+@torch.no_grad()
+def profile_layers(model, face, audio, iterations=10):
+    """实测每个叶子模块的平均耗时，返回 (总耗时, {模块名: 毫秒})"""
+    profiler = LayerProfiler(model)
+    total_ms = profiler.run(face, audio, iterations)
+    profiler.remove()
+    return total_ms, {name: stat['time_ms'] for name, stat in profiler.stats.items()}
+
+
+def select_channels(groups, state_dict, layer_ms, target_ms, divisor=8, min_keep=0.25):
+    """
+    贪心选择保留的通道
+
+    Args:
+        target_ms: 期望节省的估计耗时（毫秒）
+        divisor: 每组保留通道数向上取整到该倍数
+        min_keep: 每组至少保留的比例
+
+    Returns:
+        dict: 组名 → 保留通道的升序索引 (LongTensor)
+    """
+    candidates = []
+    for name, group in groups.items():
+        importance = channel_importance(state_dict, group)
+        # 组内归一化，使不同层的重要性可比
+        importance = importance / (importance.mean() + 1e-12)
+        cost = channel_cost(group, layer_ms)
+        for channel, value in enumerate(importance.tolist()):
+            candidates.append((value / max(cost, 1e-9), cost, name, channel))
+    candidates.sort()
+
+    removed = {name: set() for name in groups}
+    floors = {name: min(group['size'], max(divisor, int(np.ceil(group['size'] * min_keep))))
+              for name, group in groups.items()}
+    saved = 0.0
+    for _, cost, name, channel in candidates:
+        if saved >= target_ms:
+            break
+        if groups[name]['size'] - len(removed[name]) <= floors[name]:
+            continue
+        removed[name].add(channel)
+        saved += cost
+
+    keep = {}
+    for name, group in groups.items():
+        size = group['size']
+        count = size - len(removed[name])
+        count = min(size, int(np.ceil(count / divisor)) * divisor)
+        importance = channel_importance(state_dict, group)
+        keep[name] = torch.sort(torch.topk(importance, count).indices).values
+    return keep
+
+
+def build_pruned(model, groups, keep):
+    """按保留的通道重建 MobileNetV2Unet 并拷贝裁剪后的权重"""
+    config = json.loads(json.dumps(model.config))
+    for name, group in groups.items():
+        key, index = group['cfg']
+        config[key][index] = len(keep[name])
+
+    # 每个张量每个维度上要保留的索引
+    slices = {}
+    for name, group in groups.items():
+        for key, dim, offset in group['tensors']:
+            slices.setdefault(key, {})[dim] = (offset, keep[name])
+
+    state_dict = {}
+    for key, tensor in model.state_dict().items():
+        for dim, (offset, index) in slices.get(key, {}).items():
+            index = torch.cat([torch.arange(offset), index + offset])
+            tensor = tensor.index_select(dim, index)
+        state_dict[key] = tensor.clone()
+
+    pruned = MobileNetV2Unet(use_groupnorm=model.use_groupnorm, config=config)
+    pruned.load_state_dict(state_dict)
+    return pruned.eval()
+
+
+def prune(model, ratio, face, audio, layer_ms=None, total_ms=None, divisor=8, min_keep=0.25):
+    """
+    把模型的估计 CPU 延迟降低约 ratio 比例
+
+    Returns:
+        剪枝后的 MobileNetV2Unet（eval 模式），其 .config 为通道配置
+    """
+    if layer_ms is None:
+        total_ms, layer_ms = profile_layers(model, face, audio)
+    groups = channel_groups(model)
+    keep = select_channels(groups, model.state_dict(), layer_ms, ratio * total_ms,
+                           divisor, min_keep)
+    return build_pruned(model, groups, keep)
+
+
+@torch.no_grad()
+def measure_latency(model, face, audio, iterations=30, warmup=5):
+    """CPU 前向耗时中位数（毫秒）"""
+    for _ in range(warmup):
+        model(face, audio)
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        model(face, audio)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1000)
+
+
+@torch.no_grad()
+def compare_quality(reference, model, samples):
+    """相对参考模型的平均 PSNR / SSIM"""
+    psnrs, ssims = [], []
+    for face, audio in samples:
+        ref = postprocess_output(reference(face, audio))
+        out = postprocess_output(model(face, audio))
+        psnrs.append(compute_psnr(ref, out))
+        ssims.append(compute_ssim(ref, out))
+    return float(np.mean(psnrs)), float(np.mean(ssims))
+
+
+def count_params(model):
+    return sum(p.numel() for p in model.parameters())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='MobileNetV2Unet 延迟感知结构化通道剪枝',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python prune_model.py pruned/ --weights dh_model.pth
+  python prune_model.py pruned/ --weights dh_model.pth --avatar avatar/ --bnf audio_bnf.npy --ratios 0.2 0.4
+        """
+    )
+    parser.add_argument('output_dir', help='输出目录（每个比例一份配置 JSON + state_dict，以及 curve.json）')
+    parser.add_argument('--weights', default=None, help='fp32 权重（state_dict），默认随机初始化')
+    parser.add_argument('--ratios', type=float, nargs='+', default=[0.1, 0.2, 0.3, 0.4],
+                        help='目标延迟降低比例（默认: 0.1 0.2 0.3 0.4）')
+    parser.add_argument('--resolution', type=int, default=160, choices=[128, 160],
+                        help='工作分辨率（默认: 160）')
+    parser.add_argument('--divisor', type=int, default=8, help='保留通道数取整倍数（默认: 8）')
+    parser.add_argument('--min-keep', type=float, default=0.25, help='每组最少保留比例（默认: 0.25）')
+    parser.add_argument('--avatar', default=None, help='形象目录，用真实样本评估质量（需同时给 --bnf）')
+    parser.add_argument('--bnf', default=None, help='WeNet BNF 特征文件 (.npy, [T, 256])')
+    parser.add_argument('--samples', type=int, default=16, help='质量评估样本数（默认: 16）')
+    parser.add_argument('--threads', type=int, default=None, help='torch 线程数（默认不修改）')
+
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    print("=" * 60)
+    print("✂️  MobileNetV2Unet 结构化通道剪枝")
+    print("=" * 60)
+
+    model = create_model(use_gpu=False, weights_path=args.weights)
+    if args.weights is None:
+        print("⚠️  未指定 --weights，使用随机初始化权重")
+
+    face = torch.randn(1, 6, args.resolution, args.resolution)
+    audio = torch.randn(1, 256, 20)
+    if args.avatar and args.bnf:
+        from quantize_model import load_samples
+        samples = load_samples(args.avatar, args.bnf, args.samples)
+    else:
+        samples = [(torch.randn_like(face), torch.randn_like(audio)) for _ in range(args.samples)]
+
+    print(f"\n🔬 逐层计时 ({torch.get_num_threads()} 线程, {args.resolution}x{args.resolution})...")
+    total_ms, layer_ms = profile_layers(model, face, audio)
+    base_ms = measure_latency(model, face, audio)
+    base_params = count_params(model)
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    curve = [{'ratio': 0.0, 'params': base_params, 'latency_ms': base_ms, 'speedup': 1.0,
+              'psnr': None, 'ssim': None, 'config': model.config}]
+    for ratio in args.ratios:
+        pruned = prune(model, ratio, face, audio, layer_ms, total_ms, args.divisor, args.min_keep)
+        latency = measure_latency(pruned, face, audio)
+        psnr, ssim = compare_quality(model, pruned, samples)
+
+        stem = output_dir / f'pruned_r{int(round(ratio * 100)):02d}'
+        with open(f'{stem}.json', 'w') as f:
+            json.dump(pruned.config, f, indent=2)
+        torch.save(pruned.state_dict(), f'{stem}.pth')
+
+        curve.append({'ratio': ratio, 'params': count_params(pruned), 'latency_ms': latency,
+                      'speedup': base_ms / latency, 'psnr': psnr, 'ssim': ssim,
+                      'config': pruned.config, 'files': [f'{stem.name}.json', f'{stem.name}.pth']})
+
+    print(f"\n   {'目标':>6} {'参数(M)':>8} {'延迟(ms)':>9} {'加速':>6} {'PSNR(dB)':>9} {'SSIM':>7}")
+    print("   " + "-" * 52)
+    for row in curve:
+        quality = (f"{row['psnr']:>9.2f} {row['ssim']:>7.4f}" if row['psnr'] is not None
+                   else f"{'基线':>9} {'-':>7}")
+        print(f"   {row['ratio']:>6.0%} {row['params'] / 1e6:>8.3f} {row['latency_ms']:>9.2f} "
+              f"{row['speedup']:>5.2f}x {quality}")
+
+    with open(output_dir / 'curve.json', 'w') as f:
+        json.dump({'resolution': args.resolution, 'threads': torch.get_num_threads(),
+                   'weights': args.weights, 'curve': curve}, f, indent=2)
+    print(f"\n   💾 配置与权重: {output_dir}/pruned_rXX.json / .pth")
+    print(f"   💾 曲线: {output_dir / 'curve.json'}")
+    print("   ℹ️  PSNR/SSIM 为剪枝后未微调的结果，上线前建议按形象微调")
+
+    print("\n" + "=" * 60)
+    print("✅ 剪枝完成！")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
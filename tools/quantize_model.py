@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+MobileNetV2Unet INT8 静态量化脚本
+
+使用 FX 图模式对模型做训练后静态量化（PTQ）：
+1. 融合 Conv + BN + ReLU
+2. 用真实形象帧裁剪出的人脸与对应的 BNF 窗口做校准
+3. 转换为 INT8 模型并固化为 TorchScript，可由 examples/inference.py 的
+   create_model(quantized_path=...) 直接加载
+4. 在留出集上报告延迟、模型大小以及相对 fp32 的 PSNR/SSIM
+
+用法:
+    python quantize_model.py <avatar_dir> <bnf.npy> <output.pt> [选项]
+
+示例:
+    python quantize_model.py avatar/ audio_bnf.npy dh_model_int8.pt
+    python quantize_model.py avatar/ audio_bnf.npy dh_model_int8.pt --weights dh_model.pth --calib 300
+"""
+
+import sys
+import os
+import io
+import copy
+import time
+import argparse
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'models'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'examples'))
+
+import cv2
+import numpy as np
+import torch
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+from inference import (create_model, load_bbox, list_frames, bnf_window, crop_face,
+                       mask_face, preprocess_face, preprocess_audio, postprocess_output)
+from metrics import compute_psnr, compute_ssim
+
+
+def load_samples(avatar_dir, bnf_path, num_samples, bbox_path=None, seed=0):
+    """
+    从形象目录和 BNF 特征构造 (face, audio) 样本
+
+    BNF 索引均匀覆盖整段音频，形象帧按索引循环取用。
+
+    Returns:
+        list of (face [1, 6, 160, 160], audio [1, 256, 20])
+    """
+    avatar_dir = Path(avatar_dir)
+    bboxes = load_bbox(bbox_path or avatar_dir / 'bbox.j')
+    frames = [(idx, path) for idx, path in list_frames(avatar_dir / 'raw_jpgs') if idx in bboxes]
+    if not frames:
+        raise ValueError(f"未在 {avatar_dir / 'raw_jpgs'} 找到带 bbox 的帧")
+
+    bnf = np.load(bnf_path).astype(np.float32)
+    if len(bnf) == 0:
+        raise ValueError(f"BNF 特征为空: {bnf_path}")
+    indices = np.linspace(0, len(bnf) - 1, num_samples).astype(int)
+    np.random.RandomState(seed).shuffle(indices)
+
+    samples = []
+    for bnf_index in indices:
+        frame_index, frame_path = frames[bnf_index % len(frames)]
+        image = cv2.cvtColor(cv2.imread(str(frame_path)), cv2.COLOR_BGR2RGB)
+        face = crop_face(image, bboxes[frame_index])
+        samples.append((
+            preprocess_face(face, mask_face(face)),
+            preprocess_audio(bnf_window(bnf, bnf_index)),
+        ))
+    return samples
+
+
+@torch.no_grad()
+def quantize(model, calib_samples, backend='x86', script=True):
+    """
+    FX 图模式静态量化
+
+    Args:
+        model: eval 模式的 fp32 MobileNetV2Unet
+        calib_samples: 校准样本 list of (face, audio)
+        backend: 量化后端（x86 / fbgemm / qnnpack）
+        script: 是否固化为 TorchScript；False 时返回量化后的 GraphModule
+                （保留子模块层级，可挂 hook 做逐层分析）
+
+    Returns:
+        固化后的 INT8 TorchScript 模块，或 INT8 GraphModule
+    """
+    torch.backends.quantized.engine = backend
+    example_inputs = calib_samples[0]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        # prepare_fx 在 eval 模式下自动融合 Conv + BN + ReLU
+        prepared = prepare_fx(copy.deepcopy(model), get_default_qconfig_mapping(backend),
+                              example_inputs=example_inputs)
+        for face, audio in calib_samples:
+            prepared(face, audio)
+        quantized = convert_fx(prepared)
+        if not script:
+            return quantized
+
+        scripted = torch.jit.trace(quantized, example_inputs)
+        scripted = torch.jit.freeze(scripted)
+    return scripted
+
+
+def serialized_size(model):
+    """模型序列化后的字节数"""
+    buf = io.BytesIO()
+    if isinstance(model, torch.jit.ScriptModule):
+        torch.jit.save(model, buf)
+    else:
+        torch.save(model.state_dict(), buf)
+    return len(buf.getvalue())
+
+
+@torch.no_grad()
+def evaluate(fp32_model, int8_model, samples, warmup=5):
+    """在留出集上比较 fp32 与 INT8 的延迟和输出质量"""
+    for face, audio in samples[:warmup]:
+        fp32_model(face, audio)
+        int8_model(face, audio)
+
+    fp32_times, int8_times, psnrs, ssims = [], [], [], []
+    for face, audio in samples:
+        start = time.perf_counter()
+        ref = fp32_model(face, audio)
+        fp32_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        out = int8_model(face, audio)
+        int8_times.append(time.perf_counter() - start)
+
+        ref_img = postprocess_output(ref)
+        out_img = postprocess_output(out)
+        psnrs.append(compute_psnr(ref_img, out_img))
+        ssims.append(compute_ssim(ref_img, out_img))
+
+    return {
+        'fp32_ms': np.mean(fp32_times) * 1000,
+        'int8_ms': np.mean(int8_times) * 1000,
+        'psnr': np.mean(psnrs),
+        'ssim': np.mean(ssims),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='MobileNetV2Unet INT8 静态量化',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python quantize_model.py avatar/ audio_bnf.npy dh_model_int8.pt
+  python quantize_model.py avatar/ audio_bnf.npy dh_model_int8.pt --weights dh_model.pth
+        """
+    )
+    parser.add_argument('avatar_dir', help='形象目录（含 raw_jpgs/ 与解密后的 bbox.j）')
+    parser.add_argument('bnf', help='WeNet BNF 特征文件 (.npy, [T, 256])')
+    parser.add_argument('output', help='输出的 INT8 TorchScript 模型路径')
+    parser.add_argument('--weights', default=None, help='fp32 权重（state_dict），默认随机初始化')
+    parser.add_argument('--bbox', default=None, help='bbox.j 路径（默认 <avatar_dir>/bbox.j）')
+    parser.add_argument('--calib', type=int, default=200, help='校准样本数（默认: 200）')
+    parser.add_argument('--holdout', type=int, default=50, help='留出评估样本数（默认: 50）')
+    parser.add_argument('--backend', default='x86', choices=['x86', 'fbgemm', 'qnnpack'],
+                        help='量化后端（默认: x86）')
+
+    args = parser.parse_args()
+    if args.calib < 1 or args.holdout < 1:
+        parser.error('--calib 和 --holdout 至少为 1（留出集用于评估量化后的精度）')
+
+    print("=" * 60)
+    print("🗜️  MobileNetV2Unet INT8 静态量化")
+    print("=" * 60)
+
+    model = create_model(use_gpu=False, weights_path=args.weights)
+    if args.weights is None:
+        print("⚠️  未指定 --weights，使用随机初始化权重")
+
+    print(f"\n📸 加载样本: 校准 {args.calib} + 留出 {args.holdout}")
+    samples = load_samples(args.avatar_dir, args.bnf, args.calib + args.holdout, args.bbox)
+    if len(samples) < args.calib + args.holdout:
+        print(f"❌ 只得到 {len(samples)} 个样本，少于校准 + 留出的 {args.calib + args.holdout} 个")
+        sys.exit(1)
+    calib_samples, holdout_samples = samples[:args.calib], samples[args.calib:]
+
+    print("🔧 融合 Conv+BN+ReLU 并校准...")
+    int8_model = quantize(model, calib_samples, args.backend)
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    torch.jit.save(int8_model, str(output_path))
+    print(f"   ✅ 已保存: {output_path}")
+
+    print(f"\n📊 留出集评估 ({len(holdout_samples)} 样本, {torch.get_num_threads()} 线程)...")
+    report = evaluate(model, int8_model, holdout_samples)
+    fp32_size = serialized_size(model)
+    int8_size = output_path.stat().st_size
+
+    print(f"   延迟  fp32: {report['fp32_ms']:.2f} ms   int8: {report['int8_ms']:.2f} ms"
+          f"   加速: {report['fp32_ms'] / report['int8_ms']:.2f}x")
+    print(f"   大小  fp32: {fp32_size / 1024 / 1024:.2f} MB   int8: {int8_size / 1024 / 1024:.2f} MB")
+    print(f"   PSNR: {report['psnr']:.2f} dB   SSIM: {report['ssim']:.4f}")
+
+    print("\n" + "=" * 60)
+    print("✅ 量化完成！")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()